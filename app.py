@@ -5,18 +5,32 @@ A Flask web app for searching and visualizing auction data
 """
 
 from flask import Flask, render_template, request, jsonify, g, send_file, make_response, session
-from db_connector import get_db_connection
+from db_connector import get_pool, stream_batches, fetch_columns, DatabaseUnavailable, QueryTimeout, QueryWatchdog
+from column_snapshot import get_snapshot, get_refresher
+from column_filters import ALLOWED_COLUMNS, COMPARE_OPERATORS, ColumnFilters, UnsupportedFilter
+from daily_rollup import has_rollup, rollup_key, rollup_rows
+from wool_types import type_predicate, types_predicate, type_masks
+from result_cache import get_result_cache, request_key, cached_value, cached_values, CachedResult
+from single_flight import get_single_flight
+from sale_metadata import get_sale_metadata, normalize_sale_date
+from daily_prices import segment_starts, reduce_dates, reduce_series, most_common
+from blend_engine import type_series, group_blend, weighted_blend
 from datetime import datetime, timedelta
 import json
 import time
+import base64
+import hashlib
 import threading
 import os
 import statistics
+import colorsys
 import numpy as np
 import pandas as pd
 import statsmodels.api as sm
 from scipy import stats as scipy_stats
 from io import BytesIO
+from functools import wraps
+from array import array
 from export_data_loader import (
     get_available_files, load_export_data, categorize_wool_data,
     get_data_summary, aggregate_by_category, aggregate_by_country, aggregate_by_month
@@ -44,6 +58,10 @@ LOG_FILE = os.path.join(os.path.dirname(BASE_DIR), 'fusca_activity.log')
 def log_activity(endpoint, tool_name, data=None, result_count=None, error=None):
     """Log all API activity for analytics"""
     try:
+        # Remembered for the result cache, which replays them when it serves this request again
+        if 'logged_activity' in g:
+            g.logged_activity.append((endpoint, tool_name, data, result_count, error))
+        
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
         log_entry = {
@@ -67,15 +85,9 @@ def log_activity(endpoint, tool_name, data=None, result_count=None, error=None):
     except Exception as e:
         print(f"Logging error: {str(e)}")
 
-# Lock to prevent simultaneous tunnel creation across workers
-_tunnel_lock = threading.Lock()
-
-# Security: Whitelist of allowed columns for filtering
-ALLOWED_COLUMNS = {
-    'price', 'bales', 'kg', 'colour', 'micron', 'yield', 
-    'vegetable_matter', 'sale_date', 'location', 
-    'seller_name', 'farm_brand_name', 'wool_type_id',
-    'type_combined', 'lot_number', 'is_sold'
+# Numeric columns the metrics time series can average
+TIMESERIES_COLUMNS = {
+    'price', 'bales', 'kg', 'micron', 'colour', 'vegetable_matter', 'yield'
 }
 
 def derive_length_index(type_combined):
@@ -93,57 +105,158 @@ def derive_length_index(type_combined):
         return ord(length_code) - ord('A') + 1
     return None
 
-# Per-worker connection storage (each Gunicorn worker process keeps its own connection)
-_worker_conn = None
-_worker_tunnel = None
-_worker_pid = None
+# Default time budget (seconds) for endpoints that don't declare their own
+DEFAULT_QUERY_BUDGET = float(os.environ.get('DB_QUERY_BUDGET', '30'))
+
+def query_budget(seconds):
+    """
+    Declare how long an endpoint's database work may take in total.
+    Statements still running when the budget is spent are cancelled and
+    the request is answered with a 504 (see db_error_response).
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            g.query_budget = seconds
+            g.query_deadline = time.monotonic() + seconds
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def over_budget():
+    """True once the current request's query deadline has passed"""
+    deadline = g.get('query_deadline')
+    return deadline is not None and time.monotonic() >= deadline
+
+def raise_if_over_budget():
+    """Stop a multi-query loop from carrying on after its budget is spent"""
+    if over_budget():
+        raise QueryTimeout(f"Query time budget of {g.query_budget:g}s exceeded")
+
+def _return_db_connection(pool, conn):
+    """Stop the request's watchdog and hand conn back, dropping it if a statement on it was killed"""
+    watchdog = g.pop('db_watchdog', None)
+    if watchdog is not None:
+        watchdog.stop()
+    pool.checkin(conn, discard=watchdog is not None and watchdog.fired)
 
 def get_db():
-    """Get or create database connection per worker process"""
-    global _worker_conn, _worker_tunnel, _worker_pid
-    import os as os_module
-    
-    current_pid = os_module.getpid()
-    
-    # If this is a new worker process, clear old connection
-    if _worker_pid != current_pid:
-        _worker_conn = None
-        _worker_tunnel = None
-        _worker_pid = current_pid
-        print(f"New worker process {current_pid}, creating new connection...")
-    
-    # Check if existing connection is still valid
-    try:
-        if _worker_conn and _worker_conn.is_connected() and _worker_tunnel:
-            return _worker_conn, _worker_tunnel
-    except:
-        pass
-    
-    # Need new connection
-    max_retries = 3
-    for attempt in range(max_retries):
+    """
+    Check a pooled connection out for the current request.
+    The same connection is reused for the rest of the request and is
+    returned to the pool in release_db_connection at teardown. A watchdog
+    cancels its running statement if the request's query budget runs out.
+    """
+    pool = get_pool()
+    conn = g.get('db_conn')
+    if conn is not None:
+        # The watchdog only cancels once: a statement started after it fired would run unbounded
+        raise_if_over_budget()
         try:
-            print(f"Worker {current_pid}: Connecting to database (attempt {attempt + 1}/{max_retries})...")
-            _worker_conn, _worker_tunnel = get_db_connection()
-            print(f"Worker {current_pid}: Database connected successfully!")
-            return _worker_conn, _worker_tunnel
-        except Exception as e:
-            print(f"Worker {current_pid}: Connection attempt {attempt + 1} failed: {e}")
-            # Clean up failed tunnel
-            if _worker_tunnel:
-                try:
-                    _worker_tunnel.stop()
-                except:
-                    pass
-            _worker_tunnel = None
-            _worker_conn = None
-            
-            if attempt < max_retries - 1:
-                time.sleep(1)
-            else:
-                raise
+            if conn.is_connected():
+                return conn, pool.tunnel
+        except Exception:
+            pass
+        # Connection died mid-request - hand it back (the pool drops it) and take another
+        g.pop('db_conn', None)
+        _return_db_connection(pool, conn)
     
-    raise Exception("Failed to establish database connection after retries")
+    if 'query_deadline' not in g:
+        g.query_budget = DEFAULT_QUERY_BUDGET
+        g.query_deadline = time.monotonic() + DEFAULT_QUERY_BUDGET
+    raise_if_over_budget()
+    try:
+        conn = pool.checkout()
+    except DatabaseUnavailable:
+        # Endpoints turn this into an error response; flag it so it goes out as a 503
+        g.db_unavailable = True
+        raise
+    g.db_conn = conn
+    try:
+        # Server-side per-statement limit as a backstop to the watchdog
+        pool.limit_statements(conn, g.query_budget)
+    except Exception as e:
+        print(f"Could not set statement time limit: {e}")
+    g.db_watchdog = QueryWatchdog(pool.backend, conn, g.query_deadline)
+    return conn, pool.tunnel
+
+def cached_response(f):
+    """
+    Serve repeat requests for the same endpoint and canonical body from the
+    worker's result cache (see result_cache.py). Only 200 JSON responses
+    are stored; a hit replays the activity log entries of the original.
+    Identical requests arriving while one is being computed wait for it and
+    share its response, failures included (see single_flight.py).
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        cache = get_result_cache()
+        flights = get_single_flight()
+        if cache is None and flights is None:
+            return f(*args, **kwargs)
+        if cache is not None:
+            try:
+                cache.check_version(lambda: get_db()[0])
+            except Exception as e:
+                # Keep serving what we have - it was current at the last successful check
+                print(f"Result cache version check failed: {e}")
+        payload = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+        key = request_key(request.path, payload)
+        
+        entry = cache.get(key) if cache is not None else None
+        if entry is not None:
+            for activity in entry.activity:
+                log_activity(*activity)
+            response = app.response_class(entry.body, mimetype='application/json')
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        
+        def respond():
+            # Final status (503/504 resolved here) and a copy of the body, shareable across threads
+            g.logged_activity = []
+            response = db_error_response(make_response(f(*args, **kwargs)))
+            body = response.get_data()
+            if (cache is not None and response.status_code == 200 and response.mimetype == 'application/json'
+                    and not g.get('skip_result_cache')):
+                cache.put(key, CachedResult(body, g.logged_activity))
+            return body, response.status_code, list(response.headers), g.logged_activity
+        
+        if flights is None:
+            (body, status, headers, activity), leader = respond(), True
+        else:
+            # Wait no longer than this request's own query budget allows
+            timeout = max(g.get('query_deadline', time.monotonic()) - time.monotonic(), 0) + 5
+            try:
+                (body, status, headers, activity), leader = flights.do(key, respond, timeout=timeout)
+            except TimeoutError as e:
+                return jsonify({'error': str(e)}), 500
+            if not leader:
+                for logged in activity:
+                    log_activity(*logged)
+        response = app.response_class(body, status=status, headers=headers)
+        response.headers['X-Cache'] = 'MISS' if leader else 'COALESCED'
+        return response
+    return wrapper
+
+@app.after_request
+def db_error_response(response):
+    """
+    Report database failures precisely instead of as a generic 500:
+    503 while the database is unavailable, 504 once the query budget ran out
+    """
+    if response.status_code != 500:
+        return response
+    if g.get('db_unavailable'):
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+    elif over_budget():
+        response = jsonify({
+            'error': f"Query took longer than this request's {g.query_budget:g}s budget and was cancelled",
+            'timeout': True,
+            'budget_seconds': g.query_budget
+        })
+        response.status_code = 504
+    return response
 
 @app.route('/')
 def index():
@@ -393,9 +506,32 @@ def clear_logs():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/db-status')
+def get_db_status():
+    """Get connection pool and tunnel supervisor state for this worker"""
+    # Check authentication
+    if not session.get('admin_authenticated', False):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        pool = get_pool()
+        return jsonify({
+            'pid': os.getpid(),
+            'supervisor': pool.supervisor.state() if pool.supervisor else None,
+            'pool': pool.stats(),
+            'column_snapshot': get_refresher().state() if get_refresher() else {'enabled': False},
+            'result_cache': get_result_cache().stats() if get_result_cache() else {'enabled': False},
+            'request_coalescing': get_single_flight().stats() if get_single_flight() else {'enabled': False}
+        })
+    except Exception as e:
+        print(f"DB status error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # ==================== ADVANCED METRICS API ENDPOINTS ====================
 
 @app.route('/api/metrics/distribution', methods=['POST'])
+@query_budget(60)
+@cached_response
 def get_distribution():
     """
     Get distribution analysis for a specific variable.
@@ -411,13 +547,17 @@ def get_distribution():
         bin_size = float(data.get('bin_size', 0.5))  # bin width
         filters = data.get('filters', {})
         
+        column = variable if variable in ALLOWED_COLUMNS else 'micron'
+        
         # Build query - with micron floor for distribution analysis
         query = """
-            SELECT {variable}, bales, kg, micron
+            SELECT {column}, bales
             FROM auction_data_joined
             WHERE price > 0
             AND micron >= 10.0
-        """.format(variable=variable if variable in ALLOWED_COLUMNS else 'micron')
+            AND {column} IS NOT NULL
+            AND bales IS NOT NULL
+        """.format(column=column)
         
         params = []
         
@@ -440,45 +580,42 @@ def get_distribution():
                     query += f" AND {key} BETWEEN %s AND %s"
                     params.extend([value['min'], value['max']])
         
+        # Stream rows into typed float columns (16 bytes per lot instead of a dict per row)
+        value_column = array('d')
+        bales_column = array('d')
         conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        for rows in stream_batches(conn, query, params):
+            for value, bales in rows:
+                value_column.append(value)
+                bales_column.append(bales)
         
-        if not results or not isinstance(results, list):
+        if not value_column:
             return jsonify({'error': 'No data found for the specified filters'})
         
-        # Extract values and bales for weighting
-        data_points = [(row[variable], row['bales']) for row in results if row[variable] is not None and row['bales'] is not None]
-        
-        if not data_points:
-            return jsonify({'error': 'No valid data for the selected variable'})
-        
-        values = [point[0] for point in data_points]
+        values = np.frombuffer(value_column, dtype=np.float64)
+        bales_values = np.frombuffer(bales_column, dtype=np.float64)
         
         # Calculate statistics
-        mean_val = statistics.mean(values)
-        median_val = statistics.median(values)
-        std_dev = statistics.stdev(values) if len(values) > 1 else 0
-        min_val = min(values)
-        max_val = max(values)
+        mean_val = float(values.mean())
+        median_val = float(np.median(values))
+        std_dev = float(values.std(ddof=1)) if len(values) > 1 else 0
+        min_val = float(values.min())
+        max_val = float(values.max())
         
         # Create histogram bins
         bins = np.arange(min_val, max_val + bin_size, bin_size)
         
-        # Calculate kg weight (bales * 120) for each bin
+        # Sum bales per bin (bin_start <= value < bin_end) and convert to kg (bales * 120)
+        bin_index = np.searchsorted(bins, values, side='right') - 1
+        in_range = (bin_index >= 0) & (bin_index < len(bins) - 1)
+        bin_bales = np.bincount(bin_index[in_range], weights=bales_values[in_range], minlength=max(len(bins) - 1, 0))
+        
         histogram = []
         for i in range(len(bins) - 1):
-            bin_start = bins[i]
-            bin_end = bins[i + 1]
-            # Sum bales for values in this bin and convert to kg
-            bin_bales = sum(point[1] for point in data_points if bin_start <= point[0] < bin_end)
-            bin_kg = bin_bales * 120
-            
             histogram.append({
-                'bin_start': round(float(bin_start), 2),
-                'bin_end': round(float(bin_end), 2),
-                'kg': round(float(bin_kg), 0)
+                'bin_start': round(float(bins[i]), 2),
+                'bin_end': round(float(bins[i + 1]), 2),
+                'kg': round(float(bin_bales[i] * 120), 0)
             })
         
         return jsonify({
@@ -499,6 +636,8 @@ def get_distribution():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/metrics/timeseries', methods=['POST'])
+@query_budget(90)
+@cached_response
 def get_timeseries():
     """
     Get time series analysis for selected variables.
@@ -514,20 +653,20 @@ def get_timeseries():
             'aggregation': aggregation
         })
         
-        # Validate variables
-        variables = [v for v in variables if v in ALLOWED_COLUMNS]
+        # Validate variables (numeric columns only - each one is averaged per period)
+        variables = [v for v in variables if v in TIMESERIES_COLUMNS]
         if not variables:
             variables = ['micron']
         
-        # Build query to fetch all data
+        # Build query to fetch only the columns being averaged
         query = """
-            SELECT sale_date, price, bales, kg, micron, colour, vegetable_matter, yield, type_combined
+            SELECT sale_date, {columns}
             FROM auction_data_joined
             WHERE price > 0
             AND vegetable_matter BETWEEN 0 AND 1.0
             AND yield <= 92
             AND kg >= 50
-        """
+        """.format(columns=', '.join(variables))
         
         params = []
         
@@ -550,40 +689,25 @@ def get_timeseries():
             query += " AND sale_date <= %s"
             params.append(filters['end_date'])
         
-        query += " ORDER BY sale_date"
-        
+        # Single pass over the result: each batch is reduced to per-period sums and
+        # counts, so memory stays flat however long the date range is
+        period_freq = 'W' if aggregation == 'weekly' else 'M'
+        totals = None
         conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        
-        if not results:
-            return jsonify({'error': 'No data found'})
-        if not isinstance(results, list):
-            return jsonify({'error': 'Invalid data format'})
-        if len(results) == 0:
+        for rows in stream_batches(conn, query, params):
+            batch = pd.DataFrame.from_records(rows, columns=['sale_date'] + variables)
+            batch[variables] = batch[variables].astype(float)
+            batch['period'] = pd.to_datetime(batch['sale_date']).dt.to_period(period_freq)
+            partial = batch.groupby('period')[variables].agg(['sum', 'count'])
+            totals = partial if totals is None else totals.add(partial, fill_value=0)
+        
+        if totals is None:
             return jsonify({'error': 'No data found'})
         
-        # Convert to pandas DataFrame
-        df = pd.DataFrame(results)
-        df['sale_date'] = pd.to_datetime(df['sale_date'])
-        
-        # Add length_index
-        df['length_index'] = df['type_combined'].apply(derive_length_index)
-        
-        # Set aggregation period
-        if aggregation == 'weekly':
-            df['period'] = df['sale_date'].dt.to_period('W')
-        else:
-            df['period'] = df['sale_date'].dt.to_period('M')
-        
-        # Group and aggregate
-        grouped = df.groupby('period')
-        
+        totals = totals.sort_index()
         series_data = {}
         for var in variables:
-            if var in df.columns:
-                series_data[var] = grouped[var].mean().to_dict()
+            series_data[var] = (totals[(var, 'sum')] / totals[(var, 'count')]).to_dict()
         
         # Format for JSON
         formatted_series = {}
@@ -613,7 +737,81 @@ def get_timeseries():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def stream_weeks(conn, query, params):
+    """
+    Yield (week, DataFrame) for a query ordered by sale_date, one complete
+    week at a time. Rows are streamed in batches; a trailing partial week is
+    carried over into the next batch.
+    """
+    columns = ['sale_date', 'price', 'micron', 'colour', 'vegetable_matter', 'type_combined']
+    numeric = ['price', 'micron', 'colour', 'vegetable_matter']
+    pending = None
+    for rows in stream_batches(conn, query, params):
+        batch = pd.DataFrame.from_records(rows, columns=columns)
+        batch[numeric] = batch[numeric].astype(float)
+        batch['week'] = pd.to_datetime(batch['sale_date']).dt.to_period('W')
+        if pending is not None:
+            batch = pd.concat([pending, batch], ignore_index=True)
+        last_week = batch['week'].iloc[-1]
+        complete = batch[batch['week'] != last_week]
+        pending = batch[batch['week'] == last_week]
+        for week, week_df in complete.groupby('week'):
+            yield week, week_df
+    if pending is not None and len(pending) > 0:
+        yield pending['week'].iloc[0], pending
+
+def fit_weekly_regression(week, week_df):
+    """Fit price ~ micron + colour + length_index + VM for one week; None if unusable"""
+    if len(week_df) < 20:  # Need minimum data points
+        return None
+    
+    # Prepare regression data
+    y = week_df['price'].values
+    X = week_df[['micron', 'colour', 'vegetable_matter']].copy()
+    X.insert(2, 'length_index', week_df['type_combined'].apply(derive_length_index))
+    
+    # Scale VM by 10 so 1 unit = 0.1 change (makes regression less volatile)
+    X['vegetable_matter'] = X['vegetable_matter'] * 10
+    
+    # Drop rows with missing values
+    valid_mask = ~(X.isna().any(axis=1) | pd.isna(y))
+    y_clean = y[valid_mask]
+    X_clean = X[valid_mask]
+    
+    if len(y_clean) < 20:
+        return None
+    
+    # Add constant term
+    X_clean = sm.add_constant(X_clean)
+    
+    try:
+        # Fit OLS model
+        model = sm.OLS(y_clean, X_clean).fit()
+        
+        # Skip weeks where r^2 < 0.4
+        if float(model.rsquared) < 0.4:
+            return None
+        
+        return {
+            'week': str(week),
+            'r_squared': round(float(model.rsquared), 4),
+            'adj_r_squared': round(float(model.rsquared_adj), 4),
+            'coefficients': {
+                'intercept': round(float(model.params['const']), 2),
+                'micron': round(float(model.params['micron']), 2),
+                'colour': round(float(model.params['colour']), 2),
+                'length_index': round(float(model.params['length_index']), 2),
+                'vegetable_matter': round(float(model.params['vegetable_matter']), 2)
+            },
+            'n_obs': int(model.nobs)
+        }
+    except Exception as e:
+        print(f"Regression failed for week {week}: {e}")
+        return None
+
 @app.route('/api/metrics/regression', methods=['POST'])
+@query_budget(120)
+@cached_response
 def get_regression():
     """
     Perform OLS regression analysis on a weekly basis.
@@ -629,7 +827,7 @@ def get_regression():
         
         # Build query
         query = """
-            SELECT sale_date, price, bales, kg, micron, colour, vegetable_matter, yield, type_combined
+            SELECT sale_date, price, micron, colour, vegetable_matter, type_combined
             FROM auction_data_joined
             WHERE price > 0
             AND vegetable_matter BETWEEN 0 AND 1.0
@@ -659,73 +857,19 @@ def get_regression():
         
         query += " ORDER BY sale_date"
         
+        # Rows arrive ordered by sale_date, so each week is regressed and dropped
+        # as soon as it is complete - only one week of lots is held at a time
         conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        
-        if not results:
-            return jsonify({'error': 'No data found'})
-        if not isinstance(results, list):
-            return jsonify({'error': 'Invalid data format'})
-        if len(results) == 0:
-            return jsonify({'error': 'No data found'})
-        
-        # Convert to pandas DataFrame
-        df = pd.DataFrame(results)
-        df['sale_date'] = pd.to_datetime(df['sale_date'])
-        df['length_index'] = df['type_combined'].apply(derive_length_index)
-        df['week'] = df['sale_date'].dt.to_period('W')
-        
-        # Run weekly regressions
         weekly_results = []
-        
-        for week, week_df in df.groupby('week'):
-            if len(week_df) < 20:  # Need minimum data points
-                continue
-            
-            # Prepare regression data
-            y = week_df['price'].values
-            X = week_df[['micron', 'colour', 'length_index', 'vegetable_matter']].copy()
-            
-            # Scale VM by 10 so 1 unit = 0.1 change (makes regression less volatile)
-            X['vegetable_matter'] = X['vegetable_matter'] * 10
-            
-            # Drop rows with missing values
-            valid_mask = ~(X.isna().any(axis=1) | pd.isna(y))
-            y_clean = y[valid_mask]
-            X_clean = X[valid_mask]
-            
-            if len(y_clean) < 20:
-                continue
-            
-            # Add constant term
-            X_clean = sm.add_constant(X_clean)
-            
-            try:
-                # Fit OLS model
-                model = sm.OLS(y_clean, X_clean).fit()
-                
-                # Skip weeks where r^2 < 0.4
-                if float(model.rsquared) < 0.4:
-                    continue
-                
-                weekly_results.append({
-                    'week': str(week),
-                    'r_squared': round(float(model.rsquared), 4),
-                    'adj_r_squared': round(float(model.rsquared_adj), 4),
-                    'coefficients': {
-                        'intercept': round(float(model.params['const']), 2),
-                        'micron': round(float(model.params['micron']), 2),
-                        'colour': round(float(model.params['colour']), 2),
-                        'length_index': round(float(model.params['length_index']), 2),
-                        'vegetable_matter': round(float(model.params['vegetable_matter']), 2)
-                    },
-                    'n_obs': int(model.nobs)
-                })
-            except Exception as e:
-                print(f"Regression failed for week {week}: {e}")
-                continue
+        weeks_seen = 0
+        for week, week_df in stream_weeks(conn, query, params):
+            weeks_seen += 1
+            result = fit_weekly_regression(week, week_df)
+            if result:
+                weekly_results.append(result)
+        
+        if weeks_seen == 0:
+            return jsonify({'error': 'No data found'})
         
         if not weekly_results:
             return jsonify({'error': 'Insufficient data for regression analysis'})
@@ -752,6 +896,8 @@ def get_regression():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/metrics/scenario', methods=['POST'])
+@query_budget(60)
+@cached_response
 def get_scenario():
     """
     What-if scenario analysis using recent regression coefficients.
@@ -779,23 +925,25 @@ def get_scenario():
             ORDER BY sale_date
         """
         
-        conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(query)
-        results = cursor.fetchall()
+        def load_recent_lots():
+            conn, tunnel = get_db()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query)
+            results = cursor.fetchall()
+            cursor.close()
+            df = pd.DataFrame(results)
+            if len(df):
+                df['sale_date'] = pd.to_datetime(df['sale_date'])
+                df['length_index'] = df['type_combined'].apply(derive_length_index)
+            return df
         
-        if not results:
-            return jsonify({'error': 'Insufficient recent data for scenario analysis'})
-        if not isinstance(results, list):
-            return jsonify({'error': 'Invalid data format'})
-        if len(results) < 50:
-            return jsonify({'error': 'Insufficient recent data for scenario analysis'})
+        # Every baseline/scenario pair fits on the same lots - share the DataFrame across requests and workers
+        df = cached_value('scenario_recent_lots', {}, load_recent_lots, lambda: get_db()[0])
         
-        # Convert to DataFrame and fit regression
-        df = pd.DataFrame(results)
-        df['sale_date'] = pd.to_datetime(df['sale_date'])
-        df['length_index'] = df['type_combined'].apply(derive_length_index)
+        if len(df) < 50:
+            return jsonify({'error': 'Insufficient recent data for scenario analysis'})
         
+        # Fit regression
         y = df['price'].values
         X = df[['micron', 'colour', 'length_index', 'vegetable_matter']].copy()
         
@@ -871,6 +1019,8 @@ def get_scenario():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/metrics/benchmark', methods=['POST'])
+@query_budget(60)
+@cached_response
 def get_benchmark():
     """
     Benchmark a specific lot against national averages and percentiles.
@@ -997,28 +1147,12 @@ def log_saved_search():
         return jsonify({'status': 'error'}), 500
 
 @app.route('/api/filters')
+@query_budget(10)
 def get_filters():
     """Get min/max values for all filter fields"""
     try:
-        conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get min/max for all filterable fields
-        cursor.execute("""
-            SELECT 
-                MIN(colour) as min_colour, MAX(colour) as max_colour,
-                MIN(micron) as min_micron, MAX(micron) as max_micron,
-                MIN(yield) as min_yield, MAX(yield) as max_yield,
-                MIN(vegetable_matter) as min_vm, MAX(vegetable_matter) as max_vm,
-                MIN(price) as min_price, MAX(price) as max_price
-            FROM auction_data_joined
-            WHERE price > 10
-        """)
-        
-        ranges = cursor.fetchone()
-        
         return jsonify({
-            'ranges': ranges
+            'ranges': get_sale_metadata(lambda: get_db()[0]).ranges
         })
         
     except Exception as e:
@@ -1027,7 +1161,42 @@ def get_filters():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+# Columns returned for each lot by /api/search
+SEARCH_COLUMNS = [
+    'id', 'lot_number', 'sale_date', 'bales', 'kg', 'price',
+    'colour', 'micron', 'yield', 'vegetable_matter',
+    'wool_type_id', 'type_combined', 'location', 'is_sold',
+    'seller_name', 'farm_brand_name'
+]
+
+# Lots per /api/search page (the client may ask for fewer, or more up to the max)
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', '1000'))
+SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE', '5000'))
+
+def search_key(wool_type_search, filters):
+    """Short hash of a search's wool type and filters, so a page token only continues its own search"""
+    return hashlib.sha1(f"{(wool_type_search or '').strip()}|{filters.key()}".encode('utf-8')).hexdigest()[:16]
+
+def encode_page_token(key, sale_date, lot_id):
+    """Opaque token for the page after the lot (sale_date, id)"""
+    payload = json.dumps([key, sale_date, lot_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_page_token(token, key):
+    """(sale_date or None, id) from a page token; ValueError if malformed or from another search"""
+    try:
+        token_key, sale_date, lot_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if sale_date is not None:
+            sale_date = datetime.strptime(sale_date, '%Y-%m-%d').strftime('%Y-%m-%d')
+        lot_id = int(lot_id)
+    except Exception:
+        raise ValueError('Invalid page token')
+    if token_key != key:
+        raise ValueError('Page token belongs to a different search')
+    return sale_date, lot_id
+
 @app.route('/api/search', methods=['POST'])
+@query_budget(20)
 def search_auctions():
     """Search auctions with filters"""
     try:
@@ -1035,7 +1204,8 @@ def search_auctions():
         # Store initial data for logging (will be updated with result_count later)
         log_data = {
             'wool_type': data.get('wool_type_search'),
-            'filter_count': len(data.get('column_filters', []))
+            'filter_count': len(data.get('column_filters', [])),
+            'next_page': bool(data.get('page_token'))
         }
         
         # Build query with filters
@@ -1055,68 +1225,80 @@ def search_auctions():
         if data.get('wool_type_search'):
             search_term = data['wool_type_search'].strip()
             if search_term:
-                query += " AND (CAST(wool_type_id AS CHAR) = %s OR type_combined = %s)"
-                params.append(search_term)
-                params.append(search_term)
+                condition, condition_params = type_condition(search_term)
+                query += f" AND {condition}"
+                params.extend(condition_params)
         
         # Apply column filters
-        if data.get('column_filters'):
-            for filter_item in data['column_filters']:
-                column = filter_item.get('column')
-                operator = filter_item.get('operator')
-                value = filter_item.get('value')
-                value2 = filter_item.get('value2')
-                
-                if not column or not operator or not value:
-                    continue
-                
-                # Security: Validate column name against whitelist
-                if column not in ALLOWED_COLUMNS:
-                    print(f"Warning: Invalid column name attempted: {column}")
-                    continue
-                
-                # Build filter condition based on operator
-                if operator == 'eq':
-                    query += f" AND {column} = %s"
-                    params.append(value)
-                elif operator == 'ne':
-                    query += f" AND {column} != %s"
-                    params.append(value)
-                elif operator == 'gt':
-                    query += f" AND {column} > %s"
-                    params.append(value)
-                elif operator == 'lt':
-                    query += f" AND {column} < %s"
-                    params.append(value)
-                elif operator == 'gte':
-                    query += f" AND {column} >= %s"
-                    params.append(value)
-                elif operator == 'lte':
-                    query += f" AND {column} <= %s"
-                    params.append(value)
-                elif operator == 'between' and value2:
-                    query += f" AND {column} BETWEEN %s AND %s"
-                    params.append(value)
-                    params.append(value2)
-                elif operator == 'contains':
-                    query += f" AND {column} LIKE %s"
-                    params.append(f"%{value}%")
-                elif operator == 'not_contains':
-                    query += f" AND {column} NOT LIKE %s"
-                    params.append(f"%{value}%")
-        
-        # Order by date
-        query += " ORDER BY sale_date DESC LIMIT 1000"
+        filters = ColumnFilters.compile(data.get('column_filters'))
+        filter_sql, filter_params = filters.sql()
+        query += filter_sql
+        params.extend(filter_params)
         
-        conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        # Page size and keyset position - newest first, (sale_date, id) breaking ties
+        try:
+            page_size = min(max(int(data.get('page_size') or SEARCH_PAGE_SIZE), 1), SEARCH_MAX_PAGE_SIZE)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'page_size must be a number'}), 400
+        key = search_key(data.get('wool_type_search'), filters)
+        after = None
+        if data.get('page_token'):
+            try:
+                after = decode_page_token(data['page_token'], key)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        # Undated lots sort after every dated one; a page that runs out of
+        # dated lots is topped up from them (kept separate so the dated
+        # condition stays an index range)
+        undated_query = query + " AND sale_date IS NULL"
+        undated_params = list(params)
+        if after is not None:
+            after_date, after_id = after
+            if after_date is None:
+                query = undated_query + " AND id < %s"
+                params = undated_params + [after_id]
+            else:
+                query += " AND sale_date <= %s AND (sale_date < %s OR id < %s)"
+                params.extend([after_date, after_date, after_id])
+        
+        # One extra row tells us whether there is a next page
+        query += f" ORDER BY sale_date DESC, id DESC LIMIT {page_size + 1}"
+        
+        cached = snapshot_mask(data.get('wool_type_search'), filters)
+        if cached is not None:
+            snapshot, mask = cached
+            sale_dates = snapshot.columns['sale_date']
+            dated = ~np.isnat(sale_dates)
+            if after is not None:
+                after_date, after_id = after
+                ids = snapshot.columns['id']
+                if after_date is None:
+                    mask = mask & ~dated & (ids < after_id)
+                else:
+                    after_day = np.datetime64(after_date, 'D')
+                    mask = mask & (~dated | (sale_dates < after_day) | ((sale_dates == after_day) & (ids < after_id)))
+            # Rows are held in (sale_date, id) order: newest first, undated lots last (as ORDER BY ... DESC does)
+            index = np.concatenate((np.flatnonzero(mask & dated)[::-1], np.flatnonzero(mask & ~dated)[::-1]))[:page_size + 1]
+            results = snapshot.records(index, SEARCH_COLUMNS)
+        else:
+            conn, tunnel = get_db()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, params)
+            results = cursor.fetchall()
+            if after is not None and after[0] is not None and len(results) <= page_size:
+                cursor.execute(undated_query + f" ORDER BY id DESC LIMIT {page_size + 1 - len(results)}", undated_params)
+                results += cursor.fetchall()
+            
+            # Convert date objects to strings
+            for row in results:
+                if row['sale_date']:
+                    row['sale_date'] = row['sale_date'].strftime('%Y-%m-%d')
         
-        # Convert date objects to strings
-        for row in results:
-            if row['sale_date']:
-                row['sale_date'] = row['sale_date'].strftime('%Y-%m-%d')
+        next_page_token = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            next_page_token = encode_page_token(key, results[-1]['sale_date'], results[-1]['id'])
         
         result_count = len(results)
         # Log once with all data including result count
@@ -1124,7 +1306,9 @@ def search_auctions():
         
         return jsonify({
             'count': result_count,
-            'results': results
+            'results': results,
+            'page_size': page_size,
+            'next_page_token': next_page_token
         })
         
     except Exception as e:
@@ -1136,6 +1320,8 @@ def search_auctions():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/bales_chart', methods=['POST'])
+@query_budget(30)
+@cached_response
 def get_bales_chart():
     """Get bales data grouped by sale_date for chart"""
     try:
@@ -1160,63 +1346,35 @@ def get_bales_chart():
         if data.get('wool_type_search'):
             search_term = data['wool_type_search'].strip()
             if search_term:
-                query += " AND (CAST(wool_type_id AS CHAR) = %s OR type_combined = %s)"
-                params.append(search_term)
-                params.append(search_term)
+                condition, condition_params = type_condition(search_term)
+                query += f" AND {condition}"
+                params.extend(condition_params)
         
         # Apply column filters (same as search endpoint)
-        if data.get('column_filters'):
-            for filter_item in data['column_filters']:
-                column = filter_item.get('column')
-                operator = filter_item.get('operator')
-                value = filter_item.get('value')
-                value2 = filter_item.get('value2')
-                
-                if not column or not operator or not value:
-                    continue
-                
-                # Security: Validate column name against whitelist
-                if column not in ALLOWED_COLUMNS:
-                    print(f"Warning: Invalid column name attempted: {column}")
-                    continue
-                
-                # Build filter condition based on operator
-                if operator == 'eq':
-                    query += f" AND {column} = %s"
-                    params.append(value)
-                elif operator == 'ne':
-                    query += f" AND {column} != %s"
-                    params.append(value)
-                elif operator == 'gt':
-                    query += f" AND {column} > %s"
-                    params.append(value)
-                elif operator == 'lt':
-                    query += f" AND {column} < %s"
-                    params.append(value)
-                elif operator == 'gte':
-                    query += f" AND {column} >= %s"
-                    params.append(value)
-                elif operator == 'lte':
-                    query += f" AND {column} <= %s"
-                    params.append(value)
-                elif operator == 'between' and value2:
-                    query += f" AND {column} BETWEEN %s AND %s"
-                    params.append(value)
-                    params.append(value2)
-                elif operator == 'contains':
-                    query += f" AND {column} LIKE %s"
-                    params.append(f"%{value}%")
-                elif operator == 'not_contains':
-                    query += f" AND {column} NOT LIKE %s"
-                    params.append(f"%{value}%")
+        filters = ColumnFilters.compile(data.get('column_filters'))
+        filter_sql, filter_params = filters.sql()
+        query += filter_sql
+        params.extend(filter_params)
         
         # Group by sale_date
         query += " GROUP BY sale_date ORDER BY sale_date ASC"
         
-        conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        cached = snapshot_mask(data.get('wool_type_search'), filters)
+        if cached is not None:
+            snapshot, mask = cached
+            lots = snapshot.select(mask, ['sale_date', 'bales'])
+            dated = ~np.isnat(lots['sale_date'])
+            sale_dates = lots['sale_date'][dated]
+            bales = np.nan_to_num(lots['bales'][dated])
+            results = [
+                {'sale_date': sale_date.astype(object), 'total_bales': bales[start:end].sum()}
+                for sale_date, start, end in date_segments(sale_dates)
+            ]
+        else:
+            conn, tunnel = get_db()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, params)
+            results = cursor.fetchall()
         
         # Format data for chart
         labels = []
@@ -1238,46 +1396,304 @@ def get_bales_chart():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
-def interpolate_series(values):
-    """Apply linear interpolation to fill missing data points"""
-    interpolated = values[:]
+def valid_lots(cols):
+    """Drop lots without a sale date, price or bales (NULL or zero), keeping columns aligned"""
+    keep = ~np.isnat(cols['sale_date'])
+    for name in ('price', 'bales'):
+        keep &= np.nan_to_num(cols[name]) != 0
+    return {name: values[keep] for name, values in cols.items()}
+
+def date_segments(sale_dates):
+    """Yield (sale_date, start, end) for each run of equal dates in a date-sorted array"""
+    starts = segment_starts(sale_dates)
+    ends = np.append(starts[1:], len(sale_dates))
+    for start, end in zip(starts, ends):
+        yield sale_dates[start], start, end
+
+def snapshot_mask(wool_type, filters, require_bales=False):
+    """
+    Evaluate a wool type search and compiled column filters against the
+    worker's in-memory column snapshot. Returns (snapshot, mask), or None
+    when the caller should run its SQL instead (snapshot disabled or not
+    loaded yet, or a filter the snapshot can't reproduce exactly).
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    try:
+        mask = snapshot.mask(wool_type, filters, require_bales)
+    except UnsupportedFilter as e:
+        print(f"Column snapshot skipped, using SQL: {e}")
+        return None
+    return snapshot, mask
+
+def lot_columns(wool_type, filters, query, params, columns, require_bales=False, prepared=False):
+    """Per-lot columns in sale_date order, from the column snapshot when possible, otherwise SQL"""
+    cached = snapshot_mask(wool_type, filters, require_bales)
+    if cached is not None:
+        snapshot, mask = cached
+        return snapshot.select(mask, [name for name, _ in columns])
+    conn, tunnel = get_db()
+    return fetch_columns(conn, query, params, columns, prepared=prepared)
+
+def lots_by_type(wool_types, filters, columns, require_bales=True):
+    """
+    Per-lot columns in sale_date order for several wool type search terms,
+    as {term: cols}. Served from the column snapshot when possible,
+    otherwise by one query for all the terms whose rows are split by type
+    in memory (a lot matching two terms is returned for both).
+    """
+    terms = list(dict.fromkeys(wool_types))
+    if not terms:
+        return {}
+    names = [name for name, _ in columns]
+    lots = {}
+    for wool_type in terms:
+        cached = snapshot_mask(wool_type, filters, require_bales)
+        if cached is None:
+            break
+        snapshot, mask = cached
+        lots[wool_type] = snapshot.select(mask, names)
+    else:
+        return lots
+
+    condition, params = types_condition(terms)
+    query = f"""
+        SELECT {', '.join(names)}, type_combined, wool_type_id
+        FROM auction_data_joined
+        WHERE price > 10{' AND bales > 0' if require_bales else ''}
+        AND {condition}
+    """
+    filter_sql, filter_params = filters.sql()
+    query += filter_sql + " ORDER BY sale_date ASC, id ASC"
+    conn, tunnel = get_db()
+    cols = fetch_columns(conn, query, params + filter_params,
+                         list(columns) + [('type_combined', 'str'), ('wool_type_id', 'float')], prepared=True)
+    masks = type_masks(terms, cols['type_combined'], cols['wool_type_id'])
+    return {wool_type: {name: cols[name][mask] for name in names} for wool_type, mask in masks.items()}
+
+def rollup_type(wool_type, filters=None):
+    """
+    (conn, key) when a wool type's chart can be read from the daily rollup -
+    the local mirror backend, no per-lot filters and a term that resolves
+    to a single type_combined - otherwise None
+    """
+    if filters or get_pool().backend.name != 'sqlite':
+        return None
+    conn, tunnel = get_db()
+    if 'has_rollup' not in g:
+        g.has_rollup = has_rollup(conn)
+    if not g.has_rollup:
+        return None
+    # Numeric ids that map onto a single type resolve to a type_combined predicate too
+    condition, condition_params = type_condition(wool_type or '')
+    if condition != 'type_combined = %s':
+        return None
+    key = rollup_key(conn, condition_params[0])
+    return (conn, key) if key is not None else None
+
+def type_condition(wool_type):
+    """Index-friendly (sql, params) predicate for a wool type search term (see wool_types.py)"""
+    return type_predicate(wool_type, lambda: get_db()[0])
+
+def types_condition(wool_types):
+    """One (sql, params) predicate matching any of several wool type search terms"""
+    return types_predicate(wool_types, lambda: get_db()[0])
+
+def price_statistics(stats_data):
+    """Summary of the kept lot prices (dollars) shown under the price chart"""
+    if len(stats_data) == 0:
+        return None
+    return {
+        'min': round(min(stats_data), 2),
+        'max': round(max(stats_data), 2),
+        'median': round(statistics.median(stats_data), 2),
+        'mean': round(statistics.mean(stats_data), 2),
+        'std_dev': round(statistics.stdev(stats_data), 2) if len(stats_data) > 1 else 0,
+        'count': len(stats_data)
+    }
+
+def price_chart_from_rollup(conn, key):
+    """The price chart response built from a type's daily rollup rows"""
+    labels, prices, data_quality, table_data, stats_data = [], [], [], [], []
+    for row in rollup_rows(conn, key, ['type_combined', 'weighted_price', 'kept_lots', 'mean_colour', 'mean_vm', 'kept_prices']):
+        date_key = str(row['sale_date'])
+        price = round(row['weighted_price'] / 100, 2)
+        labels.append(date_key)
+        prices.append(price)
+        data_quality.append(row['kept_lots'])
+        table_data.append({
+            'date': date_key,
+            'wooltype': row['type_combined'],
+            'avg_colour': round(row['mean_colour'], 2) if row['mean_colour'] is not None else None,
+            'avg_vm': round(row['mean_vm'], 2) if row['mean_vm'] is not None else None,
+            'avg_price': price,
+            'matched_lots': row['kept_lots']
+        })
+        stats_data.extend((row['kept_prices'] / 100).tolist())
+    return {
+        'labels': labels,
+        'data': prices,
+        'data_quality': data_quality,
+        'statistics': price_statistics(stats_data),
+        'table_data': table_data
+    }
+
+def blend_type_series(cols):
+    """One type's blend series (see blend_engine.type_series) from date-sorted lots"""
+    days = reduce_dates(cols, with_quality=True)
+    return type_series(days['sale_date'], days['weighted_price'], days['weighted_colour'],
+                       days['weighted_vm'], days['total_bales'])
+
+def rollup_blend_series(conn, key, date_filters):
+    """One type's blend series read from its daily rollup rows"""
+    rows = rollup_rows(conn, key, ['weighted_price', 'weighted_colour', 'weighted_vm', 'total_bales'],
+                       date_filters.sql_conditions())
+    column = lambda name: [np.nan if row[name] is None else row[name] for row in rows]
+    return type_series([str(row['sale_date']) for row in rows], column('weighted_price'),
+                       column('weighted_colour'), column('weighted_vm'), column('total_bales'))
+
+def blend_series_by_type(wanted, date_filters):
+    """
+    Blend series for wanted {(entry filter key, wool type): entry filters},
+    cached per type, filter set and data version (see result_cache.cached_values).
+    Misses are read from the daily rollup where possible, the rest fetched
+    with one lot query per filter set. Types whose query failed are left out.
+    """
+    def compute(missing):
+        series = {}
+        pending = {}
+        for filter_key, wool_type in missing:
+            filters = wanted[(filter_key, wool_type)]
+            rollup = rollup_type(wool_type, filters)
+            if rollup is not None:
+                series[(filter_key, wool_type)] = rollup_blend_series(*rollup, date_filters)
+                continue
+            pending.setdefault(filter_key, (filters, []))[1].append(wool_type)
+        
+        for filter_key, (filters, group_types) in pending.items():
+            try:
+                # Date filter (shared across all entries) plus this entry filter set
+                lots = lots_by_type(group_types, date_filters + filters, [
+                    ('sale_date', 'date'), ('price', 'float'), ('bales', 'float'),
+                    ('colour', 'float'), ('vegetable_matter', 'float')
+                ])
+            except Exception as query_error:
+                raise_if_over_budget()  # Out of time - don't keep querying
+                print(f"Query error in compare_chart_blend: {query_error}")
+                import traceback
+                traceback.print_exc()
+                # Leave these types out and carry on with the other filter sets
+                continue
+            for wool_type, cols in lots.items():
+                series[(filter_key, wool_type)] = blend_type_series(valid_lots(cols))
+        return series
+    
+    payloads = {
+        (filter_key, wool_type): {'wool_type': wool_type, 'filters': (date_filters + filters).canonical()}
+        for (filter_key, wool_type), filters in wanted.items()
+    }
+    return cached_values('blend_type_series', payloads, compute, lambda: get_db()[0])
+
+# Most wool types (compare) or entries (blend) one chart accepts
+COMPARE_MAX_SERIES = int(os.environ.get('COMPARE_MAX_SERIES', '50'))
+
+# Chart line colours; series past these get evenly spread hues
+CHART_COLORS = ['#3D7F4B', '#1976D2', '#D32F2F', '#F57C00', '#7B1FA2']
+
+def series_color(idx):
+    """Hex colour of a chart's idx-th series"""
+    if idx < len(CHART_COLORS):
+        return CHART_COLORS[idx]
+    # Golden-ratio hue steps keep neighbouring series apart
+    hue = ((idx - len(CHART_COLORS)) * 0.618034) % 1
+    red, green, blue = colorsys.hls_to_rgb(hue, 0.42, 0.65)
+    return '#%02X%02X%02X' % (round(red * 255), round(green * 255), round(blue * 255))
+
+def series_dataset(label, data, idx):
+    """Chart.js dataset for a compare or blend chart line"""
+    color = series_color(idx)
+    return {
+        'label': label,
+        'data': data,
+        'borderColor': color,
+        'backgroundColor': color + '20',
+        'borderWidth': 2,
+        'tension': 0.1,
+        'fill': False,
+        'spanGaps': True
+    }
+
+def blend_weight(weight):
+    """A blend weight as the blend pages read it (missing, zero or invalid counts as 1)"""
+    try:
+        weight = float(weight or 1)
+    except (TypeError, ValueError):
+        return 1.0
+    return weight if np.isfinite(weight) and weight != 0 else 1.0
+
+def blend_entry_series(entries, entry_filters, date_filters):
+    """
+    Each blend entry's daily series, {label: {date: {'price', 'avg_colour',
+    'avg_vm', 'total_volume'}}}: its types' cached series averaged (gaps
+    interpolated) with colour, VM and volume combined. entry_filters are
+    the entries' compiled filters; entries without types are left out.
+    """
+    # Every (entry filter set, wool type) series the entries need
+    wanted = {}
+    for entry, filters in zip(entries, entry_filters):
+        for wool_type in entry.get('types', []):
+            wanted[(filters.key(), wool_type)] = filters
+    type_series_by_key = blend_series_by_type(wanted, date_filters)
     
-    for i in range(len(interpolated)):
-        if interpolated[i] is None:
-            # Find previous valid point
-            prev_idx = i - 1
-            while prev_idx >= 0 and interpolated[prev_idx] is None:
-                prev_idx -= 1
-            
-            # Find next valid point
-            next_idx = i + 1
-            while next_idx < len(interpolated) and interpolated[next_idx] is None:
-                next_idx += 1
-            
-            # Interpolate if we have both prev and next
-            if prev_idx >= 0 and next_idx < len(interpolated):
-                prev_value = interpolated[prev_idx]
-                next_value = interpolated[next_idx]
-                distance = next_idx - prev_idx
-                position = i - prev_idx
-                
-                # Linear interpolation
-                interpolated[i] = prev_value + (next_value - prev_value) * (position / distance)
-            # If only prev exists, use prev (flat line forward)
-            elif prev_idx >= 0:
-                interpolated[i] = interpolated[prev_idx]
-            # If only next exists, use next (flat line backward)
-            elif next_idx < len(interpolated):
-                interpolated[i] = interpolated[next_idx]
+    all_series = {}
+    for entry, filters in zip(entries, entry_filters):
+        types = entry.get('types', [])
+        label = entry.get('label', '')
+        
+        if not types:
+            continue
+        
+        # Average the group's types (gaps interpolated) and combine colour, VM and volume
+        group = group_blend([type_series_by_key[(filters.key(), wool_type)] for wool_type in types
+                             if (filters.key(), wool_type) in type_series_by_key])
+        series_data = {}
+        for date, price, avg_colour, avg_vm, total_volume in zip(
+            group['dates'].tolist(), group['price'].tolist(), group['avg_colour'].tolist(),
+            group['avg_vm'].tolist(), group['total_volume'].tolist()
+        ):
+            series_data[date] = {
+                'price': round(price, 2),
+                'avg_colour': round(avg_colour, 2) if not np.isnan(avg_colour) else None,
+                'avg_vm': round(avg_vm, 2) if not np.isnan(avg_vm) else None,
+                'total_volume': int(total_volume)
+            }
+        
+        all_series[label] = series_data
+    return all_series
+
+def blend_average(all_series, weights):
+    """
+    (dates, labels, dates x entries price matrix, weighted average) for
+    blend entry series and {label: weight}: the entry lines interpolated
+    and averaged with their weights, nan where there is no price
+    """
+    # Get all unique dates across all series
+    all_dates = sorted(set(date for series in all_series.values() for date in series.keys()))
     
-    return interpolated
+    date_rows = {date: row for row, date in enumerate(all_dates)}
+    labels = list(all_series.keys())
+    entry_prices = np.full((len(all_dates), len(labels)), np.nan)
+    for column, label in enumerate(labels):
+        for date, date_entry in all_series[label].items():
+            entry_prices[date_rows[date], column] = date_entry['price']
+    return all_dates, labels, entry_prices, weighted_blend(entry_prices, [weights[label] for label in labels])
 
 @app.route('/api/compare_chart_blend', methods=['POST'])
+@query_budget(60)
+@cached_response
 def get_compare_chart_blend():
     """Get price comparison data with per-entry filters for blend mode (supports grouped types)"""
-    conn = None
-    tunnel = None
-    cursor = None
     try:
         data = request.json
         entries = data.get('entries', [])
@@ -1290,282 +1706,28 @@ def get_compare_chart_blend():
         if not entries or len(entries) == 0:
             return jsonify({'error': 'No entries specified'}), 400
         
-        if len(entries) > 5:
-            return jsonify({'error': 'Maximum 5 entries for comparison'}), 400
+        if len(entries) > COMPARE_MAX_SERIES:
+            return jsonify({'error': f'Maximum {COMPARE_MAX_SERIES} entries for comparison'}), 400
         
-        from collections import defaultdict
-        import statistics
+        date_filters = ColumnFilters.date_filter(date_filter)
+        entry_filters = [ColumnFilters.compile(entry.get('filters', []), COMPARE_OPERATORS) for entry in entries]
+        all_series = blend_entry_series(entries, entry_filters, date_filters)
+        weights = {entry.get('label', ''): blend_weight(entry.get('weight')) for entry in entries if entry.get('types')}
         
-        # Get a single database connection for all queries
-        conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
+        # Dates x entries price matrix for the chart lines and the weighted average
+        all_dates, labels, entry_prices, weighted_average = blend_average(all_series, weights)
         
-        all_series = {}
-        
-        for entry in entries:
-            types = entry.get('types', [])
-            label = entry.get('label', '')
-            entry_filters = entry.get('filters', [])
-            
-            if not types:
-                continue
-            
-            # Process each type in the group individually
-            type_series = []  # Will store series data for each type in this group
-            
-            for wool_type in types:
-                # Build query for this wool type
-                query = """
-                    SELECT 
-                        sale_date,
-                        price,
-                        bales,
-                        colour,
-                        vegetable_matter
-                    FROM auction_data_joined
-                    WHERE price > 10 AND bales > 0
-                    AND (CAST(wool_type_id AS CHAR) = %s OR type_combined = %s)
-                """
-                
-                params = [wool_type, wool_type]
-            
-                # Apply date filter (shared across all entries)
-                if date_filter:
-                    column = 'sale_date'
-                    operator = date_filter.get('operator')
-                    value = date_filter.get('value')
-                    value2 = date_filter.get('value2')
-                    
-                    if operator == 'eq':
-                        query += f" AND {column} = %s"
-                        params.append(value)
-                    elif operator == 'gt':
-                        query += f" AND {column} > %s"
-                        params.append(value)
-                    elif operator == 'lt':
-                        query += f" AND {column} < %s"
-                        params.append(value)
-                    elif operator == 'gte':
-                        query += f" AND {column} >= %s"
-                        params.append(value)
-                    elif operator == 'lte':
-                        query += f" AND {column} <= %s"
-                        params.append(value)
-                    elif operator == 'between' and value2:
-                        query += f" AND {column} BETWEEN %s AND %s"
-                        params.append(value)
-                        params.append(value2)
-                
-                # Apply per-entry filters
-                for filter_item in entry_filters:
-                    column = filter_item.get('column')
-                    operator = filter_item.get('operator')
-                    value = filter_item.get('value')
-                    value2 = filter_item.get('value2')
-                    
-                    if not column or not operator or not value:
-                        continue
-                    
-                    if column not in ALLOWED_COLUMNS:
-                        continue
-                    
-                    if operator == 'eq':
-                        query += f" AND {column} = %s"
-                        params.append(value)
-                    elif operator == 'ne':
-                        query += f" AND {column} != %s"
-                        params.append(value)
-                    elif operator == 'gt':
-                        query += f" AND {column} > %s"
-                        params.append(value)
-                    elif operator == 'lt':
-                        query += f" AND {column} < %s"
-                        params.append(value)
-                    elif operator == 'gte':
-                        query += f" AND {column} >= %s"
-                        params.append(value)
-                    elif operator == 'lte':
-                        query += f" AND {column} <= %s"
-                        params.append(value)
-                    elif operator == 'between' and value2:
-                        query += f" AND {column} BETWEEN %s AND %s"
-                        params.append(value)
-                        params.append(value2)
-                
-                query += " ORDER BY sale_date ASC"
-                
-                # Check connection health and reuse the same cursor
-                try:
-                    if not conn.is_connected():
-                        print("Database connection lost, reconnecting...")
-                        if cursor:
-                            cursor.close()
-                        conn, tunnel = get_db()
-                        cursor = conn.cursor(dictionary=True)
-                    
-                    cursor.execute(query, params)
-                    results = cursor.fetchall()
-                except Exception as query_error:
-                    print(f"Query error in compare_chart_blend: {query_error}")
-                    import traceback
-                    traceback.print_exc()
-                    # Continue to next type if this query fails
-                    continue
-                
-                # Group by date for THIS specific type - store (price, bales, colour, vm)
-                type_date_data = defaultdict(list)
-                for row in results:
-                    if row['sale_date'] and row['price'] and row['bales']:
-                        type_date_data[row['sale_date']].append({
-                            'price': float(row['price']),
-                            'bales': float(row['bales']),
-                            'colour': float(row['colour']) if row['colour'] is not None else None,
-                            'vegetable_matter': float(row['vegetable_matter']) if row['vegetable_matter'] is not None else None
-                        })
-                
-                # Calculate volume-weighted filtered averages for THIS type
-                type_data = {}
-                for sale_date in sorted(type_date_data.keys()):
-                    items = type_date_data[sale_date]
-                    
-                    if len(items) == 0:
-                        continue
-                    
-                    # Calculate median price for outlier filtering
-                    price_list = [item['price'] for item in items]
-                    median_price = statistics.median(price_list)
-                    
-                    # Filter outliers: remove items where price is +/- 20% from median
-                    if len(items) > 1:
-                        lower_bound = median_price * 0.8
-                        upper_bound = median_price * 1.2
-                        filtered_items = [item for item in items if lower_bound <= item['price'] <= upper_bound]
-                        
-                        if len(filtered_items) == 0:
-                            filtered_items = items
-                    else:
-                        filtered_items = items
-                    
-                    # Calculate volume-weighted average: sum(price * bales) / sum(bales)
-                    total_weighted_price = sum(item['price'] * item['bales'] for item in filtered_items)
-                    total_bales = sum(item['bales'] for item in filtered_items)
-                    
-                    if total_bales > 0:
-                        weighted_avg_price = total_weighted_price / total_bales
-                        weighted_avg_price_dollars = weighted_avg_price / 100
-                        date_key = sale_date.strftime('%Y-%m-%d')
-                        
-                        # Calculate volume-weighted average colour
-                        total_weighted_colour = sum(item['colour'] * item['bales'] for item in filtered_items if item['colour'] is not None)
-                        colour_bales = sum(item['bales'] for item in filtered_items if item['colour'] is not None)
-                        avg_colour = total_weighted_colour / colour_bales if colour_bales > 0 else None
-                        
-                        # Calculate volume-weighted average vegetable matter
-                        total_weighted_vm = sum(item['vegetable_matter'] * item['bales'] for item in filtered_items if item['vegetable_matter'] is not None)
-                        vm_bales = sum(item['bales'] for item in filtered_items if item['vegetable_matter'] is not None)
-                        avg_vm = total_weighted_vm / vm_bales if vm_bales > 0 else None
-                        
-                        type_data[date_key] = {
-                            'price': weighted_avg_price_dollars,
-                            'avg_colour': round(avg_colour, 2) if avg_colour is not None else None,
-                            'avg_vm': round(avg_vm, 2) if avg_vm is not None else None,
-                            'total_volume': int(total_bales)
-                        }
-                
-                type_series.append(type_data)
-            
-            # Get all unique dates across all types in this group
-            group_dates = sorted(set(date for series in type_series for date in series.keys()))
-            
-            # Interpolate each type's series to fill missing dates (only for price)
-            interpolated_series = []
-            for type_data in type_series:
-                # Create array with None for missing dates (price only for interpolation)
-                values = [type_data.get(date, {}).get('price') if isinstance(type_data.get(date), dict) else (type_data.get(date) if type_data.get(date) else None) for date in group_dates]
-                # Apply linear interpolation
-                interpolated = interpolate_series(values)
-                interpolated_series.append(interpolated)
-            
-            # Now average the interpolated series together and combine metrics
-            series_data = {}
-            for idx, date in enumerate(group_dates):
-                valid_values = [series[idx] for series in interpolated_series if series[idx] is not None]
-                if len(valid_values) > 0:
-                    avg_price = sum(valid_values) / len(valid_values)
-                    
-                    # Collect all type data for this date to calculate combined metrics
-                    date_type_data = []
-                    for type_data_dict in type_series:
-                        date_entry = type_data_dict.get(date)
-                        if isinstance(date_entry, dict) and date_entry.get('price'):
-                            date_type_data.append(date_entry)
-                    
-                    # Calculate combined avg_colour, avg_vm, total_volume
-                    if date_type_data:
-                        # Volume-weighted average colour
-                        total_colour_weight = sum(entry.get('avg_colour', 0) * entry.get('total_volume', 0) for entry in date_type_data if entry.get('avg_colour') is not None)
-                        total_colour_vol = sum(entry.get('total_volume', 0) for entry in date_type_data if entry.get('avg_colour') is not None)
-                        combined_colour = round(total_colour_weight / total_colour_vol, 2) if total_colour_vol > 0 else None
-                        
-                        # Volume-weighted average VM
-                        total_vm_weight = sum(entry.get('avg_vm', 0) * entry.get('total_volume', 0) for entry in date_type_data if entry.get('avg_vm') is not None)
-                        total_vm_vol = sum(entry.get('total_volume', 0) for entry in date_type_data if entry.get('avg_vm') is not None)
-                        combined_vm = round(total_vm_weight / total_vm_vol, 2) if total_vm_vol > 0 else None
-                        
-                        # Total volume
-                        combined_volume = sum(entry.get('total_volume', 0) for entry in date_type_data)
-                        
-                        series_data[date] = {
-                            'price': round(avg_price, 2),
-                            'avg_colour': combined_colour,
-                            'avg_vm': combined_vm,
-                            'total_volume': combined_volume
-                        }
-                    else:
-                        series_data[date] = {
-                            'price': round(avg_price, 2),
-                            'avg_colour': None,
-                            'avg_vm': None,
-                            'total_volume': 0
-                        }
-            
-            all_series[label] = series_data
-        
-        # Get all unique dates across all series
-        all_dates = sorted(set(date for series in all_series.values() for date in series.keys()))
-        
-        # Build datasets for Chart.js (one per entry/label)
-        datasets = []
-        colors = ['#3D7F4B', '#1976D2', '#D32F2F', '#F57C00', '#7B1FA2']
-        
-        for idx, entry_label in enumerate(all_series.keys()):
-            series_data = all_series.get(entry_label, {})
-            # Extract price values for chart
-            data_values = []
-            for date in all_dates:
-                date_entry = series_data.get(date)
-                if isinstance(date_entry, dict):
-                    data_values.append(date_entry.get('price'))
-                elif date_entry is not None:
-                    # Handle legacy format
-                    data_values.append(date_entry)
-                else:
-                    data_values.append(None)
-            
-            datasets.append({
-                'label': entry_label,
-                'data': data_values,
-                'borderColor': colors[idx % len(colors)],
-                'backgroundColor': colors[idx % len(colors)] + '20',
-                'borderWidth': 2,
-                'tension': 0.1,
-                'fill': False,
-                'spanGaps': True
-            })
+        # Build datasets for Chart.js (one per entry/label)
+        datasets = [
+            series_dataset(entry_label, [None if np.isnan(price) else price for price in entry_prices[:, idx].tolist()], idx)
+            for idx, entry_label in enumerate(labels)
+        ]
         
         return jsonify({
             'labels': all_dates,
             'datasets': datasets,
+            # Entry lines interpolated and averaged with the entries' weights
+            'weighted_average': [None if np.isnan(price) else price for price in weighted_average.tolist()],
             'table_data': all_series  # Include detailed data for table view
         })
         
@@ -1574,15 +1736,10 @@ def get_compare_chart_blend():
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
-    finally:
-        # Clean up cursor (connection is managed by get_db())
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
 
 @app.route('/api/compare_chart', methods=['POST'])
+@query_budget(45)
+@cached_response
 def get_compare_chart():
     """Get price comparison data for multiple wool types"""
     try:
@@ -1596,137 +1753,47 @@ def get_compare_chart():
         if not wool_types or len(wool_types) == 0:
             return jsonify({'error': 'No wool types specified'}), 400
         
-        if len(wool_types) > 5:
-            return jsonify({'error': 'Maximum 5 wool types for comparison'}), 400
+        if len(wool_types) > COMPARE_MAX_SERIES:
+            return jsonify({'error': f'Maximum {COMPARE_MAX_SERIES} wool types for comparison'}), 400
         
+        filters = ColumnFilters.compile(data.get('column_filters'), COMPARE_OPERATORS)
         all_series = {}
         
-        for wool_type in wool_types:
-            # Build query for this wool type
-            query = """
-                SELECT 
-                    sale_date,
-                    price,
-                    bales
-                FROM auction_data_joined
-                WHERE price > 10 AND bales > 0
-                AND (CAST(wool_type_id AS CHAR) = %s OR type_combined = %s)
-            """
-            
-            params = [wool_type, wool_type]
-            
-            # Apply additional column filters if provided
-            if data.get('column_filters'):
-                for filter_item in data['column_filters']:
-                    column = filter_item.get('column')
-                    operator = filter_item.get('operator')
-                    value = filter_item.get('value')
-                    value2 = filter_item.get('value2')
-                    
-                    if not column or not operator or not value:
-                        continue
-                    
-                    if column not in ALLOWED_COLUMNS:
-                        continue
-                    
-                    if operator == 'eq':
-                        query += f" AND {column} = %s"
-                        params.append(value)
-                    elif operator == 'ne':
-                        query += f" AND {column} != %s"
-                        params.append(value)
-                    elif operator == 'gt':
-                        query += f" AND {column} > %s"
-                        params.append(value)
-                    elif operator == 'lt':
-                        query += f" AND {column} < %s"
-                        params.append(value)
-                    elif operator == 'gte':
-                        query += f" AND {column} >= %s"
-                        params.append(value)
-                    elif operator == 'lte':
-                        query += f" AND {column} <= %s"
-                        params.append(value)
-                    elif operator == 'between' and value2:
-                        query += f" AND {column} BETWEEN %s AND %s"
-                        params.append(value)
-                        params.append(value2)
-            
-            query += " ORDER BY sale_date ASC"
-            
-            conn, tunnel = get_db()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            # Group by date - store (price, bales) for volume-weighted averaging
-            from collections import defaultdict
-            import statistics
-            
-            date_data = defaultdict(list)
-            for row in results:
-                if row['sale_date'] and row['price'] and row['bales']:
-                    date_data[row['sale_date']].append({
-                        'price': float(row['price']),
-                        'bales': float(row['bales'])
-                    })
-            
-            # Calculate volume-weighted filtered averages
-            series_data = {}
-            for sale_date in sorted(date_data.keys()):
-                items = date_data[sale_date]
-                
-                if len(items) == 0:
-                    continue
-                
-                # Calculate median price for outlier filtering
-                price_list = [item['price'] for item in items]
-                median_price = statistics.median(price_list)
-                
-                # Filter outliers: remove items where price is +/- 20% from median
-                if len(items) > 1:
-                    lower_bound = median_price * 0.8
-                    upper_bound = median_price * 1.2
-                    filtered_items = [item for item in items if lower_bound <= item['price'] <= upper_bound]
-                    
-                    if len(filtered_items) == 0:
-                        filtered_items = items
-                else:
-                    filtered_items = items
-                
-                # Calculate volume-weighted average: sum(price * bales) / sum(bales)
-                total_weighted_price = sum(item['price'] * item['bales'] for item in filtered_items)
-                total_bales = sum(item['bales'] for item in filtered_items)
-                
-                if total_bales > 0:
-                    weighted_avg_price = total_weighted_price / total_bales
-                    weighted_avg_price_dollars = weighted_avg_price / 100
-                    date_key = sale_date.strftime('%Y-%m-%d')
-                    series_data[date_key] = round(weighted_avg_price_dollars, 2)
-            
-            all_series[wool_type] = series_data
+        pending = []
+        for wool_type in dict.fromkeys(wool_types):
+            rollup = rollup_type(wool_type, filters)
+            if rollup is not None:
+                conn, key = rollup
+                all_series[wool_type] = {
+                    str(row['sale_date']): round(row['weighted_price'] / 100, 2)
+                    for row in rollup_rows(conn, key, ['weighted_price'])
+                }
+                continue
+            pending.append(wool_type)
+        
+        # One query for every remaining type, split by type in memory
+        lots = lots_by_type(pending, filters, [
+            ('sale_date', 'date'), ('price', 'float'), ('bales', 'float')
+        ])
+        
+        # Volume-weighted averages of each date's lots within 20% of the median, all types in one pass
+        days = reduce_series([valid_lots(lots[wool_type]) for wool_type in pending])
+        priced = days['total_bales'] > 0
+        series_index = days['series'][priced]
+        sale_dates = np.datetime_as_string(days['sale_date'][priced]).tolist()
+        prices = [round(price / 100, 2) for price in days['weighted_price'][priced].tolist()]
+        bounds = np.searchsorted(series_index, np.arange(len(pending) + 1)).tolist()
+        for idx, wool_type in enumerate(pending):
+            all_series[wool_type] = dict(zip(sale_dates[bounds[idx]:bounds[idx + 1]], prices[bounds[idx]:bounds[idx + 1]]))
         
         # Get all unique dates across all series
         all_dates = sorted(set(date for series in all_series.values() for date in series.keys()))
         
         # Build datasets for Chart.js
         datasets = []
-        colors = ['#3D7F4B', '#1976D2', '#D32F2F', '#F57C00', '#7B1FA2']
-        
         for idx, wool_type in enumerate(wool_types):
             series_data = all_series.get(wool_type, {})
-            data_values = [series_data.get(date, None) for date in all_dates]
-            
-            datasets.append({
-                'label': wool_type,
-                'data': data_values,
-                'borderColor': colors[idx % len(colors)],
-                'backgroundColor': colors[idx % len(colors)] + '20',
-                'borderWidth': 2,
-                'tension': 0.1,
-                'fill': False,
-                'spanGaps': True
-            })
+            datasets.append(series_dataset(wool_type, [series_data.get(date, None) for date in all_dates], idx))
         
         return jsonify({
             'labels': all_dates,
@@ -1740,6 +1807,8 @@ def get_compare_chart():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/price_chart', methods=['POST'])
+@query_budget(30)
+@cached_response
 def get_price_chart():
     """Get price data grouped by sale_date for chart"""
     try:
@@ -1768,157 +1837,65 @@ def get_price_chart():
         if data.get('wool_type_search'):
             search_term = data['wool_type_search'].strip()
             if search_term:
-                query += " AND (CAST(wool_type_id AS CHAR) = %s OR type_combined = %s)"
-                params.append(search_term)
-                params.append(search_term)
+                condition, condition_params = type_condition(search_term)
+                query += f" AND {condition}"
+                params.extend(condition_params)
         
         # Apply column filters (same as search endpoint)
-        if data.get('column_filters'):
-            for filter_item in data['column_filters']:
-                column = filter_item.get('column')
-                operator = filter_item.get('operator')
-                value = filter_item.get('value')
-                value2 = filter_item.get('value2')
-                
-                if not column or not operator or not value:
-                    continue
-                
-                # Security: Validate column name against whitelist
-                if column not in ALLOWED_COLUMNS:
-                    print(f"Warning: Invalid column name attempted: {column}")
-                    continue
-                
-                # Build filter condition based on operator
-                if operator == 'eq':
-                    query += f" AND {column} = %s"
-                    params.append(value)
-                elif operator == 'ne':
-                    query += f" AND {column} != %s"
-                    params.append(value)
-                elif operator == 'gt':
-                    query += f" AND {column} > %s"
-                    params.append(value)
-                elif operator == 'lt':
-                    query += f" AND {column} < %s"
-                    params.append(value)
-                elif operator == 'gte':
-                    query += f" AND {column} >= %s"
-                    params.append(value)
-                elif operator == 'lte':
-                    query += f" AND {column} <= %s"
-                    params.append(value)
-                elif operator == 'between' and value2:
-                    query += f" AND {column} BETWEEN %s AND %s"
-                    params.append(value)
-                    params.append(value2)
-                elif operator == 'contains':
-                    query += f" AND {column} LIKE %s"
-                    params.append(f"%{value}%")
-                elif operator == 'not_contains':
-                    query += f" AND {column} NOT LIKE %s"
-                    params.append(f"%{value}%")
+        filters = ColumnFilters.compile(data.get('column_filters'))
+        filter_sql, filter_params = filters.sql()
+        query += filter_sql
+        params.extend(filter_params)
         
         # Don't group yet - get all prices for each date so we can filter outliers
         query += " ORDER BY sale_date ASC"
         
-        conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(query, params)
-        all_results = cursor.fetchall()
-        
-        # Group by sale_date - store (price, bales) tuples for weighted averaging
-        from collections import defaultdict
-        import statistics
-        
-        date_data = defaultdict(list)
-        for row in all_results:
-            if row['sale_date'] and row['price'] and row['bales']:
-                date_data[row['sale_date']].append({
-                    'price': float(row['price']),
-                    'bales': float(row['bales']),
-                    'type_combined': row.get('type_combined'),
-                    'colour': float(row['colour']) if row.get('colour') is not None else None,
-                    'vegetable_matter': float(row['vegetable_matter']) if row.get('vegetable_matter') is not None else None
-                })
+        # Single type with no lot filters - read the pre-reduced daily rollup
+        rollup = rollup_type(data.get('wool_type_search'), filters)
+        if rollup is not None:
+            return jsonify(price_chart_from_rollup(*rollup))
+        
+        cols = valid_lots(lot_columns(data.get('wool_type_search'), filters, query, params, [
+            ('sale_date', 'date'), ('price', 'float'), ('bales', 'float'),
+            ('type_combined', 'str'), ('colour', 'float'), ('vegetable_matter', 'float')
+        ], require_bales=True))
+        
+        # Volume-weighted averages of each date's lots within 20% of the median
+        days = reduce_dates(cols, with_quality=True)
+        # Wool type shown per date: most common type_combined among the kept lots
+        day_types = most_common(cols['type_combined'], days['starts'], days['keep'])
         
-        # Calculate volume-weighted filtered averages
         labels = []
         prices = []
         data_quality = []  # Count of data points used for each average
-        stats_data = []  # For statistics summary
         table_data = []  # For table view: date, wooltype, avg colour, avg vm, avg price, # of matched lots
         
-        for sale_date in sorted(date_data.keys()):
-            items = date_data[sale_date]
+        for i in np.flatnonzero(days['total_bales'] > 0):
+            weighted_avg_price_dollars = float(days['weighted_price'][i]) / 100  # Convert cents to dollars
+            avg_colour = days['mean_colour'][i]
+            avg_vm = days['mean_vm'][i]
             
-            if len(items) == 0:
-                continue
+            date_key = str(days['sale_date'][i])
+            labels.append(date_key)
+            prices.append(round(weighted_avg_price_dollars, 2))
+            data_quality.append(int(days['kept_lots'][i]))
             
-            # Calculate median price for outlier filtering
-            price_list = [item['price'] for item in items]
-            median_price = statistics.median(price_list)
-            
-            # Filter outliers: remove items where price is +/- 20% from median
-            lower_bound = median_price * 0.8
-            upper_bound = median_price * 1.2
-            filtered_items = [item for item in items if lower_bound <= item['price'] <= upper_bound]
-            
-            # If we filtered everything out, use original list
-            if len(filtered_items) == 0:
-                filtered_items = items
-            
-            # Calculate volume-weighted average: sum(price * bales) / sum(bales)
-            total_weighted_price = sum(item['price'] * item['bales'] for item in filtered_items)
-            total_bales = sum(item['bales'] for item in filtered_items)
-            
-            if total_bales > 0:
-                weighted_avg_price = total_weighted_price / total_bales
-                weighted_avg_price_dollars = weighted_avg_price / 100  # Convert cents to dollars
-                
-                # Get wool type (use most common type_combined, or first if all same)
-                wool_types = [item['type_combined'] for item in filtered_items if item.get('type_combined')]
-                wool_type = wool_types[0] if wool_types else ''
-                if len(set(wool_types)) > 1:
-                    # Multiple types - use most common
-                    from collections import Counter
-                    wool_type = Counter(wool_types).most_common(1)[0][0]
-                
-                # Calculate average colour (simple average, not weighted)
-                colours = [item['colour'] for item in filtered_items if item.get('colour') is not None]
-                avg_colour = round(statistics.mean(colours), 2) if colours else None
-                
-                # Calculate average VM (simple average, not weighted)
-                vms = [item['vegetable_matter'] for item in filtered_items if item.get('vegetable_matter') is not None]
-                avg_vm = round(statistics.mean(vms), 2) if vms else None
-            
-                labels.append(sale_date.strftime('%Y-%m-%d'))
-                prices.append(round(weighted_avg_price_dollars, 2))
-                data_quality.append(len(filtered_items))  # Store count of data points
-                
-                # Store for table view
-                table_data.append({
-                    'date': sale_date.strftime('%Y-%m-%d'),
-                    'wooltype': wool_type,
-                    'avg_colour': avg_colour,
-                    'avg_vm': avg_vm,
-                    'avg_price': round(weighted_avg_price_dollars, 2),
-                    'matched_lots': len(filtered_items)
-                })
-                
-                # Store for statistics
-                stats_data.extend([item['price'] / 100 for item in filtered_items])
+            # Store for table view (colour and VM are simple averages, not weighted)
+            table_data.append({
+                'date': date_key,
+                'wooltype': day_types[i],
+                'avg_colour': round(float(avg_colour), 2) if not np.isnan(avg_colour) else None,
+                'avg_vm': round(float(avg_vm), 2) if not np.isnan(avg_vm) else None,
+                'avg_price': round(weighted_avg_price_dollars, 2),
+                'matched_lots': int(days['kept_lots'][i])
+            })
+        
+        # Kept lot prices of the charted dates, for the statistics summary
+        charted = np.repeat(days['total_bales'] > 0, days['lot_count']) & days['keep']
+        stats_data = (cols['price'][charted] / 100).tolist()
         
         # Calculate statistics summary
-        statistics_summary = None
-        if len(stats_data) > 0:
-            statistics_summary = {
-                'min': round(min(stats_data), 2),
-                'max': round(max(stats_data), 2),
-                'median': round(statistics.median(stats_data), 2),
-                'mean': round(statistics.mean(stats_data), 2),
-                'std_dev': round(statistics.stdev(stats_data), 2) if len(stats_data) > 1 else 0,
-                'count': len(stats_data)
-            }
+        statistics_summary = price_statistics(stats_data)
         
         return jsonify({
             'labels': labels,
@@ -2396,163 +2373,282 @@ def get_export_data_countries():
 
 # ==================== MARKET REPORTS API ENDPOINTS ====================
 
+def search_date_filters(date_filter):
+    """
+    A simple or compare saved search's date range as sale_date conditions
+    (only a 'between' range narrows its prices). Saved blends take their
+    date filter as the blends chart does, ColumnFilters.date_filter.
+    """
+    if not date_filter or date_filter.get('operator') != 'between':
+        return ColumnFilters()
+    return ColumnFilters.date_filter({
+        'operator': 'between',
+        'value': date_filter['value'],
+        'value2': date_filter.get('value2', date_filter['value'])
+    })
+
+def saved_blend(blend_data):
+    """
+    (entries, weights, entry filters, date filter) of a saved blend, kept
+    at the top level or under 'blend_data'. Weights and entry filters are
+    padded to one per entry.
+    """
+    entries, weights, entry_filters, date_filter = [], [], [], None
+    
+    # Try different possible structures
+    if blend_data.get('blend_data'):
+        blend_info = blend_data['blend_data']
+        entries = blend_info.get('entries', [])
+        weights = list(blend_info.get('weights', []))
+        entry_filters = list(blend_info.get('entryFilters', []))
+        date_filter = blend_info.get('dateFilter')
+    elif blend_data.get('entries'):
+        entries = blend_data['entries']
+        weights = list(blend_data.get('weights', [1] * len(entries) if entries else []))
+        entry_filters = list(blend_data.get('entryFilters', []))
+        date_filter = blend_data.get('dateFilter')
+    
+    # Ensure weights array matches entries length
+    if len(weights) < len(entries):
+        weights.extend([1.0] * (len(entries) - len(weights)))
+    
+    # Ensure entry_filters array matches entries length
+    if len(entry_filters) < len(entries):
+        entry_filters.extend([[]] * (len(entries) - len(entry_filters)))
+    
+    return entries, weights, entry_filters, date_filter
+
+def search_price_query(saved_search):
+    """
+    (type condition, params, wool type search term, column filters, date
+    filters) for a simple or compare saved search. Compare searches match
+    their listed types exactly (type_combined IN, which the rollup's folded
+    keys don't reproduce), so only a simple search has a term for
+    rollup_latest_days.
+    """
+    search_filters = saved_search.get('filters') or {}
+    condition, params, term = None, [], None
+    if isinstance(saved_search.get('wool_types'), list) and saved_search['wool_types']:
+        types = saved_search['wool_types']
+        condition = f"type_combined IN ({','.join(['%s'] * len(types))})"
+        params = list(types)
+    elif search_filters.get('wool_type_search'):
+        term = search_filters['wool_type_search'].strip()
+        condition, params = type_condition(term)
+    filters = ColumnFilters.compile(search_filters.get('column_filters', []))
+    return condition, params, term, filters, search_date_filters(saved_search.get('dateFilter'))
+
+def rollup_latest_days(term, filters, date_filters):
+    """
+    A simple search's two most recent sale days [(sale_date, sum of price x
+    bales, bales)] from the daily rollup, newest first, or None when its
+    term (or its filters) can't be read from the rollup
+    """
+    rollup = rollup_type(term, filters) if term else None
+    if rollup is None:
+        return None
+    conn, key = rollup
+    rows = rollup_rows(conn, key, ['all_price_bales', 'all_bales'], date_filters.sql_conditions())
+    return [(str(row['sale_date']), row['all_price_bales'], row['all_bales']) for row in rows[::-1][:2]]
+
+def latest_days_by_search(queries):
+    """
+    The two most recent sale days [(sale_date, sum of price x bales,
+    bales)] of several searches, {id: days} for queries {id: (condition,
+    params, filters)}, in one query: a grouped subquery per search keeps
+    only its latest two dates.
+    """
+    if not queries:
+        return {}
+    parts = []
+    params = []
+    for index, (search_id, (condition, condition_params, filters)) in enumerate(queries.items()):
+        filter_sql, filter_params = filters.sql()
+        parts.append(f"""
+            SELECT * FROM (
+                SELECT {index} AS search_index, sale_date, SUM(price * bales) AS price_bales, SUM(bales) AS total_bales
+                FROM auction_data_joined
+                WHERE price > 10 AND bales > 0 AND sale_date IS NOT NULL{f' AND {condition}' if condition else ''}{filter_sql}
+                GROUP BY sale_date
+                ORDER BY sale_date DESC
+                LIMIT 2
+            ) AS search_{index}
+        """)
+        params.extend(condition_params + filter_params)
+    conn, tunnel = get_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(" UNION ALL ".join(parts), params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    search_ids = list(queries)
+    days = {search_id: [] for search_id in search_ids}
+    for search_index, sale_date, price_bales, total_bales in rows:
+        days[search_ids[int(search_index)]].append(
+            (normalize_sale_date(sale_date), float(price_bales or 0), float(total_bales or 0)))
+    for search_days in days.values():
+        search_days.sort(reverse=True)
+    return days
+
+def weighted_days(days):
+    """[(sale_date, bale-weighted price)] from sale days [(sale_date, sum of price x bales, bales)]"""
+    return [(sale_date, price_bales / bales if bales > 0 else 0) for sale_date, price_bales, bales in days]
+
+def blend_latest_prices(entries, weights, entry_filters, date_filters):
+    """
+    A saved blend's price (cents) on its two most recent sale dates
+    [(sale_date, price)], newest first: the weighted average of its entry
+    lines as the blends page charts it, built from the cached per-type series
+    """
+    entry_filters = [ColumnFilters.compile(filters, COMPARE_OPERATORS) for filters in entry_filters]
+    all_series = blend_entry_series(entries, entry_filters, date_filters)
+    entry_weights = {}
+    for entry, weight in zip(entries, weights):
+        if entry.get('types'):
+            entry_weights[entry.get('label', '')] = blend_weight(weight)
+    all_dates, labels, entry_prices, weighted_average = blend_average(all_series, entry_weights)
+    priced = [row for row in range(len(all_dates)) if not np.isnan(weighted_average[row])]
+    return [(all_dates[row], float(weighted_average[row]) * 100) for row in reversed(priced[-2:])]
+
+def price_change(prices):
+    """Current and previous price (cents) and % change from a search's latest two [(sale_date, price)]"""
+    current_price = prices[0][1] if prices else None
+    previous_price = prices[1][1] if len(prices) > 1 else None
+    
+    # Calculate percent change: (current - previous)/current*100
+    percent_change = None
+    if current_price and previous_price:
+        percent_change = ((current_price - previous_price) / current_price) * 100
+    
+    # Prices in cents (as stored in database)
+    return {
+        'current_price': round(current_price, 2) if current_price else None,
+        'current_date': prices[0][0] if prices else None,
+        'previous_price': round(previous_price, 2) if previous_price else None,
+        'previous_date': prices[1][0] if len(prices) > 1 else None,
+        'percent_change': round(percent_change, 2) if percent_change is not None else None
+    }
+
+def search_failed(search_id, error, failures, raise_errors):
+    """
+    Record one saved search's pricing failure, or re-raise it: with
+    raise_errors, and whenever the database itself is down (that is a 503
+    for the whole request, not one search's problem)
+    """
+    if raise_errors or isinstance(error, DatabaseUnavailable):
+        raise error
+    print(f"Search prices: saved search {search_id} failed: {error}")
+    failures[search_id] = error
+
+def pending_latest_days(pending, failures, raise_errors):
+    """
+    latest_days_by_search for the pending searches, falling back to one
+    query per search when the combined one fails, so a search with a bad
+    filter (or one that runs the budget out) only fails itself
+    """
+    try:
+        return latest_days_by_search(pending)
+    except Exception as e:
+        if len(pending) == 1:
+            search_failed(next(iter(pending)), e, failures, raise_errors)
+            return {}
+        if isinstance(e, DatabaseUnavailable) or raise_errors:
+            raise
+        print(f"Search prices: combined query failed ({e}), pricing {len(pending)} searches one by one")
+    days = {}
+    for search_id, query in pending.items():
+        try:
+            raise_if_over_budget()
+            days.update(latest_days_by_search({search_id: query}))
+        except Exception as e:
+            search_failed(search_id, e, failures, raise_errors)
+    return days
+
+def search_prices(saved_searches, raise_errors=False):
+    """
+    Price responses (or {'error': ...}) for a list of saved searches, in
+    order. Each search's result is cached per data version; the misses are
+    read from the daily rollup where possible and the rest priced together
+    in one query. Blends are priced from the cached per-type blend series.
+    A search that fails gets its own error and isn't cached (nor is the
+    response that carries it); with raise_errors the failure propagates.
+    """
+    results = [None] * len(saved_searches)
+    blends = {}
+    queries = {}
+    payloads = {}
+    failures = {}
+    for search_id, saved_search in enumerate(saved_searches):
+        if not isinstance(saved_search, dict):
+            results[search_id] = {'error': 'Invalid saved search'}
+            continue
+        if saved_search.get('page') == 'blends' or saved_search.get('type') == 'blend':
+            entries, weights, entry_filters, date_filter = saved_blend(saved_search)
+            if not entries:
+                results[search_id] = {'error': 'Invalid blend data - no entries found'}
+                continue
+            blends[search_id] = (entries, weights, entry_filters, ColumnFilters.date_filter(date_filter))
+            payloads[search_id] = {
+                'blend': [
+                    [entry.get('types', []), entry.get('label', ''), blend_weight(weight),
+                     ColumnFilters.compile(filters, COMPARE_OPERATORS).canonical()]
+                    for entry, weight, filters in zip(entries, weights, entry_filters)
+                ],
+                'filters': blends[search_id][3].canonical()
+            }
+            continue
+        queries[search_id] = search_price_query(saved_search)
+        condition, params, term, filters, date_filters = queries[search_id]
+        payloads[search_id] = {
+            'condition': condition,
+            'params': params,
+            'filters': (date_filters + filters).canonical()
+        }
+    
+    def compute(missing):
+        pending = {}
+        prices = {}
+        for search_id in missing:
+            try:
+                if search_id in blends:
+                    prices[search_id] = blend_latest_prices(*blends[search_id])
+                    continue
+                condition, params, term, filters, date_filters = queries[search_id]
+                days = rollup_latest_days(term, filters, date_filters)
+            except Exception as e:
+                search_failed(search_id, e, failures, raise_errors)
+                continue
+            if days is None:
+                pending[search_id] = (condition, params, date_filters + filters)
+                continue
+            prices[search_id] = weighted_days(days)
+        if pending:
+            for search_id, days in pending_latest_days(pending, failures, raise_errors).items():
+                prices[search_id] = weighted_days(days)
+        return {search_id: price_change(latest) for search_id, latest in prices.items()}
+    
+    for search_id, result in cached_values('search_prices', payloads, compute, lambda: get_db()[0]).items():
+        results[search_id] = result
+    for search_id, error in failures.items():
+        results[search_id] = {'error': str(error)}
+    if failures:
+        # A failure may be transient (a timeout) - don't replay it from the response cache
+        g.skip_result_cache = True
+    return results
+
 @app.route('/api/market_report/search_prices', methods=['POST'])
+@query_budget(20)
+@cached_response
 def get_search_prices():
     """Get current price (latest sale date) and previous price for a saved search"""
     try:
         data = request.get_json()
-        saved_search = data.get('savedSearch', {})
-        
-        # Build query based on saved search type
-        if saved_search.get('page') == 'blends' or saved_search.get('type') == 'blend':
-            # Handle blend search
-            # For blends, we'd need to get the blend data and calculate
-            # For now, return error - blend pricing needs special handling
-            return jsonify({'error': 'Blend pricing not yet implemented'}), 400
-        
-        # Build query for simple/compare searches
-        query = """
-            SELECT sale_date, price, bales
-            FROM auction_data_joined
-            WHERE price > 10 AND bales > 0
-        """
-        
-        params = []
-        
-        # Apply wool type filter
-        if saved_search.get('wool_types'):
-            wool_types = saved_search['wool_types']
-            if isinstance(wool_types, list):
-                placeholders = ','.join(['%s'] * len(wool_types))
-                query += f" AND type_combined IN ({placeholders})"
-                params.extend(wool_types)
-        elif saved_search.get('filters', {}).get('wool_type_search'):
-            search_term = saved_search['filters']['wool_type_search'].strip()
-            query += " AND (CAST(wool_type_id AS CHAR) = %s OR type_combined = %s)"
-            params.append(search_term)
-            params.append(search_term)
-        
-        # Apply column filters
-        filters = saved_search.get('filters', {}).get('column_filters', [])
-        date_filter = saved_search.get('dateFilter')
-        
-        if date_filter:
-            if date_filter.get('operator') == 'between':
-                query += " AND sale_date BETWEEN %s AND %s"
-                params.append(date_filter['value'])
-                params.append(date_filter.get('value2', date_filter['value']))
-        
-        if filters:
-            for filter_item in filters:
-                column = filter_item.get('column')
-                operator = filter_item.get('operator')
-                value = filter_item.get('value')
-                value2 = filter_item.get('value2')
-                
-                if not column or not operator or not value:
-                    continue
-                
-                # Security: Validate column name against whitelist
-                if column not in ALLOWED_COLUMNS:
-                    print(f"Warning: Invalid column name attempted: {column}")
-                    continue
-                
-                # Build filter condition based on operator (same as price_chart endpoint)
-                if operator == 'eq':
-                    query += f" AND {column} = %s"
-                    params.append(value)
-                elif operator == 'ne':
-                    query += f" AND {column} != %s"
-                    params.append(value)
-                elif operator == 'gt':
-                    query += f" AND {column} > %s"
-                    params.append(value)
-                elif operator == 'lt':
-                    query += f" AND {column} < %s"
-                    params.append(value)
-                elif operator == 'gte':
-                    query += f" AND {column} >= %s"
-                    params.append(value)
-                elif operator == 'lte':
-                    query += f" AND {column} <= %s"
-                    params.append(value)
-                elif operator == 'between' and value2:
-                    query += f" AND {column} BETWEEN %s AND %s"
-                    params.append(value)
-                    params.append(value2)
-                elif operator == 'contains':
-                    query += f" AND {column} LIKE %s"
-                    params.append(f"%{value}%")
-                elif operator == 'not_contains':
-                    query += f" AND {column} NOT LIKE %s"
-                    params.append(f"%{value}%")
-        
-        query += " ORDER BY sale_date DESC LIMIT 1000"
-        
-        conn, tunnel = get_db()
-        cursor = None
-        try:
-            cursor = conn.cursor(dictionary=True)
-            # Ensure connection is alive before executing
-            conn.ping(reconnect=True)
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            if not results:
-                return jsonify({
-                    'current_price': None,
-                    'current_date': None,
-                    'previous_price': None,
-                    'previous_date': None,
-                    'percent_change': None
-                })
-            
-            # Get unique sale dates, sorted desc
-            dates = sorted(set(r['sale_date'] for r in results if r['sale_date']), reverse=True)
-            
-            if len(dates) == 0:
-                return jsonify({
-                    'current_price': None,
-                    'current_date': None,
-                    'previous_price': None,
-                    'previous_date': None,
-                    'percent_change': None
-                })
-            
-            # Calculate weighted average for latest date
-            latest_date = dates[0]
-            latest_rows = [r for r in results if r['sale_date'] == latest_date]
-            total_weight = sum(float(r['bales']) for r in latest_rows)
-            current_price = sum(float(r['price']) * float(r['bales']) for r in latest_rows) / total_weight if total_weight > 0 else 0
-            
-            # Get previous date price
-            previous_price = None
-            previous_date = None
-            if len(dates) > 1:
-                previous_date = dates[1]
-                prev_rows = [r for r in results if r['sale_date'] == previous_date]
-                prev_weight = sum(float(r['bales']) for r in prev_rows)
-                previous_price = sum(float(r['price']) * float(r['bales']) for r in prev_rows) / prev_weight if prev_weight > 0 else 0
-            
-            # Calculate percent change: (current - previous)/current*100
-            percent_change = None
-            if current_price and previous_price:
-                percent_change = ((current_price - previous_price) / current_price) * 100
-            
-            # Return prices in cents (as stored in database)
-            return jsonify({
-                'current_price': round(current_price, 2) if current_price else None,  # Already in cents
-                'current_date': str(latest_date) if latest_date else None,
-                'previous_price': round(previous_price, 2) if previous_price else None,  # Already in cents
-                'previous_date': str(previous_date) if previous_date else None,
-                'percent_change': round(percent_change, 2) if percent_change is not None else None
-            })
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except:
-                    pass
+        # A single search's failure is the request's failure (500, or 503/504 via db_error_response)
+        result = search_prices([data.get('savedSearch', {})], raise_errors=True)[0]
+        if 'error' in result:
+            return jsonify(result), 400
+        return jsonify(result)
     
     except Exception as e:
         print(f"Search prices error: {e}")
@@ -2560,6 +2656,24 @@ def get_search_prices():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/market_report/search_prices_batch', methods=['POST'])
+@query_budget(60)
+@cached_response
+def get_search_prices_batch():
+    """Current and previous prices for every saved search in a report, in request order"""
+    try:
+        data = request.get_json()
+        saved_searches = data.get('savedSearches', [])
+        if not isinstance(saved_searches, list):
+            return jsonify({'error': 'savedSearches must be a list'}), 400
+        return jsonify({'prices': search_prices(saved_searches)})
+    
+    except Exception as e:
+        print(f"Search prices batch error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/market_report/exchange_rate')
 def get_exchange_rate():
     """Get current NZD/USD exchange rate from a live API"""
@@ -2587,6 +2701,8 @@ def get_exchange_rate():
         return jsonify({'rate': None, 'error': str(e)})
 
 @app.route('/api/market_report/indicator_data', methods=['POST'])
+@query_budget(60)
+@cached_response
 def get_indicator_data():
     """Get indicator chart data for a calendar year (Jan-Dec) and previous year"""
     try:
@@ -2596,31 +2712,7 @@ def get_indicator_data():
         previous_year = year - 1
         
         # Extract blend entries from saved blend data
-        entries = []
-        weights = []
-        entry_filters = []
-        date_filter = None
-        
-        # Try different possible structures
-        if blend_data.get('blend_data'):
-            blend_info = blend_data['blend_data']
-            entries = blend_info.get('entries', [])
-            weights = blend_info.get('weights', [])
-            entry_filters = blend_info.get('entryFilters', [])
-            date_filter = blend_info.get('dateFilter')
-        elif blend_data.get('entries'):
-            entries = blend_data['entries']
-            weights = blend_data.get('weights', [1] * len(entries) if entries else [])
-            entry_filters = blend_data.get('entryFilters', [])
-            date_filter = blend_data.get('dateFilter')
-        
-        # Ensure weights array matches entries length
-        if len(weights) < len(entries):
-            weights.extend([1.0] * (len(entries) - len(weights)))
-        
-        # Ensure entry_filters array matches entries length
-        if len(entry_filters) < len(entries):
-            entry_filters.extend([[]] * (len(entries) - len(entry_filters)))
+        entries, weights, entry_filters, date_filter = saved_blend(blend_data)
         
         if not entries:
             return jsonify({'error': 'Invalid blend data - no entries found'}), 400
@@ -2628,16 +2720,21 @@ def get_indicator_data():
         print(f"Getting indicator data for {len(entries)} entries, year {year}")
         start_time = time.time()
         
-        # Get data for current year (Jan 1 - Dec 31)
-        current_year_data = get_calendar_year_data(entries, weights, entry_filters, date_filter, year)
-        elapsed_current = time.time() - start_time
-        print(f"Current year data retrieved in {elapsed_current:.2f}s")
+        # Per-type monthly totals for both years in one pass (all operators like price_chart endpoint)
+        entry_filters = [ColumnFilters.compile(filters) for filters in entry_filters[:len(entries)]]
+        try:
+            totals = get_calendar_totals(entries, entry_filters, previous_year, year)
+        except Exception as e:
+            raise_if_over_budget()
+            print(f"Calendar year data error: {e}")
+            import traceback
+            traceback.print_exc()
+            totals = {}
+        print(f"Calendar totals retrieved in {time.time() - start_time:.2f}s")
         
-        # Get data for previous year
-        previous_start = time.time()
-        previous_year_data = get_calendar_year_data(entries, weights, entry_filters, date_filter, previous_year)
-        elapsed_previous = time.time() - previous_start
-        print(f"Previous year data retrieved in {elapsed_previous:.2f}s")
+        # Blend weighting over the small in-memory result, Jan-Dec of each year
+        current_year_data = get_calendar_year_data(entries, weights, entry_filters, totals, year)
+        previous_year_data = get_calendar_year_data(entries, weights, entry_filters, totals, previous_year)
         
         total_elapsed = time.time() - start_time
         print(f"Total indicator data retrieval took {total_elapsed:.2f}s")
@@ -2654,27 +2751,16 @@ def get_indicator_data():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/market_report/most_recent_date')
+@query_budget(10)
 def get_most_recent_date():
     """Get the most recent sale date from the database"""
-    cursor = None
     try:
         print("Getting most recent date...")
-        conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        
-        query = """
-            SELECT MAX(sale_date) as most_recent_date
-            FROM auction_data_joined
-            WHERE sale_date IS NOT NULL
-        """
-        cursor.execute(query)
-        result = cursor.fetchone()
-        
-        most_recent_date = result['most_recent_date'] if result and result['most_recent_date'] else None
+        most_recent_date = get_sale_metadata(lambda: get_db()[0]).most_recent_date()
         
         print(f"Most recent date: {most_recent_date}")
         return jsonify({
-            'mostRecentDate': str(most_recent_date) if most_recent_date else None
+            'mostRecentDate': most_recent_date
         })
     
     except Exception as e:
@@ -2682,16 +2768,12 @@ def get_most_recent_date():
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
 
 @app.route('/api/market_report/sale_stats', methods=['POST'])
+@query_budget(10)
+@cached_response
 def get_sale_stats():
     """Get offering (total bales) and passings (sold/total) for a sale date"""
-    conn = None
-    tunnel = None
-    cursor = None
     try:
         data = request.get_json()
         sale_date = data.get('saleDate')
@@ -2699,230 +2781,159 @@ def get_sale_stats():
         if not sale_date:
             return jsonify({'error': 'Sale date required'}), 400
         
-        # Ensure sale_date is in the correct format (YYYY-MM-DD)
-        if isinstance(sale_date, str):
-            # If it's a datetime string, extract just the date part
-            if ' ' in sale_date:
-                sale_date = sale_date.split(' ')[0]
-            # If it's a datetime object string representation, parse it
-            if 'T' in sale_date:
-                sale_date = sale_date.split('T')[0]
-        
-        conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get total bales for this sale date
-        query_total = """
-            SELECT SUM(bales) as total_bales, SUM(CASE WHEN is_sold = 1 THEN bales ELSE 0 END) as sold_bales
-            FROM auction_data_joined
-            WHERE sale_date = %s AND bales > 0
-        """
-        cursor.execute(query_total, [sale_date])
-        result = cursor.fetchone()
-        
-        if not result:
-            return jsonify({
-                'totalBales': 0,
-                'soldBales': 0,
-                'passings': '0%'
-            })
-        
-        total_bales = int(result['total_bales'] or 0)
-        sold_bales = int(result['sold_bales'] or 0)
-        
-        # Calculate passings percentage
-        passings = round((sold_bales / total_bales) * 100, 1) if total_bales > 0 else 0
-        
-        return jsonify({
-            'totalBales': total_bales,
-            'soldBales': sold_bales,
-            'passings': f'{passings}%'
-        })
+        return jsonify(get_sale_metadata(lambda: get_db()[0]).sale_stats(sale_date))
     
     except Exception as e:
         print(f"Sale stats error: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
-    finally:
-        if cursor:
+
+def monthly_price_totals(rows, wool_types, type_names=None):
+    """
+    Aggregate rows (type_combined, wool_type_id, year, month, sum(price * bales),
+    sum(bales)) -> {wool type: {(year, month): [price_bales, bales]}}, adding up
+    every group each search term matches. type_names maps a term to the
+    type_combined it was resolved to (rollup rows carry no wool_type_id).
+    """
+    totals = {wool_type: {} for wool_type in wool_types}
+    if not rows:
+        return totals
+    type_combined = np.array([row[0] for row in rows], dtype=object)
+    wool_type_ids = np.array([np.nan if row[1] is None else float(row[1]) for row in rows], dtype=np.float64)
+    terms = {wool_type: (type_names or {}).get(wool_type, wool_type) for wool_type in wool_types}
+    masks = type_masks(list(terms.values()), type_combined, wool_type_ids)
+    for wool_type, term in terms.items():
+        months = totals[wool_type]
+        for i in np.flatnonzero(masks[term]):
+            _, _, sale_year, sale_month, price_bales, bales = rows[i]
+            month_totals = months.setdefault((int(sale_year), int(sale_month)), [0.0, 0.0])
+            month_totals[0] += float(price_bales or 0)
+            month_totals[1] += float(bales or 0)
+    return totals
+
+def get_calendar_totals(entries, entry_filters, first_year, last_year):
+    """
+    Monthly sum(price * bales) and sum(bales) per blend type over the calendar
+    years first_year..last_year, keyed by (entry filter key, wool type).
+    Grouping by type and YEAR/MONTH happens in the database: one aggregate
+    statement per distinct entry filter set covers every year, and
+    unfiltered types the daily rollup covers are summed from the rollup.
+    """
+    date_params = [f'{first_year}-01-01', f'{last_year}-12-31']
+    totals = {}
+    rollup_names = {}
+    pending = {}
+    
+    for entry, filters in zip(entries, entry_filters):
+        for wool_type in entry.get('types', []):
+            rollup = rollup_type(wool_type, filters)
+            if rollup is not None:
+                rollup_names[wool_type] = rollup[1]
+                continue
+            group_types = pending.setdefault(filters.key(), (filters, []))[1]
+            if wool_type not in group_types:
+                group_types.append(wool_type)
+    
+    conn, tunnel = get_db()
+    if rollup_names:
+        names = sorted(set(rollup_names.values()))
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT type_combined, NULL, YEAR(sale_date) AS sale_year, MONTH(sale_date) AS sale_month,
+                   SUM(all_price_bales), SUM(all_bales)
+            FROM daily_type_prices
+            WHERE type_combined IN ({', '.join(['%s'] * len(names))})
+            AND sale_date >= %s AND sale_date <= %s
+            GROUP BY type_combined, sale_year, sale_month
+        """, names + date_params)
+        rows = cursor.fetchall()
+        cursor.close()
+        for wool_type, months in monthly_price_totals(rows, list(rollup_names), rollup_names).items():
+            totals[(ColumnFilters().key(), wool_type)] = months
+    
+    for filter_key, (filters, wool_types) in pending.items():
+        condition, params = types_condition(wool_types)
+        filter_sql, filter_params = filters.sql()
+        query = f"""
+            SELECT type_combined, wool_type_id, YEAR(sale_date) AS sale_year, MONTH(sale_date) AS sale_month,
+                   SUM(price * bales), SUM(bales)
+            FROM auction_data_joined
+            WHERE price > 10 AND bales > 0
+            AND sale_date >= %s AND sale_date <= %s
+            AND {condition}{filter_sql}
+            GROUP BY type_combined, wool_type_id, sale_year, sale_month
+        """
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, date_params + params + filter_params)
+            rows = cursor.fetchall()
             cursor.close()
-        # Note: conn and tunnel are managed by get_db() and should not be closed here
+        except Exception as query_error:
+            raise_if_over_budget()  # Out of time - don't keep querying
+            print(f"Query error in get_calendar_totals: {query_error}")
+            import traceback
+            traceback.print_exc()
+            # Leave these types out and carry on with the other filter sets
+            continue
+        for wool_type, months in monthly_price_totals(rows, wool_types).items():
+            totals[(filter_key, wool_type)] = months
+    
+    return totals
 
-def get_calendar_year_data(entries, weights, entry_filters, date_filter, year):
+def get_calendar_year_data(entries, weights, entry_filters, totals, year):
     """Get monthly average prices for a calendar year using blend logic"""
-    conn = None
-    tunnel = None
-    cursor = None
-    try:
-        from collections import defaultdict
-        import statistics
-        
-        # Get a single database connection for all queries
-        conn, tunnel = get_db()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Define month boundaries (calendar year Jan-Dec)
-        months = [
-            (f'{year}-01-01', f'{year}-01-31'),
-            (f'{year}-02-01', f'{year}-02-28' if year % 4 != 0 else f'{year}-02-29'),
-            (f'{year}-03-01', f'{year}-03-31'),
-            (f'{year}-04-01', f'{year}-04-30'),
-            (f'{year}-05-01', f'{year}-05-31'),
-            (f'{year}-06-01', f'{year}-06-30'),
-            (f'{year}-07-01', f'{year}-07-31'),
-            (f'{year}-08-01', f'{year}-08-31'),
-            (f'{year}-09-01', f'{year}-09-30'),
-            (f'{year}-10-01', f'{year}-10-31'),
-            (f'{year}-11-01', f'{year}-11-30'),
-            (f'{year}-12-01', f'{year}-12-31')
-        ]
-        
-        monthly_prices = []
+    monthly_prices = []
+    
+    for month in range(1, 13):
+        # Process blend entries similar to compare_chart_blend
+        all_entry_monthly_data = []
         
-        for month_start, month_end in months:
-            # Process blend entries similar to compare_chart_blend
-            all_entry_monthly_data = []
+        for entry, filters, weight in zip(entries, entry_filters, weights):
+            types = entry.get('types', [])
             
-            for entry_idx, entry in enumerate(entries):
-                types = entry.get('types', [])
-                entry_filter_list = entry_filters[entry_idx] if entry_idx < len(entry_filters) else []
-                weight = weights[entry_idx] if entry_idx < len(weights) else 1.0
-                
-                if not types:
-                    continue
-                
-                # Get data for all types in this entry for this month
-                type_data_list = []
-                
-                for wool_type in types:
-                    query = """
-                        SELECT 
-                            sale_date,
-                            price,
-                            bales
-                        FROM auction_data_joined
-                        WHERE price > 10 AND bales > 0
-                        AND sale_date >= %s AND sale_date <= %s
-                        AND (CAST(wool_type_id AS CHAR) = %s OR type_combined = %s)
-                    """
-                    
-                    params = [month_start, month_end, wool_type, wool_type]
-                    
-                    # Apply per-entry filters (all operators like price_chart endpoint)
-                    for filter_item in entry_filter_list:
-                        column = filter_item.get('column')
-                        operator = filter_item.get('operator')
-                        value = filter_item.get('value')
-                        value2 = filter_item.get('value2')
-                        
-                        if not column or not operator or not value:
-                            continue
-                        
-                        # Security: Validate column name against whitelist
-                        if column not in ALLOWED_COLUMNS:
-                            continue
-                        
-                        # Build filter condition based on operator (same as price_chart endpoint)
-                        if operator == 'eq':
-                            query += f" AND {column} = %s"
-                            params.append(value)
-                        elif operator == 'ne':
-                            query += f" AND {column} != %s"
-                            params.append(value)
-                        elif operator == 'gt':
-                            query += f" AND {column} > %s"
-                            params.append(value)
-                        elif operator == 'lt':
-                            query += f" AND {column} < %s"
-                            params.append(value)
-                        elif operator == 'gte':
-                            query += f" AND {column} >= %s"
-                            params.append(value)
-                        elif operator == 'lte':
-                            query += f" AND {column} <= %s"
-                            params.append(value)
-                        elif operator == 'between' and value2:
-                            query += f" AND {column} BETWEEN %s AND %s"
-                            params.append(value)
-                            params.append(value2)
-                        elif operator == 'contains':
-                            query += f" AND {column} LIKE %s"
-                            params.append(f"%{value}%")
-                        elif operator == 'not_contains':
-                            query += f" AND {column} NOT LIKE %s"
-                            params.append(f"%{value}%")
-                    
-                    # Reuse the same cursor for all queries
-                    try:
-                        # Check connection health before query
-                        if not conn.is_connected():
-                            print("Database connection lost, reconnecting...")
-                            cursor.close()
-                            conn, tunnel = get_db()
-                            cursor = conn.cursor(dictionary=True)
-                        
-                        cursor.execute(query, params)
-                        results = cursor.fetchall()
-                    except Exception as query_error:
-                        print(f"Query error in get_calendar_year_data: {query_error}")
-                        import traceback
-                        traceback.print_exc()
-                        # Continue to next type if this query fails
-                        continue
-                    
-                    # Calculate volume-weighted average for this type this month
-                    if results:
-                        total_weighted_price = sum(float(r['price']) * float(r['bales']) for r in results)
-                        total_bales = sum(float(r['bales']) for r in results)
-                        
-                        if total_bales > 0:
-                            avg_price = total_weighted_price / total_bales
-                            type_data_list.append({
-                                'price': avg_price,
-                                'weight': weight
-                            })
-                
-                # Average across types in this entry (simple average)
-                if type_data_list:
-                    entry_avg_price = sum(t['price'] for t in type_data_list) / len(type_data_list)
-                    all_entry_monthly_data.append({
-                        'price': entry_avg_price,
+            if not types:
+                continue
+            
+            # Volume-weighted average for each type this month
+            type_data_list = []
+            for wool_type in types:
+                price_bales, total_bales = totals.get((filters.key(), wool_type), {}).get((year, month), (0, 0))
+                if total_bales > 0:
+                    type_data_list.append({
+                        'price': price_bales / total_bales,
                         'weight': weight
                     })
             
-            # Calculate weighted blend average across all entries for this month
-            if all_entry_monthly_data:
-                total_weight = sum(e['weight'] for e in all_entry_monthly_data)
-                if total_weight > 0:
-                    weighted_avg = sum(e['price'] * e['weight'] for e in all_entry_monthly_data) / total_weight
-                    monthly_prices.append(round(weighted_avg / 100, 2))  # Convert cents to dollars
-                else:
-                    monthly_prices.append(None)
+            # Average across types in this entry (simple average)
+            if type_data_list:
+                entry_avg_price = sum(t['price'] for t in type_data_list) / len(type_data_list)
+                all_entry_monthly_data.append({
+                    'price': entry_avg_price,
+                    'weight': weight
+                })
+        
+        # Calculate weighted blend average across all entries for this month
+        if all_entry_monthly_data:
+            total_weight = sum(e['weight'] for e in all_entry_monthly_data)
+            if total_weight > 0:
+                weighted_avg = sum(e['price'] * e['weight'] for e in all_entry_monthly_data) / total_weight
+                monthly_prices.append(round(weighted_avg / 100, 2))  # Convert cents to dollars
             else:
                 monthly_prices.append(None)
-        
-        return monthly_prices
+        else:
+            monthly_prices.append(None)
     
-    except Exception as e:
-        print(f"Calendar year data error: {e}")
-        import traceback
-        traceback.print_exc()
-        return [None] * 12
-    finally:
-        # Clean up cursor (connection is managed by get_db())
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
+    return monthly_prices
 
 # ==================== END MARKET REPORTS ENDPOINTS ====================
 
 @app.teardown_appcontext
-def cleanup_connection(error):
-    """Keep connection alive across requests in same context"""
-    pass
+def release_db_connection(error):
+    """Return the request's pooled connection (the tunnel stays up)"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        _return_db_connection(get_pool(), conn)
 
 if __name__ == '__main__':
     # Check if running in production (via gunicorn) or development
@@ -0,0 +1,103 @@
+"""
+Blend engine: per-type daily series aligned into dates x types matrices.
+
+A blend entry groups several wool types; its line is the average of the
+types' daily prices with each type's gaps interpolated, and its colour,
+VM and volume combine the types that actually sold that day, weighted by
+volume. Each type's series is a few parallel arrays (type_series), small
+enough to cache per type and filter set, and every group or weighted
+blend is computed on the aligned matrix instead of per date and type.
+"""
+
+import numpy as np
+
+from daily_prices import fill_gaps
+
+SERIES_FIELDS = ['price', 'avg_colour', 'avg_vm', 'total_volume']
+
+def _round_values(values):
+    """Python round(v, 2) of every non-nan value (np.round rounds some halves differently)"""
+    return np.array([value if value != value else round(value, 2) for value in values.tolist()], dtype=np.float64)
+
+def type_series(sale_dates, weighted_price, weighted_colour, weighted_vm, total_bales):
+    """
+    One type's series from per-date reductions (price in cents, nan where
+    missing): dates as 'YYYY-MM-DD' strings, price in dollars, colour and
+    VM rounded to 2 places (nan for none) and whole-bale volume. Dates
+    without bales are left out.
+    """
+    sold = np.asarray(total_bales, dtype=np.float64) > 0
+    return {
+        'dates': np.array([str(sale_date) for sale_date in np.asarray(sale_dates)[sold]], dtype=str),
+        'price': np.asarray(weighted_price, dtype=np.float64)[sold] / 100,
+        'avg_colour': _round_values(np.asarray(weighted_colour, dtype=np.float64)[sold]),
+        'avg_vm': _round_values(np.asarray(weighted_vm, dtype=np.float64)[sold]),
+        'total_volume': np.trunc(np.asarray(total_bales, dtype=np.float64)[sold]),
+    }
+
+def align(series_list):
+    """(dates, {field: dates x types matrix}) over the union of the series' dates, nan where a type has no row"""
+    if series_list:
+        dates = np.unique(np.concatenate([series['dates'] for series in series_list]))
+    else:
+        dates = np.array([], dtype=str)
+    matrices = {field: np.full((len(dates), len(series_list)), np.nan) for field in SERIES_FIELDS}
+    for column, series in enumerate(series_list):
+        rows = np.searchsorted(dates, series['dates'])
+        for field in SERIES_FIELDS:
+            matrices[field][rows, column] = series[field]
+    return dates, matrices
+
+def _sum_columns(matrix, include):
+    """Row sums of matrix over the included cells, added column by column (the order Python's sum used)"""
+    total = np.zeros(matrix.shape[0])
+    for column in range(matrix.shape[1]):
+        total = total + np.where(include[:, column], matrix[:, column], 0.0)
+    return total
+
+def group_blend(series_list):
+    """
+    Combine a group's type series. Returns dates plus per-date arrays:
+    price (mean of the types' gap-interpolated prices), avg_colour and
+    avg_vm (volume-weighted over the types that sold that day, nan if
+    none) and total_volume. Dates where no type has a price are dropped.
+    """
+    dates, matrices = align(series_list)
+    interpolated = fill_gaps(matrices['price'])
+    priced = ~np.isnan(interpolated)
+    counts = priced.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price = _sum_columns(interpolated, priced) / counts
+
+    # Types that actually sold on the date (interpolated prices don't count)
+    sold = ~np.isnan(matrices['price']) & (matrices['price'] != 0)
+    volumes = matrices['total_volume']
+    combined = {}
+    for field in ('avg_colour', 'avg_vm'):
+        has_value = sold & ~np.isnan(matrices[field])
+        weight = _sum_columns(matrices[field] * volumes, has_value)
+        volume = _sum_columns(volumes, has_value)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            combined[field] = np.where(volume > 0, weight / volume, np.nan)
+
+    keep = counts > 0
+    return {
+        'dates': dates[keep],
+        'price': price[keep],
+        'avg_colour': combined['avg_colour'][keep],
+        'avg_vm': combined['avg_vm'][keep],
+        'total_volume': _sum_columns(volumes, sold)[keep],
+    }
+
+def weighted_blend(matrix, weights):
+    """
+    Weighted average across the columns of a dates x entries matrix after
+    interpolating each column's gaps, nan where no entry has a value
+    """
+    interpolated = fill_gaps(matrix)
+    present = ~np.isnan(interpolated)
+    weights = np.asarray(weights, dtype=np.float64)
+    weighted_sum = _sum_columns(interpolated * weights, present)
+    total_weight = _sum_columns(np.broadcast_to(weights, interpolated.shape), present)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total_weight > 0, weighted_sum / total_weight, np.nan)
@@ -0,0 +1,231 @@
+"""
+Column filter compiler shared by the search, chart and market report endpoints.
+
+Requests carry column filters as a list of
+    {'column': ..., 'operator': ..., 'value': ..., 'value2': ...}
+ColumnFilters.compile validates them once (whitelisted column, supported
+operator, value present) and the result can be emitted as a SQL WHERE
+fragment, evaluated as a NumPy mask over the in-memory column snapshot,
+or reduced to a canonical key. The key ignores filter order, duplicates
+and filters that aren't applied, and treats numerically equal comparison
+values as equal, so the same filter set always has the same key however
+a page phrases it.
+"""
+
+import hashlib
+import json
+import math
+import re
+import numpy as np
+
+# Security: Whitelist of allowed columns for filtering
+ALLOWED_COLUMNS = {
+    'price', 'bales', 'kg', 'colour', 'micron', 'yield',
+    'vegetable_matter', 'sale_date', 'location',
+    'seller_name', 'farm_brand_name', 'wool_type_id',
+    'type_combined', 'lot_number', 'is_sold'
+}
+
+# Filterable columns by storage kind (sale_date is handled separately)
+NUMERIC_COLUMNS = ['price', 'bales', 'kg', 'colour', 'micron', 'yield', 'vegetable_matter', 'wool_type_id', 'is_sold']
+TEXT_COLUMNS = ['type_combined', 'location', 'seller_name', 'farm_brand_name', 'lot_number']
+
+# Operator sets: the simple search and market reports take every operator,
+# compare and blends only comparisons, the blend date filter no 'ne'
+FILTER_OPERATORS = {'eq', 'ne', 'gt', 'lt', 'gte', 'lte', 'between', 'contains', 'not_contains'}
+COMPARE_OPERATORS = {'eq', 'ne', 'gt', 'lt', 'gte', 'lte', 'between'}
+DATE_OPERATORS = {'eq', 'gt', 'lt', 'gte', 'lte', 'between'}
+
+SQL_COMPARISONS = {'eq': '=', 'ne': '!=', 'gt': '>', 'lt': '<', 'gte': '>=', 'lte': '<='}
+
+# Internal operator for a condition no row satisfies (never accepted from a request)
+NO_MATCH = 'no_match'
+
+_DATE_VALUE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+class UnsupportedFilter(Exception):
+    """Raised when a filter can't be evaluated exactly in memory (the caller falls back to SQL)"""
+    pass
+
+def fold(text):
+    """
+    Case- and trailing-space-insensitive form, matching MySQL's default
+    collation for '='. The type search, the column snapshot and the daily
+    rollup all compare and group type_combined by it.
+    """
+    return text.rstrip(' ').casefold()
+
+def _number_value(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise UnsupportedFilter(f"non-numeric value {value!r}")
+    if not np.isfinite(number):
+        raise UnsupportedFilter(f"non-numeric value {value!r}")  # MySQL reads 'nan'/'inf' as 0
+    return number
+
+def _date_value(value):
+    value = str(value).strip()
+    if not _DATE_VALUE.match(value):
+        raise UnsupportedFilter(f"date value {value!r}")
+    return np.datetime64(value, 'D')
+
+def _numeric_mask(values, column, operator, value, value2):
+    if column == 'sale_date':
+        parse = _date_value
+        present = ~np.isnat(values)
+    else:
+        parse = _number_value
+        present = ~np.isnan(values)
+    if operator in ('contains', 'not_contains'):
+        raise UnsupportedFilter(f"{operator} on {column}")
+    with np.errstate(invalid='ignore'):
+        if operator == 'between':
+            return present & (values >= parse(value)) & (values <= parse(value2))
+        target = parse(value)
+        compare = {
+            'eq': values == target, 'ne': values != target,
+            'gt': values > target, 'lt': values < target,
+            'gte': values >= target, 'lte': values <= target,
+        }[operator]
+    return present & compare
+
+def _text_mask(values, column, operator, value):
+    """values is a dictionary-encoded column (see column_snapshot.DictColumn)"""
+    text = str(value)
+    if operator in ('eq', 'ne'):
+        target = fold(text)
+        if operator == 'eq':
+            return values.match(lambda c: fold(c) == target)
+        return values.match(lambda c: fold(c) != target)
+    if operator in ('contains', 'not_contains'):
+        if any(ch in text for ch in '%_\\'):
+            raise UnsupportedFilter(f"LIKE wildcard in {text!r}")
+        needle = text.casefold()
+        if operator == 'contains':
+            return values.match(lambda c: needle in c.casefold())
+        return values.match(lambda c: needle not in c.casefold())
+    raise UnsupportedFilter(f"{operator} on text column {column}")
+
+def _canonical_value(column, operator, value):
+    """Key form of a filter value; numbers compared numerically key the same ('30' == 30 == '30.0')"""
+    if value is None:
+        return None
+    if column in NUMERIC_COLUMNS and operator not in ('contains', 'not_contains'):
+        try:
+            number = float(value)
+            if math.isfinite(number):
+                return repr(number)
+        except (TypeError, ValueError):
+            pass
+    return str(value)
+
+class ColumnFilters:
+    """A validated, ordered set of (column, operator, value, value2) conditions"""
+
+    def __init__(self, conditions=()):
+        self.conditions = tuple(conditions)
+
+    @classmethod
+    def compile(cls, filters, operators=FILTER_OPERATORS):
+        """
+        Validate request filters. Incomplete filters and operators outside
+        operators are skipped, as are columns not in ALLOWED_COLUMNS (with a
+        warning); 'between' needs both values.
+        """
+        conditions = []
+        for filter_item in filters or []:
+            column = filter_item.get('column')
+            operator = filter_item.get('operator')
+            value = filter_item.get('value')
+            value2 = filter_item.get('value2')
+
+            if not column or not operator or not value:
+                continue
+
+            # Security: Validate column name against whitelist
+            if column not in ALLOWED_COLUMNS:
+                print(f"Warning: Invalid column name attempted: {column}")
+                continue
+
+            if operator not in operators or (operator == 'between' and not value2):
+                continue
+            conditions.append((column, operator, value, value2 if operator == 'between' else None))
+        return cls(conditions)
+
+    @classmethod
+    def date_filter(cls, date_filter, operators=DATE_OPERATORS):
+        """
+        The blend pages' shared date filter ({'operator', 'value', 'value2'})
+        as sale_date conditions. An operator with no value matches no sales,
+        as comparing sale_date to an empty value always did.
+        """
+        if not date_filter:
+            return cls()
+        if date_filter.get('operator') in operators and not date_filter.get('value'):
+            return cls([('sale_date', NO_MATCH, None, None)])
+        return cls.compile([dict(date_filter, column='sale_date')], operators)
+
+    def __bool__(self):
+        return bool(self.conditions)
+
+    def __len__(self):
+        return len(self.conditions)
+
+    def __add__(self, other):
+        return ColumnFilters(self.conditions + other.conditions)
+
+    def sql_conditions(self):
+        """List of (sql, params) pairs, one per condition"""
+        compiled = []
+        for column, operator, value, value2 in self.conditions:
+            if operator == NO_MATCH:
+                compiled.append(("1 = 0", []))
+            elif operator == 'between':
+                compiled.append((f"{column} BETWEEN %s AND %s", [value, value2]))
+            elif operator == 'contains':
+                compiled.append((f"{column} LIKE %s", [f"%{value}%"]))
+            elif operator == 'not_contains':
+                compiled.append((f"{column} NOT LIKE %s", [f"%{value}%"]))
+            else:
+                compiled.append((f"{column} {SQL_COMPARISONS[operator]} %s", [value]))
+        return compiled
+
+    def sql(self):
+        """(' AND ...' fragment to append to a WHERE clause, params)"""
+        fragment = ''
+        params = []
+        for condition, condition_params in self.sql_conditions():
+            fragment += f" AND {condition}"
+            params.extend(condition_params)
+        return fragment, params
+
+    def mask(self, columns, rows):
+        """
+        Row mask over snapshot columns (numeric as float64 with nan for
+        NULL, sale_date as datetime64, text dictionary-encoded) matching the
+        SQL the filters compile to. Raises UnsupportedFilter if a condition
+        can't be reproduced exactly.
+        """
+        mask = np.ones(rows, dtype=bool)
+        for column, operator, value, value2 in self.conditions:
+            if operator == NO_MATCH:
+                mask[:] = False
+            elif column in TEXT_COLUMNS:
+                mask &= _text_mask(columns[column], column, operator, value)
+            elif column in NUMERIC_COLUMNS or column == 'sale_date':
+                mask &= _numeric_mask(columns[column], column, operator, value, value2)
+            else:
+                raise UnsupportedFilter(f"column {column}")
+        return mask
+
+    def canonical(self):
+        """Sorted, de-duplicated conditions in key form"""
+        return sorted({
+            (column, operator, _canonical_value(column, operator, value), _canonical_value(column, operator, value2))
+            for column, operator, value, value2 in self.conditions
+        }, key=lambda condition: json.dumps(condition))
+
+    def key(self):
+        """Order-independent hash of the filter set, for caches and request coalescing"""
+        return hashlib.sha1(json.dumps(self.canonical()).encode('utf-8')).hexdigest()
@@ -0,0 +1,229 @@
+"""
+In-memory columnar copy of auction_data_joined, one per worker process.
+
+Auction data only changes on sale days, so instead of querying the
+database for every chart and search request a worker can hold the
+filterable columns as NumPy arrays and evaluate the same column filters
+as vectorized masks. Text columns are dictionary-encoded (int32 codes
+into a small array of distinct values), so string filters are evaluated
+once per distinct value rather than once per lot.
+
+A background thread probes MAX(sale_date) / MAX(id) every
+DB_SNAPSHOT_CHECK_INTERVAL seconds and reloads the snapshot when either
+changes. Until the first load finishes, or when a filter can't be
+reproduced exactly in NumPy, callers fall back to SQL.
+
+Enable with DB_MEMORY_SNAPSHOT=1.
+"""
+
+import os
+import threading
+import time
+import numpy as np
+from datetime import datetime
+
+from db_connector import ProcessLocal, get_pool, stream_batches, data_version
+from column_filters import NUMERIC_COLUMNS, TEXT_COLUMNS, fold
+
+SNAPSHOT_ENABLED = os.environ.get('DB_MEMORY_SNAPSHOT', '0') == '1'
+SNAPSHOT_CHECK_INTERVAL = float(os.environ.get('DB_SNAPSHOT_CHECK_INTERVAL', '60'))
+
+# Columns held in memory (ALLOWED_COLUMNS plus id)
+SNAPSHOT_COLUMNS = ['id', 'sale_date'] + NUMERIC_COLUMNS + TEXT_COLUMNS
+
+# Numeric columns the database returns as integers
+INTEGER_COLUMNS = {'id', 'wool_type_id', 'is_sold'}
+
+class DictColumn:
+    """Dictionary-encoded text column: int32 codes into categories, -1 for NULL"""
+
+    def __init__(self, values):
+        present = np.array([v is not None for v in values], dtype=bool)
+        self.codes = np.full(len(values), -1, dtype=np.int32)
+        if present.any():
+            categories, codes = np.unique(np.array([str(v) for v in values[present]]), return_inverse=True)
+            self.codes[present] = codes
+        else:
+            categories = np.array([], dtype=str)
+        self.categories = categories.astype(object)
+
+    def match(self, predicate):
+        """Row mask of values for which predicate(value) is true (NULLs never match)"""
+        selected = np.array([bool(predicate(c)) for c in self.categories] + [False], dtype=bool)
+        return selected[self.codes]  # code -1 picks the trailing False
+
+    def decode(self, index=None):
+        """Object array of the original strings (None for NULL)"""
+        codes = self.codes if index is None else self.codes[index]
+        lookup = np.append(self.categories, None)
+        return lookup[codes]
+
+    def nbytes(self):
+        return self.codes.nbytes + sum(len(c) for c in self.categories)
+
+class ColumnSnapshot:
+    """All snapshot columns sorted by (sale_date, id); numeric as float64 (NULL -> nan)"""
+
+    def __init__(self, columns, version):
+        self.columns = columns
+        self.version = version
+        self.rows = len(columns['id'])
+        self.loaded_at = time.time()
+
+    @classmethod
+    def load(cls, conn, version):
+        """Stream auction_data_joined into typed arrays"""
+        batches = {name: [] for name in SNAPSHOT_COLUMNS}
+        query = f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM auction_data_joined"
+        for rows in stream_batches(conn, query):
+            values = list(zip(*rows))
+            for i, name in enumerate(SNAPSHOT_COLUMNS):
+                if name == 'id':
+                    batches[name].append(np.array(values[i], dtype=np.int64))
+                elif name == 'sale_date':
+                    batches[name].append(np.array(values[i], dtype='datetime64[D]'))
+                elif name in NUMERIC_COLUMNS:
+                    batches[name].append(np.array([np.nan if v is None else float(v) for v in values[i]], dtype=np.float64))
+                else:
+                    batches[name].append(np.array(values[i], dtype=object))
+
+        dtypes = {'id': np.int64, 'sale_date': 'datetime64[D]'}
+        flat = {
+            name: np.concatenate(parts) if parts else np.array([], dtype=dtypes.get(name, np.float64 if name in NUMERIC_COLUMNS else object))
+            for name, parts in batches.items()
+        }
+        order = np.lexsort((flat['id'], flat['sale_date']))  # NaT dates sort last
+        columns = {}
+        for name, values in flat.items():
+            values = values[order]
+            columns[name] = DictColumn(values) if name in TEXT_COLUMNS else values
+        return cls(columns, version)
+
+    def mask(self, wool_type_search=None, filters=None, require_bales=False):
+        """
+        Boolean row mask equivalent to the endpoints' SQL WHERE clause:
+        price > 10 (AND bales > 0 with require_bales), the wool type search
+        and the compiled column filters (see column_filters.ColumnFilters).
+        Raises UnsupportedFilter if any condition can't be reproduced exactly.
+        """
+        with np.errstate(invalid='ignore'):
+            mask = self.columns['price'] > 10
+            if require_bales:
+                mask &= self.columns['bales'] > 0
+
+        search_term = (wool_type_search or '').strip()
+        if search_term:
+            # CAST(wool_type_id AS CHAR) = term OR type_combined = term
+            by_type = self.columns['type_combined'].match(lambda c: fold(c) == fold(search_term))
+            if search_term.isdigit() and str(int(search_term)) == search_term:
+                by_type |= self.columns['wool_type_id'] == int(search_term)
+            mask &= by_type
+
+        if filters:
+            mask &= filters.mask(self.columns, self.rows)
+        return mask
+
+    def select(self, mask, names):
+        """Columns for the masked rows in sale_date order, text decoded to object arrays"""
+        index = np.flatnonzero(mask)
+        selected = {}
+        for name in names:
+            column = self.columns[name]
+            selected[name] = column.decode(index) if isinstance(column, DictColumn) else column[index]
+        return selected
+
+    def records(self, index, names):
+        """Rows at index as dicts of JSON-ready Python values"""
+        records = [{} for _ in range(len(index))]
+        for name in names:
+            column = self.columns[name]
+            if isinstance(column, DictColumn):
+                values = column.decode(index).tolist()
+            elif name == 'sale_date':
+                values = [None if np.isnat(d) else str(d) for d in column[index]]
+            elif name in INTEGER_COLUMNS:
+                values = [None if np.isnan(v) else int(v) for v in column[index]] if column.dtype.kind == 'f' else column[index].tolist()
+            else:
+                values = [None if np.isnan(v) else v for v in column[index].tolist()]
+            for record, value in zip(records, values):
+                record[name] = value
+        return records
+
+    def nbytes(self):
+        return sum(c.nbytes() if isinstance(c, DictColumn) else c.nbytes for c in self.columns.values())
+
+    def stats(self):
+        return {
+            'rows': self.rows,
+            'memory_mb': round(self.nbytes() / 1024 / 1024, 1),
+            'max_sale_date': self.version[0],
+            'max_id': self.version[1],
+            'loaded_at': datetime.fromtimestamp(self.loaded_at).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+class SnapshotRefresher(threading.Thread):
+    """Background thread that loads the snapshot and reloads it when the data version changes"""
+
+    def __init__(self, interval=None):
+        super().__init__(name='column-snapshot', daemon=True)
+        self.interval = interval or SNAPSHOT_CHECK_INTERVAL
+        self.snapshot = None
+        self.last_error = None
+        self.load_seconds = None
+
+    def refresh(self):
+        """Reload if the data version moved; returns True when a new snapshot was swapped in"""
+        pool = get_pool()
+        conn = pool.checkout()
+        try:
+            version = data_version(conn)
+            if self.snapshot is not None and self.snapshot.version == version:
+                return False
+            started = time.time()
+            snapshot = ColumnSnapshot.load(conn, version)
+        finally:
+            pool.checkin(conn)
+        self.snapshot = snapshot  # Swap - requests already holding the old one finish on it
+        self.load_seconds = round(time.time() - started, 2)
+        print(f"Worker {os.getpid()}: loaded column snapshot ({snapshot.rows:,} rows, "
+              f"{snapshot.nbytes() / 1024 / 1024:.1f} MB) in {self.load_seconds}s")
+        return True
+
+    def run(self):
+        while True:
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                print(f"Worker {os.getpid()}: column snapshot refresh failed: {e}")
+                self.last_error = str(e)
+            time.sleep(self.interval)
+
+    def state(self):
+        """Snapshot state for the admin dashboard"""
+        return {
+            'enabled': True,
+            'snapshot': self.snapshot.stats() if self.snapshot is not None else None,
+            'load_seconds': self.load_seconds,
+            'last_error': self.last_error,
+            'check_interval_seconds': self.interval,
+        }
+
+def start_refresher():
+    refresher = SnapshotRefresher()
+    refresher.start()
+    return refresher
+
+# Per-process refresher (each Gunicorn worker loads its own copy after fork)
+_refresher = ProcessLocal(start_refresher)
+
+def get_refresher():
+    """Get or start this process's snapshot refresher (None when the snapshot is disabled)"""
+    if not SNAPSHOT_ENABLED:
+        return None
+    return _refresher.get()
+
+def get_snapshot():
+    """The current snapshot, or None if disabled or not loaded yet"""
+    refresher = get_refresher()
+    return refresher.snapshot if refresher is not None else None
@@ -0,0 +1,158 @@
+"""
+Per-sale-date price reduction shared by the price, compare and blend
+charts and the daily rollup.
+
+Every price series reduces a type's lots to one value per sale date: drop
+lots more than 20% from that date's median price (unless that drops them
+all), then weight by bales. reduce_segments does this for every date at
+once over date-sorted arrays - one sort by (date, price) gives each
+date's median, and the per-date sums are segmented reductions - instead
+of a Python loop over dates; reduce_series does the same for many series
+in one pass. fill_gaps interpolates the dates a type wasn't offered on,
+for a whole dates x types matrix at once.
+"""
+
+import numpy as np
+
+def segment_starts(keys):
+    """Start index of each run of equal values in a sorted array"""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+
+def _segment_sum(values, starts):
+    return np.add.reduceat(values, starts) if len(starts) else np.zeros(0)
+
+def _segment_ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+def reduce_segments(starts, prices, bales, colours=None, vms=None):
+    """
+    Reduce lots grouped into contiguous segments (one per sale date, or per
+    type and date) beginning at starts. Returns per-segment arrays:
+    lot_count, median_price, kept_lots, total_bales and weighted_price
+    (bales of the kept lots and their bale-weighted price, nan without
+    bales), all_bales and all_price_bales (every lot), plus per-lot 'keep'.
+    With colours and vms (nan for NULL) also weighted_colour/weighted_vm
+    and mean_colour/mean_vm over the kept lots that have one (nan if none).
+    """
+    count = len(prices)
+    lot_count = np.diff(np.append(starts, count))
+    segment = np.repeat(np.arange(len(starts)), lot_count)
+
+    # Median from the middle one or two prices of each segment sorted by price
+    sorted_prices = prices[np.lexsort((prices, segment))]
+    median_price = (sorted_prices[starts + (lot_count - 1) // 2] + sorted_prices[starts + lot_count // 2]) / 2
+
+    # Keep lots within +/-20% of their date's median, or all of them if none are
+    lot_median = median_price[segment]
+    keep = (prices >= lot_median * 0.8) & (prices <= lot_median * 1.2)
+    kept_lots = _segment_sum(keep.astype(np.int64), starts)
+    keep |= (kept_lots == 0)[segment]
+    kept_lots = _segment_sum(keep.astype(np.int64), starts)
+
+    kept_bales = np.where(keep, bales, 0.0)
+    total_bales = _segment_sum(kept_bales, starts)
+    reduced = {
+        'lot_count': lot_count,
+        'median_price': median_price,
+        'keep': keep,
+        'kept_lots': kept_lots,
+        'total_bales': total_bales,
+        'weighted_price': _segment_ratio(_segment_sum(prices * kept_bales, starts), total_bales),
+        'all_bales': _segment_sum(bales, starts),
+        'all_price_bales': _segment_sum(prices * bales, starts),
+    }
+    for name, values in (('colour', colours), ('vm', vms)):
+        if values is None:
+            continue
+        present = keep & ~np.isnan(values)
+        present_values = np.where(present, values, 0.0)
+        present_bales = np.where(present, bales, 0.0)
+        reduced[f'weighted_{name}'] = _segment_ratio(_segment_sum(present_values * present_bales, starts),
+                                                     _segment_sum(present_bales, starts))
+        reduced[f'mean_{name}'] = _segment_ratio(_segment_sum(present_values, starts),
+                                                 _segment_sum(present.astype(np.int64), starts))
+    return reduced
+
+def reduce_dates(cols, with_quality=False):
+    """
+    Reduce date-sorted lot columns (sale_date, price, bales; colour and
+    vegetable_matter with with_quality) to one row per sale date. Returns
+    the segment starts and reduce_segments' arrays plus 'sale_date'.
+    """
+    starts = segment_starts(cols['sale_date'])
+    reduced = reduce_segments(starts, cols['price'], cols['bales'],
+                              cols['colour'] if with_quality else None,
+                              cols['vegetable_matter'] if with_quality else None)
+    reduced['starts'] = starts
+    reduced['sale_date'] = cols['sale_date'][starts]
+    return reduced
+
+def reduce_series(series_cols):
+    """
+    Reduce several date-sorted lot column sets (sale_date, price, bales),
+    one per chart series, in a single pass: their lots are concatenated and
+    every (series, sale date) run is a segment. Returns reduce_segments'
+    arrays plus 'series' (index into series_cols) and 'sale_date' per segment.
+    """
+    sizes = [len(cols['sale_date']) for cols in series_cols]
+    if sum(sizes) == 0:
+        reduced = reduce_segments(np.zeros(0, dtype=np.intp), np.zeros(0), np.zeros(0))
+        reduced['series'] = np.zeros(0, dtype=np.intp)
+        reduced['sale_date'] = np.array([], dtype='datetime64[D]')
+        return reduced
+    series = np.repeat(np.arange(len(series_cols)), sizes)
+    sale_dates = np.concatenate([cols['sale_date'] for cols in series_cols])
+    boundary = (series[1:] != series[:-1]) | (sale_dates[1:] != sale_dates[:-1])
+    starts = np.concatenate(([0], np.flatnonzero(boundary) + 1))
+    reduced = reduce_segments(starts, np.concatenate([cols['price'] for cols in series_cols]),
+                              np.concatenate([cols['bales'] for cols in series_cols]))
+    reduced['series'] = series[starts]
+    reduced['sale_date'] = sale_dates[starts]
+    return reduced
+
+def most_common(values, starts, keep):
+    """
+    Per segment, the most common non-empty value among the kept rows (ties
+    go to the value seen first), or '' when there is none. values is an
+    object array of strings.
+    """
+    result = np.full(len(starts), '', dtype=object)
+    present = keep & np.array([bool(value) for value in values], dtype=bool)
+    rows = np.flatnonzero(present)
+    if len(rows) == 0:
+        return result
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(values))))[rows]
+    categories, codes = np.unique(values[rows].astype(str), return_inverse=True)
+    pairs = segment * len(categories) + codes.ravel()
+    unique_pairs, first_seen, counts = np.unique(pairs, return_index=True, return_counts=True)
+    pair_segment = unique_pairs // len(categories)
+    # Per segment: highest count first, then earliest first occurrence
+    order = np.lexsort((first_seen, -counts, pair_segment))
+    winners = order[np.concatenate(([True], pair_segment[order][1:] != pair_segment[order][:-1]))]
+    result[pair_segment[winners]] = values[rows[first_seen[winners]]]
+    return result
+
+def fill_gaps(matrix):
+    """
+    Fill nan gaps down each column of a dates x types matrix: linearly
+    between the nearest values before and after (by row position), flat
+    before the first value and after the last. All-nan columns stay nan.
+    """
+    rows = matrix.shape[0]
+    present = ~np.isnan(matrix)
+    index = np.arange(rows)[:, None]
+    columns = np.arange(matrix.shape[1])[None, :]
+    # Row of the nearest value at or before / at or after each cell (-1 / rows when there is none)
+    prev_row = np.maximum.accumulate(np.where(present, index, -1), axis=0)
+    next_row = np.minimum.accumulate(np.where(present, index, rows)[::-1], axis=0)[::-1]
+    has_prev = prev_row >= 0
+    has_next = next_row < rows
+    prev_value = matrix[np.maximum(prev_row, 0), columns]
+    next_value = matrix[np.minimum(next_row, rows - 1), columns]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = prev_value + (next_value - prev_value) * ((index - prev_row) / (next_row - prev_row))
+    filled = np.where(has_prev & has_next, between, np.where(has_prev, prev_value, next_value))
+    return np.where(present, matrix, filled)
@@ -0,0 +1,166 @@
+"""
+Daily per-type price rollup kept in the local SQLite mirror.
+
+The price, compare, blend and calendar charts all reduce a type's lots to
+one outlier-filtered, volume-weighted value per sale date. The
+daily_type_prices table stores that reduction per (type_combined,
+sale_date) so those charts read a few hundred pre-reduced rows instead of
+every lot. scripts/sync_auction_mirror.py rebuilds the rows for every sale
+date a sync touches, in the same transaction as the lots themselves.
+
+Types are grouped with column_filters.fold (case- and trailing-space-
+insensitive, like MySQL's collation for '='), the same rule the type
+search uses, so one rollup key covers exactly the lots a type search
+returns. Each group is stored under the first spelling seen for it.
+"""
+
+import numpy as np
+
+from daily_prices import reduce_segments
+from column_filters import fold
+
+ROLLUP_TABLE = 'daily_type_prices'
+
+ROLLUP_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS daily_type_prices (
+        type_combined TEXT COLLATE NOCASE NOT NULL,
+        sale_date DATE NOT NULL,
+        lot_count INTEGER,          -- lots with price > 10 and bales > 0
+        median_price REAL,          -- median of those lots (centre of the outlier filter)
+        kept_lots INTEGER,          -- lots within +/-20% of the median
+        total_bales REAL,           -- bales of the kept lots
+        weighted_price REAL,        -- bale-weighted price of the kept lots (cents)
+        weighted_colour REAL,       -- bale-weighted colour of kept lots that have one
+        weighted_vm REAL,           -- bale-weighted VM of kept lots that have one
+        mean_colour REAL,           -- simple mean colour of the kept lots
+        mean_vm REAL,               -- simple mean VM of the kept lots
+        kept_prices BLOB,           -- float64 kept prices, for exact chart statistics
+        all_bales REAL,             -- bales of every lot (calendar months are unfiltered)
+        all_price_bales REAL,       -- sum(price * bales) over every lot
+        PRIMARY KEY (type_combined, sale_date)
+    )
+"""
+
+ROLLUP_FIELDS = [
+    'type_combined', 'sale_date', 'lot_count', 'median_price', 'kept_lots', 'total_bales',
+    'weighted_price', 'weighted_colour', 'weighted_vm', 'mean_colour', 'mean_vm',
+    'kept_prices', 'all_bales', 'all_price_bales',
+]
+
+# Sale dates recomputed per query when rebuilding (bounds memory on a full build)
+DATES_PER_BATCH = 100
+
+# Rollup fields taken straight from daily_prices.reduce_segments (nan stored as NULL)
+REDUCED_FIELDS = [
+    'median_price', 'total_bales', 'weighted_price', 'weighted_colour', 'weighted_vm',
+    'mean_colour', 'mean_vm', 'all_bales', 'all_price_bales',
+]
+
+def _optional(value):
+    return None if np.isnan(value) else float(value)
+
+def _column(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+def _rollup_dates(conn, sale_dates):
+    """Recompute every type's rollup row for a batch of sale dates"""
+    placeholders = ', '.join(['?'] * len(sale_dates))
+    conn.execute(f"DELETE FROM daily_type_prices WHERE sale_date IN ({placeholders})", sale_dates)
+    rows = conn.execute(f"""
+        SELECT type_combined, sale_date, price, bales, colour, vegetable_matter
+        FROM auction_data_joined
+        WHERE price > 10 AND bales > 0 AND type_combined IS NOT NULL
+        AND sale_date IN ({placeholders})
+        ORDER BY id
+    """, sale_dates).fetchall()
+    if not rows:
+        return 0
+
+    # Group by folded type then date (SQLite's NOCASE is ASCII-only and keeps trailing spaces)
+    rows.sort(key=lambda row: (fold(row[0]), row[1]))
+    types, dates, prices, bales, colours, vms = zip(*rows)
+    prices, bales, colours, vms = _column(prices), _column(bales), _column(colours), _column(vms)
+    keys = [(fold(t), d) for t, d in zip(types, dates)]
+    starts = [0] + [i for i in range(1, len(keys)) if keys[i] != keys[i - 1]]
+    ends = starts[1:] + [len(keys)]
+
+    reduced = reduce_segments(np.array(starts), prices, bales, colours, vms)
+    records = []
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        values = {field: _optional(reduced[field][i]) for field in REDUCED_FIELDS}
+        values['lot_count'] = int(reduced['lot_count'][i])
+        values['kept_lots'] = int(reduced['kept_lots'][i])
+        values['kept_prices'] = prices[start:end][reduced['keep'][start:end]].tobytes()
+        values['type_combined'] = types[start]
+        values['sale_date'] = dates[start]
+        records.append(tuple(values[field] for field in ROLLUP_FIELDS))
+    conn.executemany('INSERT INTO daily_type_prices ({}) VALUES ({})'.format(
+        ', '.join(ROLLUP_FIELDS), ', '.join(['?'] * len(ROLLUP_FIELDS))
+    ), records)
+    return len(records)
+
+def update_rollup(conn, sale_dates=None):
+    """
+    Rebuild the rollup rows for the given sale dates ('YYYY-MM-DD' strings),
+    or for every date when sale_dates is None. conn is a sqlite3 connection
+    to the mirror; the caller commits. Returns the number of rows written.
+    """
+    conn.execute(ROLLUP_SCHEMA)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_rollup_date ON daily_type_prices (sale_date)')
+    if sale_dates is None:
+        conn.execute('DELETE FROM daily_type_prices')
+        sale_dates = [d for (d,) in conn.execute(
+            'SELECT DISTINCT sale_date FROM auction_data_joined WHERE sale_date IS NOT NULL ORDER BY sale_date'
+        )]
+    sale_dates = sorted(set(sale_dates))
+    written = 0
+    for i in range(0, len(sale_dates), DATES_PER_BATCH):
+        written += _rollup_dates(conn, sale_dates[i:i + DATES_PER_BATCH])
+    return written
+
+def has_rollup(conn):
+    """True if conn is a mirror connection with the rollup table"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'daily_type_prices'")
+    (found,) = cursor.fetchone()
+    cursor.close()
+    return found > 0
+
+def rollup_key(conn, wool_type):
+    """
+    The rollup key whose rows cover exactly the lots a wool type search
+    matches, or None. Numeric terms also match wool_type_id in the charts'
+    SQL, so they are left to the per-lot queries.
+    """
+    term = wool_type or ''
+    stripped = term.strip()
+    if not stripped or (stripped.isdigit() and str(int(stripped)) == stripped):
+        return None
+    cursor = conn.cursor()
+    # The term is a resolved type_combined spelling, used only when no other
+    # spelling folds to it - so it is exactly its group's stored key
+    cursor.execute("SELECT 1 FROM daily_type_prices WHERE type_combined = %s LIMIT 1", [term])
+    found = cursor.fetchone()
+    cursor.close()
+    return term if found else None
+
+def rollup_rows(conn, key, fields, date_conditions=None):
+    """
+    A key's rollup rows in sale_date order as a list of dicts (kept_prices
+    decoded to a float64 array). date_conditions is a list of (sql, params)
+    pairs on sale_date, e.g. ("sale_date >= %s", ['2020-01-01']).
+    """
+    query = f"SELECT sale_date, {', '.join(fields)} FROM daily_type_prices WHERE type_combined = %s"
+    params = [key]
+    for condition, condition_params in date_conditions or []:
+        query += f" AND {condition}"
+        params.extend(condition_params)
+    query += " ORDER BY sale_date ASC"
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    if 'kept_prices' in fields:
+        for row in rows:
+            row['kept_prices'] = np.frombuffer(row['kept_prices'], dtype=np.float64)
+    return rows
@@ -1,7 +1,19 @@
 from sshtunnel import SSHTunnelForwarder
 import mysql.connector
+from mysql.connector.connection import MySQLConnection
+from mysql.connector.cursor import MySQLCursorPrepared
+from mysql.connector.errors import ProgrammingError, ReadTimeoutError, WriteTimeoutError
 import os
+import re
+import queue
+import sqlite3
+import threading
+import time
 import logging
+import math
+import numpy as np
+from collections import OrderedDict
+from datetime import date, datetime
 
 # Set logging level - suppress paramiko debug messages
 logging.basicConfig(level=logging.INFO)
@@ -9,52 +21,926 @@ logging.basicConfig(level=logging.INFO)
 logging.getLogger('paramiko.transport').setLevel(logging.WARNING)
 logging.getLogger('paramiko').setLevel(logging.WARNING)
 
-def get_db_connection():
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def get_db_settings():
     """
-    Establish database connection via SSH tunnel
-    Credentials should be set via environment variables
+    Read SSH tunnel, database and pool settings from environment variables
     """
-    print("initialising...")
-    
-    # Get configuration from environment variables
-    ssh_host = os.environ.get('SSH_HOST', '120.138.27.51')
-    ssh_port = int(os.environ.get('SSH_PORT', '22'))
-    ssh_user = os.environ.get('SSH_USER', 'appfusca')
-    ssh_key_path = os.environ.get('SSH_KEY_PATH', os.path.expanduser('~/.ssh/id_rsa_nopass'))
-    
-    db_host = os.environ.get('DB_HOST', 'mysql57')
-    db_port = int(os.environ.get('DB_PORT', '3306'))
-    db_user = os.environ.get('DB_USER', 'fuscaread')
-    db_password = os.environ.get('DB_PASSWORD', 'ydv.mqy3avy7jxj6WXZ')
-    db_name = os.environ.get('DB_NAME', 'fuscadb')
+    return {
+        'ssh_host': os.environ.get('SSH_HOST', '120.138.27.51'),
+        'ssh_port': int(os.environ.get('SSH_PORT', '22')),
+        'ssh_user': os.environ.get('SSH_USER', 'appfusca'),
+        'ssh_key_path': os.environ.get('SSH_KEY_PATH', os.path.expanduser('~/.ssh/id_rsa_nopass')),
+        'db_host': os.environ.get('DB_HOST', 'mysql57'),
+        'db_port': int(os.environ.get('DB_PORT', '3306')),
+        'db_user': os.environ.get('DB_USER', 'fuscaread'),
+        'db_password': os.environ.get('DB_PASSWORD', 'ydv.mqy3avy7jxj6WXZ'),
+        'db_name': os.environ.get('DB_NAME', 'fuscadb'),
+        'backend': os.environ.get('DB_BACKEND', 'sqlite'),  # sqlite (local mirror), ssh or direct
+        'driver': os.environ.get('DB_DRIVER', 'pure'),  # pure (Python protocol) or c (C extension)
+        'sqlite_path': os.environ.get('DB_SQLITE_PATH', os.path.join(BASE_DIR, 'data', 'auction_mirror.sqlite3')),
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '4')),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        'supervisor_interval': float(os.environ.get('DB_SUPERVISOR_INTERVAL', '30')),
+        'ssh_keepalive': float(os.environ.get('SSH_KEEPALIVE', '15')),
+        'validate_after': float(os.environ.get('DB_VALIDATE_AFTER', '120')),
+    }
 
+def open_tunnel(settings):
+    """Start an SSH tunnel to the database host on an OS-assigned local port"""
     # Use port 0 to let the OS choose an available port (fixes multi-worker conflicts)
     tunnel = SSHTunnelForwarder(
-        (ssh_host, ssh_port),
-        ssh_username=ssh_user,
-        ssh_pkey=ssh_key_path,
+        (settings['ssh_host'], settings['ssh_port']),
+        ssh_username=settings['ssh_user'],
+        ssh_pkey=settings['ssh_key_path'],
         allow_agent=False,                   # ❗️turn off SSH agent fallback
         host_pkey_directories=[],           # ❗️prevent scanning for default keys
-        remote_bind_address=(db_host, db_port),
-        local_bind_address=('127.0.0.1', 0)  # Port 0 = auto-assign available port
+        remote_bind_address=(settings['db_host'], settings['db_port']),
+        local_bind_address=('127.0.0.1', 0),  # Port 0 = auto-assign available port
+        set_keepalive=settings['ssh_keepalive']  # paramiko transport keepalive
     )
 
     tunnel.start()
-    local_port = tunnel.local_bind_port
-    print(f"tunnel found on local port {local_port}")
+    print(f"tunnel found on local port {tunnel.local_bind_port}")
+    return tunnel
 
-    conn = mysql.connector.connect(
-        host='127.0.0.1',
+def open_connection(settings, local_port, host='127.0.0.1'):
+    """Open a MySQL connection (through an already running tunnel unless host is given)"""
+    return mysql.connector.connect(
+        host=host,
         port=local_port,  # Use the dynamically assigned port
-        user=db_user,
-        password=db_password,
-        database=db_name,
+        user=settings['db_user'],
+        password=settings['db_password'],
+        database=settings['db_name'],
         connection_timeout=5,
-        use_pure=True
+        autocommit=True,  # Read-only workload - never hold a stale snapshot open
+        use_pure=settings.get('driver', 'pure') != 'c'
     )
 
+def get_db_connection():
+    """
+    Establish database connection via SSH tunnel
+    Credentials should be set via environment variables
+    """
+    print("initialising...")
+
+    settings = get_db_settings()
+    tunnel = open_tunnel(settings)
+    local_port = tunnel.local_bind_port
+
+    conn = open_connection(settings, local_port)
+
     print(f"Connected via SSH tunnel on port {local_port}")
     return conn, tunnel
 
+def kill_mysql_query(backend, conn):
+    """Cancel the statement running on conn with KILL QUERY from a separate connection"""
+    control = backend.connect()
+    try:
+        cursor = control.cursor()
+        cursor.execute(f"KILL QUERY {int(conn.connection_id)}")
+        cursor.close()
+    finally:
+        control.close()
+
+def limit_mysql_statements(conn, milliseconds):
+    """Have the server abort any SELECT on conn that runs longer than milliseconds"""
+    cursor = conn.cursor()
+    cursor.execute("SET SESSION max_execution_time = %s", [int(milliseconds)])
+    cursor.close()
+
+class SSHTunnelBackend:
+    """MySQL reached through an SSH tunnel to the database host"""
+    name = 'ssh'
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.tunnel = None
+
+    def start(self):
+        self.stop()
+        self.tunnel = open_tunnel(self.settings)
+
+    def stop(self):
+        if self.tunnel is not None:
+            try:
+                self.tunnel.stop()
+            except Exception:
+                pass
+            self.tunnel = None
+
+    def is_up(self):
+        return self.tunnel is not None and self.tunnel.is_active
+
+    def keepalive(self):
+        """Send an SSH-level keepalive; False if the transport is gone"""
+        transport = getattr(self.tunnel, '_transport', None)
+        if transport is None or not transport.is_active():
+            return False
+        transport.send_ignore()
+        return True
+
+    def connect(self):
+        return open_connection(self.settings, self.tunnel.local_bind_port)
+
+    def cancel(self, conn):
+        kill_mysql_query(self, conn)
+
+    def limit_statements(self, conn, milliseconds):
+        limit_mysql_statements(conn, milliseconds)
+
+    def describe(self):
+        return f"SSH tunnel on local port {self.tunnel.local_bind_port}" if self.is_up() else "SSH tunnel (down)"
+
+class DirectBackend:
+    """MySQL over plain TCP, for when the app runs next to the database"""
+    name = 'direct'
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.tunnel = None
+        self.started = False
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def is_up(self):
+        return self.started
+
+    def keepalive(self):
+        return self.started
+
+    def connect(self):
+        return open_connection(self.settings, self.settings['db_port'], host=self.settings['db_host'])
+
+    def cancel(self, conn):
+        kill_mysql_query(self, conn)
+
+    def limit_statements(self, conn, milliseconds):
+        limit_mysql_statements(conn, milliseconds)
+
+    def describe(self):
+        return f"direct TCP to {self.settings['db_host']}:{self.settings['db_port']}"
+
+# Rewrites for the few MySQL-only expressions used by the app's queries
+_SQLITE_REWRITES = [
+    (re.compile(r"DATE_SUB\(CURDATE\(\),\s*INTERVAL\s+(\d+)\s+(DAY|MONTH|YEAR)\)", re.IGNORECASE),
+     lambda m: f"date('now', '-{m.group(1)} {m.group(2).lower()}s')"),
+    (re.compile(r"CURDATE\(\)", re.IGNORECASE), lambda m: "date('now')"),
+]
+
+def _sqlite_date(value):
+    # fromisoformat is several times faster than strptime over a large fetch
+    return date.fromisoformat(value[:10].decode())
+
+sqlite3.register_converter('DATE', _sqlite_date)
+
+def _sqlite_year(value):
+    return int(value[:4]) if value else None
+
+def _sqlite_month(value):
+    return int(value[5:7]) if value else None
+
+class SQLiteCursor:
+    """Cursor adapter giving sqlite3 the subset of the mysql.connector API the app uses"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip([col[0] for col in self._cursor.description], row))
+
+    def execute(self, query, params=None):
+        for pattern, replacement in _SQLITE_REWRITES:
+            query = pattern.sub(replacement, query)
+        self._cursor.execute(query.replace('%s', '?'), tuple(params or ()))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cursor.close()
+
+class SQLiteConnection:
+    """Connection adapter so the local SQLite mirror can sit in the MySQL connection pool"""
+    unread_result = False
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        # MySQL date functions used by aggregate queries (dates are stored as 'YYYY-MM-DD' text)
+        self._conn.create_function('YEAR', 1, _sqlite_year, deterministic=True)
+        self._conn.create_function('MONTH', 1, _sqlite_month, deterministic=True)
+        self._closed = False
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+
+    def is_connected(self):
+        return not self._closed
+
+    def ping(self, reconnect=False):
+        self._conn.execute('SELECT 1')
+
+    def consume_results(self):
+        pass
+
+    def commit(self):
+        self._conn.commit()
+
+    def interrupt(self):
+        """Abort the running statement (safe to call from another thread)"""
+        self._conn.interrupt()
+
+    def close(self):
+        self._closed = True
+        self._conn.close()
+
+class SQLiteBackend:
+    """Local auction_data_joined mirror (kept current by scripts/sync_auction_mirror.py)"""
+    name = 'sqlite'
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.tunnel = None
+        self.path = settings['sqlite_path']
+        self._inode = None
+
+    def _current_inode(self):
+        try:
+            return os.stat(self.path).st_ino
+        except OSError:
+            return None
+
+    def start(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"SQLite mirror not found at {self.path} - run scripts/sync_auction_mirror.py")
+        self._inode = self._current_inode()
+
+    def stop(self):
+        pass
+
+    def is_up(self):
+        return os.path.exists(self.path)
+
+    def keepalive(self):
+        # The file was replaced or removed out from under us (e.g. restored from a backup) -
+        # report down so the supervisor reopens connections on it
+        return self._inode is not None and self._current_inode() == self._inode
+
+    def connect(self):
+        return SQLiteConnection(self.path)
+
+    def sync_state(self):
+        """Watermark and last sync time recorded by the mirror sync job"""
+        try:
+            conn = sqlite3.connect(self.path)
+            try:
+                return dict(conn.execute('SELECT key, value FROM mirror_sync').fetchall())
+            finally:
+                conn.close()
+        except sqlite3.DatabaseError:
+            return {}
+
+    def cancel(self, conn):
+        conn.interrupt()
+
+    def limit_statements(self, conn, milliseconds):
+        pass  # No server-side limit - the watchdog's interrupt() is the only cancel path
+
+    def describe(self):
+        last_sync = self.sync_state().get('last_sync')
+        return f"SQLite mirror {self.path}" + (f" (synced {last_sync})" if last_sync else "")
+
+BACKENDS = {
+    'ssh': SSHTunnelBackend,
+    'direct': DirectBackend,
+    'sqlite': SQLiteBackend,
+}
+
+def get_backend(settings=None):
+    """Build the database backend selected by DB_BACKEND"""
+    settings = settings or get_db_settings()
+    try:
+        return BACKENDS[settings['backend']](settings)
+    except KeyError:
+        raise ValueError(f"Unknown DB_BACKEND '{settings['backend']}' (expected one of {', '.join(BACKENDS)})")
+
+STREAM_BATCH_SIZE = int(os.environ.get('DB_STREAM_BATCH_SIZE', '5000'))
+
+def stream_batches(conn, query, params=None, batch_size=None):
+    """
+    Run a query on an unbuffered tuple cursor and yield its rows in
+    fetchmany batches, so only one batch is held in memory at a time.
+    """
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(query, params or [])
+        while True:
+            rows = cursor.fetchmany(batch_size or STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        # Drain anything left if the caller stopped early, so the connection stays usable
+        if getattr(conn, 'unread_result', False):
+            conn.consume_results()
+        cursor.close()
+
+def _column_array(values, kind):
+    """
+    Build one typed NumPy column from driver values: raw text-protocol
+    bytes, or the native types of the binary protocol and SQLite (Decimal,
+    int, date/datetime, str). Both give the same dtypes and values.
+    """
+    sample = next((v for v in values if v is not None), None)
+    raw = isinstance(sample, (bytes, bytearray))
+    if kind == 'float':
+        if raw:
+            # Parse the protocol's text straight to float64 - no Decimal objects
+            return np.array([b'nan' if v is None else bytes(v) for v in values], dtype='S').astype(np.float64)
+        # float(Decimal) rounds the decimal text exactly as the text path's parse does
+        return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    if kind == 'int':
+        if raw:
+            return np.array([b'0' if v is None else bytes(v) for v in values], dtype='S').astype(np.int64)
+        return np.array([0 if v is None else int(v) for v in values], dtype=np.int64)
+    if kind == 'date':
+        if raw:
+            return np.array([b'NaT' if v is None else bytes(v[:10]) for v in values], dtype='S').astype('datetime64[D]')
+        return np.array([None if v is None else str(v)[:10] for v in values], dtype='datetime64[D]')
+    # 'str' - object array of Python strings (None kept)
+    if raw:
+        return np.array([None if v is None else bytes(v).decode() for v in values], dtype=object)
+    return np.array([None if v is None else str(v) for v in values], dtype=object)
+
+COLUMN_DTYPES = {
+    'float': np.float64,
+    'int': np.int64,
+    'date': 'datetime64[D]',
+    'str': object,
+}
+
+def fetch_columns(conn, query, params=None, columns=None, prepared=False):
+    """
+    Run a query on a raw tuple cursor and return {name: np.ndarray}.
+    columns lists (name, kind) pairs in SELECT order, kind being one of
+    'float' (float64, NULL -> nan), 'int' (int64, NULL -> 0),
+    'date' (datetime64[D], NULL -> NaT) or 'str' (object array).
+    With prepared=True the query runs as a cached server-side prepared
+    statement (binary protocol) - use it for shapes executed repeatedly.
+    """
+    if prepared:
+        cursor, operation = prepared_cursor(conn, query)
+        cursor.execute(operation, params or [])
+        rows = cursor.fetchall()
+    else:
+        cursor = conn.cursor(raw=True)
+        try:
+            cursor.execute(query, params or [])
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    if not rows:
+        return {name: np.array([], dtype=COLUMN_DTYPES[kind]) for name, kind in columns}
+    values = list(zip(*rows))
+    return {name: _column_array(values[i], kind) for i, (name, kind) in enumerate(columns)}
+
+PREPARED_CACHE_SIZE = int(os.environ.get('DB_PREPARED_CACHE_SIZE', '32'))
+
+def normalize_sql(query):
+    """Collapse whitespace so queries built with different indentation share one statement"""
+    return ' '.join(query.split())
+
+# ReusedPreparedCursor overrides MySQLCursorPrepared internals (_prepared,
+# _executed, _handle_result) as they are in this driver release (the one
+# pinned in requirements.txt). Any other version gets the stock cursor.
+REUSED_CURSOR_DRIVER_VERSION = '9.3.0'
+REUSE_PREPARED_CURSORS = mysql.connector.__version__ == REUSED_CURSOR_DRIVER_VERSION
+if not REUSE_PREPARED_CURSORS:
+    print(f"WARNING: mysql-connector-python {mysql.connector.__version__} is not {REUSED_CURSOR_DRIVER_VERSION} - "
+          f"prepared statements use the driver's own cursor (a COM_STMT_RESET round trip per execute)")
+
+class ReusedPreparedCursor(MySQLCursorPrepared):
+    """
+    Prepared cursor (pure-Python driver) that re-executes its statement
+    without a COM_STMT_RESET. The driver sends one before every execute -
+    an extra round trip through the tunnel per query - but a reset only
+    discards long data and open server-side cursors, and the app sends no
+    long data and reads every result in full. Only used with
+    REUSED_CURSOR_DRIVER_VERSION of the driver.
+    """
+
+    def execute(self, operation, params=None, map_results=False):
+        if self._prepared is None or operation is not self._executed or map_results or isinstance(params, dict):
+            # First execution (prepare) or an unusual call - let the driver handle it
+            return super().execute(operation, params, map_results)
+        params = tuple(params or ())
+        if len(self._prepared['parameters']) != len(params):
+            raise ProgrammingError(errno=1210, msg="Incorrect number of arguments executing prepared statement")
+        try:
+            result = self._connection.cmd_stmt_execute(
+                self._prepared['statement_id'],
+                data=params,
+                parameters=self._prepared['parameters'],
+                read_timeout=self._read_timeout,
+                write_timeout=self._write_timeout,
+            )
+        except (ReadTimeoutError, WriteTimeoutError):
+            self.reset()
+            raise
+        self._handle_result(result)
+
+class PreparedStatementCache:
+    """
+    Per-connection LRU of prepared cursors keyed by normalized SQL shape.
+    Each shape is parsed and planned by the server once; later executions
+    reuse the statement over the binary protocol with new parameters.
+    """
+
+    def __init__(self, conn, size=None):
+        self.conn = conn
+        self.size = size or PREPARED_CACHE_SIZE
+        self._cursors = OrderedDict()  # normalized SQL -> prepared cursor
+
+    def cursor_for(self, query):
+        """Return (cursor, operation) - execute operation itself so the cursor sees the same statement"""
+        operation = normalize_sql(query)
+        cached = self._cursors.get(operation)
+        if cached is not None:
+            self._cursors.move_to_end(operation)
+            _count_prepared('hits')
+            return cached
+        _count_prepared('misses')
+        # The cursor re-prepares whenever it is handed a different string object,
+        # so keep the exact key string alongside it
+        if isinstance(self.conn, MySQLConnection) and REUSE_PREPARED_CURSORS:
+            cursor = self.conn.cursor(cursor_class=ReusedPreparedCursor)
+        else:
+            cursor = self.conn.cursor(prepared=True)
+        cached = (cursor, operation)
+        self._cursors[operation] = cached
+        while len(self._cursors) > self.size:
+            _, (old_cursor, _) = self._cursors.popitem(last=False)
+            try:
+                old_cursor.close()  # Deallocates the statement on the server
+            except Exception:
+                pass
+        return cached
+
+    def __len__(self):
+        return len(self._cursors)
+
+_statement_caches = {}  # id(conn) -> PreparedStatementCache
+_prepared_stats = {'hits': 0, 'misses': 0}
+_prepared_stats_lock = threading.Lock()
+
+def _count_prepared(outcome):
+    with _prepared_stats_lock:
+        _prepared_stats[outcome] += 1
+
+def prepared_cursor(conn, query):
+    """Get a cached prepared cursor for this query shape on this connection"""
+    cache = _statement_caches.get(id(conn))
+    if cache is None or cache.conn is not conn:
+        cache = _statement_caches[id(conn)] = PreparedStatementCache(conn)
+    return cache.cursor_for(query)
+
+def forget_statements(conn):
+    """Drop a connection's statement cache (its statements die with the connection)"""
+    _statement_caches.pop(id(conn), None)
+
+def prepared_stats():
+    with _prepared_stats_lock:
+        hits, misses = _prepared_stats['hits'], _prepared_stats['misses']
+    return {
+        'statements': sum(len(cache) for cache in list(_statement_caches.values())),
+        'hits': hits,
+        'misses': misses,
+    }
+
+def data_version(conn):
+    """(MAX(sale_date), MAX(id)) of auction_data_joined - changes whenever a sale is loaded or rows are added"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(sale_date), MAX(id) FROM auction_data_joined")
+    max_date, max_id = cursor.fetchone()
+    cursor.close()
+    return (str(max_date) if max_date is not None else None, max_id)
+
+class ProcessLocal:
+    """
+    A value created on first use in each process: each Gunicorn worker
+    creates its own after fork instead of sharing the parent's.
+    """
+
+    def __init__(self, create):
+        self.create = create
+        self.value = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.value is None or self.pid != os.getpid():
+                self.value = self.create()
+                self.pid = os.getpid()
+            return self.value
+
+class VersionedValue:
+    """
+    A per-process value loaded from the database and reloaded when the
+    data version moves. load(conn, version) builds it; get(get_conn) probes
+    the version at most every check_interval seconds, and get_conn is only
+    called when it does.
+    """
+
+    def __init__(self, load, check_interval):
+        self.load = load
+        self.check_interval = check_interval
+        self.value = None
+        self.version = None
+        self.pid = None
+        self.last_check = 0
+        self.lock = threading.Lock()
+
+    def get(self, get_conn):
+        with self.lock:
+            stale = self.value is None or self.pid != os.getpid()
+            if stale or time.time() - self.last_check > self.check_interval:
+                conn = get_conn()
+                version = data_version(conn)
+                self.last_check = time.time()
+                if stale or version != self.version:
+                    self.value = self.load(conn, version)
+                    self.version = version
+                    self.pid = os.getpid()
+            return self.value
+
+class PoolExhausted(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout"""
+    pass
+
+class DatabaseUnavailable(Exception):
+    """Raised on the request path when the supervisor reports the database as down"""
+    pass
+
+class QueryTimeout(Exception):
+    """Raised when a request has used up its query time budget"""
+    pass
+
+class QueryWatchdog:
+    """
+    Timer that cancels whatever statement a checked-out connection is
+    running once the request's deadline passes. stop() must be called
+    before the connection goes back to the pool; it waits for an
+    in-flight cancel so a late KILL can never hit the next borrower.
+    """
+
+    def __init__(self, backend, conn, deadline):
+        self.backend = backend
+        self.conn = conn
+        self.fired = False
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._timer = threading.Timer(max(0.0, deadline - time.monotonic()), self._fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _fire(self):
+        with self._lock:
+            if self._stopped:
+                return
+            self.fired = True
+            try:
+                self.backend.cancel(self.conn)
+                print(f"Worker {os.getpid()}: cancelled statement that ran past its request budget")
+            except Exception as e:
+                print(f"Worker {os.getpid()}: failed to cancel overrunning statement: {e}")
+
+    def stop(self):
+        self._timer.cancel()
+        with self._lock:
+            self._stopped = True
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections sharing one backend
+    (normally one SSH tunnel). Each worker process owns one pool (see
+    get_pool); request threads check a connection out, use it, and check
+    it back in. Building and repairing the backend is left to
+    TunnelSupervisor so requests never wait on an SSH handshake.
+    """
+
+    def __init__(self, size=None, timeout=None, settings=None, backend=None):
+        self.settings = settings or get_db_settings()
+        if backend is None and self.settings['backend'] == 'sqlite' and not os.path.exists(self.settings['sqlite_path']):
+            # No mirror yet (fresh deploy before the first sync) - read MySQL until one is built
+            print(f"WARNING: SQLite mirror not found at {self.settings['sqlite_path']} - falling back to the ssh backend. "
+                  f"Run scripts/sync_auction_mirror.py --full to build it, then restart the app.")
+            self.settings = dict(self.settings, backend='ssh')
+        self.backend = backend or get_backend(self.settings)
+        self.size = max(1, size or self.settings['pool_size'])
+        self.timeout = timeout if timeout is not None else self.settings['pool_timeout']
+        self._idle = queue.LifoQueue()  # (conn, last_ok) - LIFO so the warmest connection is reused first
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._created = 0
+        self._generation = 0  # Bumped on every rebuild so stale connections are dropped on checkin
+        self._conn_generation = {}
+        self._conn_limit = {}  # id(conn) -> max_execution_time last set on it (ms)
+        self.ready = threading.Event()  # Set while the tunnel is believed healthy
+        self.supervisor = None
+
+    @property
+    def tunnel(self):
+        """The SSH tunnel behind the pool (None for direct and SQLite backends)"""
+        return self.backend.tunnel
+
+    def tunnel_active(self):
+        return self.backend.is_up()
+
+    def rebuild(self):
+        """
+        Start a fresh backend (a new tunnel for SSH) and swap it in, dropping
+        idle connections. The backend starts outside the pool lock so
+        checkins and new connections don't wait on the SSH handshake.
+        """
+        self.ready.clear()
+        backend = type(self.backend)(self.settings)
+        backend.start()
+        with self._lock:
+            old_backend, self.backend = self.backend, backend
+            self._generation += 1
+            self._drain_idle()
+        old_backend.stop()
+        self.ready.set()
+
+    def _drain_idle(self):
+        """Close every idle connection (they point at a dead tunnel port)"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+    def _discard(self, conn):
+        self._conn_generation.pop(id(conn), None)
+        self._conn_limit.pop(id(conn), None)
+        forget_statements(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _new_connection(self):
+        if not self.backend.is_up():
+            raise DatabaseUnavailable("Database unavailable - tunnel is reconnecting")
+        conn = self.backend.connect()
+        with self._lock:
+            self._created += 1
+            self._conn_generation[id(conn)] = self._generation
+        return conn
+
+    def warm(self, count=None):
+        """Open idle connections up to count (default: full pool size)"""
+        target = min(self.size, count or self.size)
+        while True:
+            with self._lock:
+                if self._idle.qsize() + self._in_use >= target:
+                    return
+            self._idle.put((self._new_connection(), time.time()))
+
+    def ping_idle(self):
+        """
+        Ping every idle connection, dropping dead ones.
+        Returns the best round-trip time in milliseconds, or None if no ping succeeded.
+        """
+        checked = []
+        while True:
+            try:
+                checked.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        best_rtt = None
+        for conn, _ in checked:
+            started = time.perf_counter()
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                self._discard(conn)
+                continue
+            rtt = (time.perf_counter() - started) * 1000
+            best_rtt = rtt if best_rtt is None else min(best_rtt, rtt)
+            self._idle.put((conn, time.time()))
+        return best_rtt
+
+    def checkout(self, timeout=None):
+        """Borrow a warm connection, failing fast if the database is down"""
+        if not self.ready.is_set():
+            # Give a starting supervisor one pool timeout to bring the tunnel up, but
+            # once it has reported a failure, don't make requests wait on reconnects
+            if self.supervisor is None or self.supervisor.status != 'starting' or not self.ready.wait(self.timeout):
+                raise DatabaseUnavailable("Database unavailable - reconnecting in background")
+        if not self.tunnel_active():
+            # Tunnel dropped since the last supervisor tick - wake it rather than reconnecting here
+            self.ready.clear()
+            if self.supervisor is not None:
+                self.supervisor.request_check()
+            raise DatabaseUnavailable("Database unavailable - reconnecting in background")
+        wait = self.timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=wait):
+            raise PoolExhausted(f"No database connection free after {wait}s (pool size {self.size})")
+        try:
+            conn = None
+            try:
+                conn, last_ok = self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            # Only re-verify connections the supervisor hasn't pinged recently
+            if conn is not None and time.time() - last_ok > self.settings['validate_after']:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self._discard(conn)
+                    conn = None
+            if conn is None:
+                conn = self._new_connection()
+            with self._lock:
+                self._in_use += 1
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def limit_statements(self, conn, seconds):
+        """
+        Set the per-statement execution limit on conn to the request budget
+        (rounded up to whole seconds so a steady budget costs no round trip)
+        """
+        milliseconds = max(1, math.ceil(seconds)) * 1000
+        if self._conn_limit.get(id(conn)) != milliseconds:
+            self.backend.limit_statements(conn, milliseconds)
+            self._conn_limit[id(conn)] = milliseconds
+
+    def checkin(self, conn, discard=False):
+        """
+        Return a connection to the pool, dropping it if it is no longer usable.
+        discard=True closes it outright (e.g. after a statement on it was killed).
+        """
+        with self._lock:
+            self._in_use -= 1
+        if discard:
+            self._discard(conn)
+            self._slots.release()
+            return
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+            current = self._conn_generation.get(id(conn)) == self._generation
+            if current and self.tunnel_active() and self._idle.qsize() < self.size:
+                self._idle.put((conn, time.time()))
+            else:
+                self._discard(conn)
+        except Exception:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close all idle connections and stop the backend"""
+        with self._lock:
+            self.ready.clear()
+            self._drain_idle()
+            self.backend.stop()
+
+    def stats(self):
+        """Snapshot of pool usage for diagnostics"""
+        active = self.tunnel_active()
+        return {
+            'backend': self.backend.name,
+            'driver': self.settings['driver'] if self.backend.name != 'sqlite' else None,
+            'size': self.size,
+            'in_use': self._in_use,
+            'idle': self._idle.qsize(),
+            'created': self._created,
+            'tunnel_active': active,
+            'local_port': self.tunnel.local_bind_port if active and self.tunnel is not None else None,
+            'description': self.backend.describe(),
+            'prepared_statements': prepared_stats(),
+        }
+
+class TunnelSupervisor(threading.Thread):
+    """
+    Background thread (one per worker) that keeps the pool warm.
+    Every interval it sends a backend keepalive (SSH keepalive for the
+    tunnel), pings the idle connections and, if either fails, rebuilds
+    the backend and connections off the request path.
+    """
+
+    def __init__(self, pool, interval=None):
+        super().__init__(name='db-supervisor', daemon=True)
+        self.pool = pool
+        self.interval = interval or pool.settings['supervisor_interval']
+        self.status = 'starting'
+        self.last_rtt_ms = None
+        self.last_check = None
+        self.last_error = None
+        self.reconnect_count = 0
+        self._wake = threading.Event()
+
+    def request_check(self):
+        """Ask the supervisor to check the connection now instead of waiting for the next tick"""
+        self._wake.set()
+
+    def _reconnect(self):
+        if self.status != 'starting':
+            self.status = 'reconnecting'
+        self.pool.rebuild()
+        self.pool.warm()
+        if self.status != 'starting':
+            self.reconnect_count += 1
+        print(f"Worker {os.getpid()}: database up via {self.pool.backend.describe()}")
+
+    def check(self):
+        """Run one keepalive/ping cycle, reconnecting if anything is broken"""
+        self.last_check = time.time()
+        try:
+            healthy = self.pool.tunnel_active() and self.pool.backend.keepalive()
+            rtt = self.pool.ping_idle() if healthy else None
+            if rtt is None:
+                self._reconnect()
+                rtt = self.pool.ping_idle()
+            else:
+                self.pool.warm()
+            self.last_rtt_ms = round(rtt, 2) if rtt is not None else None
+            self.status = 'up'
+            self.last_error = None
+        except Exception as e:
+            print(f"Worker {os.getpid()}: database supervisor check failed: {e}")
+            self.pool.ready.clear()
+            self.status = 'down'
+            self.last_error = str(e)
+
+    def run(self):
+        while True:
+            self.check()
+            # Retry sooner while the database is down
+            self._wake.wait(self.interval if self.status == 'up' else min(self.interval, 5))
+            self._wake.clear()
+
+    def state(self):
+        """Supervisor state for the admin dashboard"""
+        return {
+            'status': self.status,
+            'last_rtt_ms': self.last_rtt_ms,
+            'last_check': datetime.fromtimestamp(self.last_check).strftime('%Y-%m-%d %H:%M:%S') if self.last_check else None,
+            'reconnect_count': self.reconnect_count,
+            'last_error': self.last_error,
+            'interval_seconds': self.interval,
+        }
+
+# Per-process pool (each Gunicorn worker builds its own after fork)
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Get or create the connection pool (and its supervisor) for the current process"""
+    global _pool, _pool_pid
+    current_pid = os.getpid()
+    with _pool_lock:
+        if _pool is None or _pool_pid != current_pid:
+            print(f"Worker {current_pid}: creating connection pool...")
+            _pool = ConnectionPool()
+            _pool.supervisor = TunnelSupervisor(_pool)
+            _pool.supervisor.start()
+            _pool_pid = current_pid
+        return _pool
+
 if __name__ == "__main__":
     get_db_connection()
@@ -41,11 +41,26 @@ pip install --upgrade pip
 pip install --trusted-host pypi.org --trusted-host files.pythonhosted.org -r requirements.txt
 pip install gunicorn
 
+# Build the local auction mirror the app reads from (DB_BACKEND=sqlite)
+echo "🗄️  Building local auction mirror (first full sync)..."
+mkdir -p data logs
+if (set -a; source <(sudo cat /etc/fusca-env.conf); set +a; python3 scripts/sync_auction_mirror.py --full); then
+    echo "✅ Auction mirror ready"
+else
+    echo "⚠️  Mirror sync failed - the app will use the SSH tunnel until the sync timer builds it"
+fi
+
+# Keep the mirror current: hourly delta sync, weekly full rebuild
+echo "⏱️  Setting up mirror sync timers..."
+sudo cp deployment/fusca-mirror-sync.service deployment/fusca-mirror-sync.timer /etc/systemd/system/
+sudo cp deployment/fusca-mirror-full.service deployment/fusca-mirror-full.timer /etc/systemd/system/
+
 # Setup systemd service
 echo "⚙️  Setting up systemd service..."
 sudo cp deployment/fusca.service /etc/systemd/system/
 sudo systemctl daemon-reload
 sudo systemctl enable fusca
+sudo systemctl enable --now fusca-mirror-sync.timer fusca-mirror-full.timer
 
 # Setup Nginx
 echo "🌐 Configuring Nginx..."
@@ -72,4 +87,6 @@ echo "📊 Useful commands:"
 echo "  - View logs: sudo journalctl -u fusca -f"
 echo "  - Restart app: sudo systemctl restart fusca"
 echo "  - Check status: sudo systemctl status fusca"
+echo "  - Mirror sync logs: sudo journalctl -u fusca-mirror-sync -u fusca-mirror-full"
+echo "  - Sync mirror now: sudo systemctl start fusca-mirror-sync"
 
@@ -0,0 +1,361 @@
+"""
+Cache of chart and metrics responses, per worker with a shared disk tier.
+
+Auction data only changes when a sale is loaded, so identical chart
+requests keep producing identical JSON. Responses are cached under a key
+built from the endpoint and the canonical request body (column filter
+lists reduced with ColumnFilters, so filter order and phrasing don't
+matter), within a memory budget with least-recently-used eviction.
+
+Entries belong to a data version (MAX(sale_date), MAX(id)), probed at
+most every RESULT_CACHE_CHECK_INTERVAL seconds; when it moves the whole
+cache is dropped. RESULT_CACHE_TTL bounds how long an entry lives anyway,
+for corrections to existing rows that don't move the version.
+
+Behind each worker's memory LRU is a SQLite file (RESULT_CACHE_PATH)
+that every worker reads and writes, so a result computed by one worker -
+or before a restart - is served warm by the others instead of re-querying
+the database through a cold tunnel. Rows are keyed by (request key, data
+version), each write is one transaction, and the file is pruned to
+RESULT_CACHE_DISK_MB by least recent access. The last probed data version
+is shared through the file too, so a freshly started worker can serve
+from it without touching the database. cached_value/cached_values keep
+intermediate results (e.g. a DataFrame several requests reuse, or the
+blend engine's per-type series) in both tiers, pickled.
+
+Disable with RESULT_CACHE=0, or just the disk tier with RESULT_CACHE_DISK=0.
+"""
+
+import os
+import json
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+from db_connector import BASE_DIR, ProcessLocal, data_version
+from column_filters import ColumnFilters
+
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE', '1') == '1'
+RESULT_CACHE_MB = float(os.environ.get('RESULT_CACHE_MB', '64'))
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', '3600'))
+VERSION_CHECK_INTERVAL = float(os.environ.get('RESULT_CACHE_CHECK_INTERVAL', '30'))
+DISK_CACHE_ENABLED = os.environ.get('RESULT_CACHE_DISK', '1') == '1'
+DISK_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH', os.path.join(BASE_DIR, 'data', 'result_cache.sqlite3'))
+DISK_CACHE_MB = float(os.environ.get('RESULT_CACHE_DISK_MB', '512'))
+
+def _is_filter_list(value):
+    return bool(value) and all(isinstance(item, dict) and 'column' in item and 'operator' in item for item in value)
+
+def canonical_request(value):
+    """Request body with every column filter list replaced by its canonical form"""
+    if isinstance(value, dict):
+        return {key: canonical_request(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if _is_filter_list(value):
+            return ColumnFilters.compile(value).canonical()
+        return [canonical_request(item) for item in value]
+    return value
+
+def request_key(endpoint, payload):
+    """Cache key for a request; includes today's date for endpoints whose windows are relative to it"""
+    canonical = [endpoint, canonical_request(payload), date.today().isoformat()]
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class CachedResult:
+    """A cached response body plus the activity log entries the request wrote"""
+
+    def __init__(self, body, activity, stored_at=None):
+        self.body = body
+        self.activity = activity
+        self.size = len(body)
+        self.stored_at = stored_at if stored_at is not None else time.time()
+
+class DiskCache:
+    """
+    CachedResult rows in a SQLite file shared by all workers. Errors (a
+    locked or full disk) are printed and treated as misses - the disk tier
+    never fails a request.
+    """
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS results (
+            key TEXT NOT NULL,
+            version TEXT NOT NULL,
+            body BLOB NOT NULL,
+            activity TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            stored_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (key, version)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed_at)",
+        "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)",
+    ]
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or DISK_CACHE_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else int(DISK_CACHE_MB * 1024 * 1024)
+        self._local = threading.local()
+        self.hits = 0
+        self.errors = 0
+
+    def _conn(self):
+        """This thread's connection (sqlite3 connections can't cross threads or forks)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _failed(self, action, e):
+        self.errors += 1
+        print(f"Worker {os.getpid()}: disk result cache {action} failed: {e}")
+
+    def get(self, key, version, ttl):
+        """CachedResult for key at version, or None (also when older than ttl)"""
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT body, activity, stored_at FROM results WHERE key = ? AND version = ?",
+                               (key, json.dumps(version))).fetchone()
+            if row is None or time.time() - row[2] > ttl:
+                return None
+            conn.execute("UPDATE results SET accessed_at = ? WHERE key = ? AND version = ?",
+                         (time.time(), key, json.dumps(version)))
+        except sqlite3.Error as e:
+            self._failed('read', e)
+            return None
+        self.hits += 1
+        return CachedResult(row[0], [tuple(activity) for activity in json.loads(row[1])], stored_at=row[2])
+
+    def put(self, key, version, entry):
+        """Store entry in one transaction, then prune least recently used rows beyond max_bytes"""
+        if entry.size > self.max_bytes:
+            return
+        try:
+            conn = self._conn()
+            now = time.time()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("INSERT OR REPLACE INTO results (key, version, body, activity, size, stored_at, accessed_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (key, json.dumps(version), entry.body, json.dumps(entry.activity, default=str),
+                              entry.size, entry.stored_at, now))
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+                if total > self.max_bytes:
+                    excess = total - self.max_bytes
+                    victims = []
+                    for rowid, size in conn.execute("SELECT rowid, size FROM results ORDER BY accessed_at"):
+                        if excess <= 0:
+                            break
+                        victims.append((rowid,))
+                        excess -= size
+                    conn.executemany("DELETE FROM results WHERE rowid = ?", victims)
+        except sqlite3.Error as e:
+            self._failed('write', e)
+
+    def shared_version(self, max_age=None):
+        """Data version last probed by any worker, if within max_age seconds (any age when None)"""
+        try:
+            row = self._conn().execute("SELECT value, updated_at FROM meta WHERE name = 'data_version'").fetchone()
+        except sqlite3.Error as e:
+            self._failed('read', e)
+            return None
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        return tuple(json.loads(row[0]))
+
+    def record_version(self, version):
+        """Share a freshly probed data version; rows of any other version are dropped"""
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("INSERT OR REPLACE INTO meta (name, value, updated_at) VALUES ('data_version', ?, ?)",
+                             (json.dumps(version), time.time()))
+                conn.execute("DELETE FROM results WHERE version != ?", (json.dumps(version),))
+        except sqlite3.Error as e:
+            self._failed('write', e)
+
+    def stats(self):
+        try:
+            entries, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        except sqlite3.Error as e:
+            self._failed('read', e)
+            entries, size = None, None
+        return {
+            'path': self.path,
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'errors': self.errors,
+        }
+
+class ResultCache:
+    """
+    LRU of CachedResult within max_bytes, dropped whenever the data version
+    changes; misses fall through to the shared disk tier when there is one
+    """
+
+    def __init__(self, max_bytes=None, ttl=None, check_interval=None, disk=None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(RESULT_CACHE_MB * 1024 * 1024)
+        self.ttl = ttl if ttl is not None else RESULT_CACHE_TTL
+        self.check_interval = check_interval if check_interval is not None else VERSION_CHECK_INTERVAL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.version = None
+        self.last_check = 0
+        self.disk = disk
+
+    def check_version(self, get_conn):
+        """
+        Probe the data version (at most every check_interval seconds) and
+        clear the cache if it moved. A version another worker probed within
+        the interval is used as is.
+        """
+        if time.time() - self.last_check < self.check_interval:
+            return
+        self.last_check = time.time()
+        version = self.disk.shared_version(self.check_interval) if self.disk else None
+        if version is None:
+            try:
+                version = data_version(get_conn())
+            except Exception:
+                # Cold start with the database unreachable: trust the last version any worker saw
+                version = self.disk.shared_version() if self.disk and self.version is None else None
+                if version is None:
+                    raise
+                print(f"Worker {os.getpid()}: database unreachable, serving disk cache at data version {version}")
+            else:
+                if self.disk:
+                    self.disk.record_version(version)
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                    print(f"Worker {os.getpid()}: data version {self.version} -> {version}, "
+                          f"dropping {len(self._entries)} cached results")
+                self._entries.clear()
+                self.bytes = 0
+                self.version = version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.stored_at > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            version = self.version
+        entry = self.disk.get(key, version, self.ttl) if self.disk and version is not None else None
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        self._store(key, entry)
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self._store(key, entry)
+        if self.disk and self.version is not None:
+            self.disk.put(key, self.version, entry)
+
+    def _store(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and self.bytes + entry.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = entry
+            self.bytes += entry.size
+
+    def _remove(self, key):
+        self.bytes -= self._entries.pop(key).size
+
+    def stats(self):
+        """Cache state for the admin dashboard"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': True,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'ttl_seconds': self.ttl,
+                'data_version': list(self.version) if self.version is not None else None,
+                'last_check': datetime.fromtimestamp(self.last_check).strftime('%Y-%m-%d %H:%M:%S') if self.last_check else None,
+                'disk': self.disk.stats() if self.disk else None,
+            }
+
+# Per-process cache (each Gunicorn worker has its own after fork)
+_cache = ProcessLocal(lambda: ResultCache(disk=DiskCache() if DISK_CACHE_ENABLED else None))
+
+def get_result_cache():
+    """This process's result cache, or None when disabled"""
+    if not RESULT_CACHE_ENABLED:
+        return None
+    return _cache.get()
+
+def cached_values(name, payloads, compute, get_conn):
+    """
+    Several values memoized like cached_value in one call: payloads is
+    {id: payload}, and compute(missing_ids) returns {id: value} for the ids
+    not found in either tier (ids it leaves out are neither returned nor
+    cached). Lets a caller fetch every miss in one batch.
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return compute(list(payloads))
+    try:
+        cache.check_version(get_conn)
+    except Exception as e:
+        print(f"Result cache version check failed: {e}")
+    keys = {item: request_key(f"value:{name}", payload) for item, payload in payloads.items()}
+    values = {}
+    for item, key in keys.items():
+        entry = cache.get(key)
+        if entry is not None:
+            values[item] = pickle.loads(entry.body)
+    missing = [item for item in payloads if item not in values]
+    if missing:
+        computed = compute(missing)
+        for item, value in computed.items():
+            cache.put(keys[item], CachedResult(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), []))
+        values.update(computed)
+    return values
+
+def cached_value(name, payload, compute, get_conn):
+    """
+    compute() memoized in both cache tiers under name and payload for the
+    current data version, e.g. a DataFrame several requests start from.
+    Values are pickled, so anything picklable can be cached.
+    """
+    return cached_values(name, {None: payload}, lambda missing: {None: compute()}, get_conn)[None]
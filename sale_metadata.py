@@ -0,0 +1,96 @@
+"""
+Sale metadata: filter ranges, the sale-date calendar and per-sale
+offering/passings, computed once per data version and cached per worker.
+
+The simple search page asks for the filter column ranges on every load,
+market reports for the most recent sale date and each sale's offering.
+These only change when a sale is loaded, so instead of scanning the table
+on every request they are computed together in two aggregate queries and
+reused until the data version (MAX(sale_date), MAX(id)) moves, checked at
+most every SALE_METADATA_CHECK_INTERVAL seconds.
+"""
+
+import os
+import time
+from datetime import datetime
+
+from db_connector import VersionedValue
+
+CHECK_INTERVAL = float(os.environ.get('SALE_METADATA_CHECK_INTERVAL', '60'))
+
+# (column, key suffix) pairs reported by /api/filters
+FILTER_RANGE_COLUMNS = [
+    ('colour', 'colour'), ('micron', 'micron'), ('yield', 'yield'),
+    ('vegetable_matter', 'vm'), ('price', 'price')
+]
+
+def normalize_sale_date(sale_date):
+    """'YYYY-MM-DD' from a date, or a date/datetime string ('2024-01-04 00:00:00', '2024-01-04T...')"""
+    sale_date = str(sale_date).strip()
+    if ' ' in sale_date:
+        sale_date = sale_date.split(' ')[0]
+    if 'T' in sale_date:
+        sale_date = sale_date.split('T')[0]
+    try:
+        return datetime.strptime(sale_date, '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        return sale_date
+
+class SaleMetadata:
+    """Filter ranges, ordered sale dates and (total, sold) bales per sale for one data version"""
+
+    def __init__(self, ranges, sales, version):
+        self.ranges = ranges
+        self.sales = sales  # {'YYYY-MM-DD': (total_bales, sold_bales)}
+        self.sale_dates = sorted(sales)
+        self.version = version
+        self.loaded_at = time.time()
+
+    @classmethod
+    def load(cls, conn, version):
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT {', '.join(f'MIN({column}) as min_{key}, MAX({column}) as max_{key}' for column, key in FILTER_RANGE_COLUMNS)}
+            FROM auction_data_joined
+            WHERE price > 10
+        """)
+        ranges = cursor.fetchone()
+        cursor.close()
+
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT sale_date,
+                   SUM(CASE WHEN bales > 0 THEN bales ELSE 0 END) as total_bales,
+                   SUM(CASE WHEN bales > 0 AND is_sold = 1 THEN bales ELSE 0 END) as sold_bales
+            FROM auction_data_joined
+            WHERE sale_date IS NOT NULL
+            GROUP BY sale_date
+        """)
+        sales = {
+            normalize_sale_date(sale_date): (int(total_bales or 0), int(sold_bales or 0))
+            for sale_date, total_bales, sold_bales in cursor.fetchall()
+        }
+        cursor.close()
+        return cls(ranges, sales, version)
+
+    def most_recent_date(self):
+        return self.sale_dates[-1] if self.sale_dates else None
+
+    def sale_stats(self, sale_date):
+        """Offering, sold bales and passings for a sale date (zeros for a date without a sale)"""
+        total_bales, sold_bales = self.sales.get(normalize_sale_date(sale_date), (0, 0))
+        passings = round((sold_bales / total_bales) * 100, 1) if total_bales > 0 else 0
+        return {
+            'totalBales': total_bales,
+            'soldBales': sold_bales,
+            'passings': f'{passings}%'
+        }
+
+_metadata = VersionedValue(SaleMetadata.load, CHECK_INTERVAL)
+
+def get_sale_metadata(get_conn):
+    """
+    This process's sale metadata, recomputed when the data version has moved.
+    get_conn is only called when the version needs checking.
+    """
+    return _metadata.get(get_conn)
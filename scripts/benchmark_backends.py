@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark Database Backends
+Runs a few representative chart queries against each database backend
+and reports per-query latency, so the cost of the SSH tunnel hop and of
+pure-Python protocol decoding can be compared with the alternatives.
+
+Usage:
+    python3 scripts/benchmark_backends.py [--backends ssh:pure ssh:c direct:c sqlite] [--runs 10] [--wool-type 1PAC]
+    python3 scripts/benchmark_backends.py --explain [--backends ssh:c sqlite] [--wool-type 1PAC]
+
+Each backend is written as name[:driver]; the driver (pure or c) only
+applies to the MySQL backends. Backends that cannot connect are reported
+and skipped.
+
+--explain prints the query plan of the per-type lot query with the old
+CAST(wool_type_id AS CHAR) predicate and with the predicate the wool type
+dimension resolves the term to, to check the latter uses an index.
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import time
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_connector import get_db_settings, get_backend
+from wool_types import FALLBACK_PREDICATE, type_predicate
+
+# (label, query, params) - wool type is substituted into params at run time
+BENCHMARK_QUERIES = [
+    ('ping', "SELECT 1", []),
+    ('most_recent_date', "SELECT MAX(sale_date) FROM auction_data_joined WHERE sale_date IS NOT NULL", []),
+    ('price_chart_lots', """
+        SELECT sale_date, price, bales, type_combined, colour, vegetable_matter
+        FROM auction_data_joined
+        WHERE price > 10 AND bales > 0
+        AND type_combined = %s
+        ORDER BY sale_date ASC
+    """, ['{wool_type}']),
+    ('search_page', """
+        SELECT id, lot_number, sale_date, bales, kg, price, colour, micron, yield,
+               vegetable_matter, wool_type_id, type_combined, location, is_sold,
+               seller_name, farm_brand_name
+        FROM auction_data_joined
+        WHERE price > 10
+        ORDER BY sale_date DESC LIMIT 1000
+    """, []),
+]
+
+def run_query(conn, query, params):
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    elapsed = (time.perf_counter() - started) * 1000
+    cursor.close()
+    return elapsed, len(rows)
+
+def benchmark_backend(spec, runs, wool_type):
+    """Time every benchmark query on one backend; returns {label: (median_ms, p95_ms, rows)}"""
+    name, _, driver = spec.partition(':')
+    settings = get_db_settings()
+    settings['backend'] = name
+    if driver:
+        settings['driver'] = driver
+
+    backend = get_backend(settings)
+    connect_started = time.perf_counter()
+    backend.start()
+    conn = backend.connect()
+    connect_ms = (time.perf_counter() - connect_started) * 1000
+
+    results = {'connect': (connect_ms, connect_ms, 0)}
+    try:
+        for label, query, params in BENCHMARK_QUERIES:
+            params = [p.format(wool_type=wool_type) for p in params]
+            run_query(conn, query, params)  # warm-up (server caches, driver prep)
+            timings = []
+            row_count = 0
+            for _ in range(runs):
+                elapsed, row_count = run_query(conn, query, params)
+                timings.append(elapsed)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))]
+            results[label] = (statistics.median(timings), p95, row_count)
+    finally:
+        conn.close()
+        backend.stop()
+    return results
+
+TYPE_QUERY = """
+    SELECT sale_date, price, bales
+    FROM auction_data_joined
+    WHERE price > 10 AND bales > 0 AND {predicate}
+    ORDER BY sale_date ASC
+"""
+
+def explain_type_query(spec, wool_type):
+    """Print query plans for the CAST predicate and the resolved one; returns the resolved plan rows"""
+    name, _, driver = spec.partition(':')
+    settings = get_db_settings()
+    settings['backend'] = name
+    if driver:
+        settings['driver'] = driver
+
+    backend = get_backend(settings)
+    backend.start()
+    conn = backend.connect()
+    try:
+        resolved = type_predicate(wool_type, lambda: conn)
+        plans = {}
+        for label, (predicate, params) in [('CAST predicate', (FALLBACK_PREDICATE, [wool_type, wool_type])),
+                                           ('resolved predicate', resolved)]:
+            prefix = 'EXPLAIN QUERY PLAN' if name == 'sqlite' else 'EXPLAIN'
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"{prefix} {TYPE_QUERY.format(predicate=predicate)}", params)
+            plans[label] = cursor.fetchall()
+            cursor.close()
+            print(f"  {label}: {predicate} {params}")
+            for row in plans[label]:
+                if name == 'sqlite':
+                    print(f"    {row['detail']}")
+                else:
+                    print(f"    table={row['table']} type={row['type']} key={row['key']} rows={row['rows']}")
+        return plans['resolved predicate']
+    finally:
+        conn.close()
+        backend.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-query latency across database backends')
+    parser.add_argument('--backends', nargs='+', default=['ssh:pure', 'ssh:c', 'direct:c', 'sqlite'])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--wool-type', default='1PAC', help='Wool type used by the per-type query')
+    parser.add_argument('--explain', action='store_true', help='Show per-type query plans instead of timing')
+    args = parser.parse_args()
+
+    if args.explain:
+        for spec in args.backends:
+            print(f"Query plans on {spec}:")
+            try:
+                explain_type_query(spec, args.wool_type)
+            except Exception as e:
+                print(f"  skipped: {e}")
+        return
+
+    all_results = {}
+    for spec in args.backends:
+        print(f"Benchmarking {spec}...")
+        try:
+            all_results[spec] = benchmark_backend(spec, args.runs, args.wool_type)
+        except Exception as e:
+            print(f"  skipped: {e}")
+
+    if not all_results:
+        print("No backend could be benchmarked")
+        return
+
+    labels = ['connect'] + [label for label, _, _ in BENCHMARK_QUERIES]
+    print()
+    print(f"{'query':<20}" + ''.join(f"{spec:>24}" for spec in all_results))
+    print(f"{'':<20}" + ''.join(f"{'median / p95 ms':>24}" for _ in all_results))
+    for label in labels:
+        row = f"{label:<20}"
+        for spec, results in all_results.items():
+            median_ms, p95_ms, _ = results[label]
+            row += f"{median_ms:>14.2f} / {p95_ms:>7.2f}"
+        print(row)
+    print()
+    for spec, results in all_results.items():
+        rows = ', '.join(f"{label}={results[label][2]}" for label in labels[1:])
+        print(f"{spec} rows: {rows}")
+
+if __name__ == '__main__':
+    main()
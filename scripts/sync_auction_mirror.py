@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Sync Auction Mirror Script
+Keeps a local SQLite mirror of auction_data_joined that the app reads from
+(DB_BACKEND=sqlite, the default). The first run copies the whole table;
+later runs pull only the delta from MySQL:
+
+  - rows with an id above the last synced id (new lots), and
+  - every row from the last DB_MIRROR_RESYNC_DAYS of sales, which replace
+    the local copies so post-sale corrections and withdrawn lots are picked up.
+
+The id / sale_date watermark is kept in the mirror's mirror_sync table.
+deployment/deploy.sh runs the first --full sync and installs systemd
+timers for an hourly delta sync (fusca-mirror-sync.timer) and a weekly
+rebuild (fusca-mirror-full.timer). Without a timer, cron works too:
+0 * * * * /var/www/fusca/fusca_pro_lookup/venv/bin/python3 /var/www/fusca/fusca_pro_lookup/scripts/sync_auction_mirror.py >> /var/www/fusca/fusca_pro_lookup/logs/cron_mirror_sync.log 2>&1
+(cron does not read /etc/fusca-env.conf, so export its DB_/SSH_ settings in the crontab.)
+
+Usage:
+    python3 scripts/sync_auction_mirror.py [--source ssh|direct] [--output path] [--full] [--resync-days 14]
+
+Each sync also refreshes the daily_type_prices rollup (see daily_rollup.py)
+for every sale date it touched.
+
+--full rebuilds the mirror from scratch (worth doing weekly, as it is the
+only way to pick up edits to sales older than the resync window). Full
+rebuilds and deltas are both applied in one transaction on the live file
+(never a file swap under open connections), so the app never sees a
+half-synced mirror.
+"""
+
+import os
+import sys
+import argparse
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_connector import get_db_settings, get_backend
+from daily_rollup import update_rollup
+
+# Columns copied into the mirror (everything the app selects or filters on).
+# Text compares case-insensitively, like MySQL's default collation.
+MIRROR_COLUMNS = [
+    ('id', 'INTEGER PRIMARY KEY'),
+    ('lot_number', 'TEXT COLLATE NOCASE'),
+    ('sale_date', 'DATE'),
+    ('bales', 'REAL'),
+    ('kg', 'REAL'),
+    ('price', 'REAL'),
+    ('colour', 'REAL'),
+    ('micron', 'REAL'),
+    ('yield', 'REAL'),
+    ('vegetable_matter', 'REAL'),
+    ('wool_type_id', 'INTEGER'),
+    ('type_combined', 'TEXT COLLATE NOCASE'),
+    ('location', 'TEXT COLLATE NOCASE'),
+    ('is_sold', 'INTEGER'),
+    ('seller_name', 'TEXT COLLATE NOCASE'),
+    ('farm_brand_name', 'TEXT COLLATE NOCASE'),
+]
+
+MIRROR_INDEXES = [
+    'CREATE INDEX idx_sale_date ON auction_data_joined (sale_date)',
+    'CREATE INDEX idx_type_date ON auction_data_joined (type_combined, sale_date)',
+    'CREATE INDEX idx_wool_type_id ON auction_data_joined (wool_type_id)',
+]
+
+BATCH_SIZE = 5000
+RESYNC_DAYS = int(os.environ.get('DB_MIRROR_RESYNC_DAYS', '14'))
+
+COLUMN_NAMES = [name for name, _ in MIRROR_COLUMNS]
+SELECT_SQL = f"SELECT {', '.join(COLUMN_NAMES)} FROM auction_data_joined"
+INSERT_SQL = 'INSERT OR REPLACE INTO auction_data_joined ({}) VALUES ({})'.format(
+    ', '.join(COLUMN_NAMES), ', '.join(['?'] * len(COLUMN_NAMES))
+)
+
+def to_sqlite_value(value):
+    """Convert MySQL driver values (Decimal, date) to types sqlite3 stores natively"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+def copy_rows(source_conn, target, query, params=None):
+    """Stream rows from MySQL into the mirror in batches; returns the row count"""
+    cursor = source_conn.cursor(buffered=False)
+    cursor.execute(query, params or [])
+    copied = 0
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            break
+        target.executemany(INSERT_SQL, [tuple(to_sqlite_value(v) for v in row) for row in rows])
+        copied += len(rows)
+        print(f"  copied {copied:,} rows...")
+    cursor.close()
+    return copied
+
+def record_watermark(target, rows_pulled, full):
+    """Store the id / sale_date watermark the next delta pull starts from"""
+    max_id, max_sale_date, total = target.execute(
+        'SELECT MAX(id), MAX(sale_date), COUNT(*) FROM auction_data_joined'
+    ).fetchone()
+    state = {
+        'max_id': max_id or 0,
+        'max_sale_date': max_sale_date or '',
+        'row_count': total,
+        'last_sync': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'last_sync_rows': rows_pulled,
+        'last_sync_mode': 'full' if full else 'incremental',
+    }
+    target.executemany('INSERT OR REPLACE INTO mirror_sync (key, value) VALUES (?, ?)',
+                       [(key, str(value)) for key, value in state.items()])
+    return state
+
+def read_watermark(path):
+    """Return the mirror's sync state as a dict, or None if there is no usable mirror"""
+    if not os.path.exists(path):
+        return None
+    target = sqlite3.connect(path)
+    try:
+        return dict(target.execute('SELECT key, value FROM mirror_sync').fetchall())
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        target.close()
+
+def build_mirror(source_conn, output_path):
+    """
+    Rebuild auction_data_joined and the rollup from scratch inside one
+    transaction on the live mirror file. The file is never replaced while
+    the app has it open; readers keep their WAL snapshot until the commit.
+    """
+    target = sqlite3.connect(output_path, timeout=60)
+    try:
+        # WAL lets the app keep reading while the rebuild (and later deltas) are written
+        target.execute('PRAGMA journal_mode=WAL')
+        target.execute('BEGIN IMMEDIATE')
+        target.execute('DROP TABLE IF EXISTS auction_data_joined')
+        target.execute('DROP TABLE IF EXISTS daily_type_prices')
+        target.execute('CREATE TABLE auction_data_joined ({})'.format(
+            ', '.join(f'{name} {sql_type}' for name, sql_type in MIRROR_COLUMNS)
+        ))
+        target.execute('CREATE TABLE IF NOT EXISTS mirror_sync (key TEXT PRIMARY KEY, value TEXT)')
+
+        copied = copy_rows(source_conn, target, SELECT_SQL)
+        for index_sql in MIRROR_INDEXES:
+            target.execute(index_sql)
+        print(f"  rolled up {update_rollup(target):,} type/sale-date rows")
+        state = record_watermark(target, copied, full=True)
+        target.commit()
+    except Exception:
+        target.rollback()
+        raise
+    finally:
+        target.close()
+    return state
+
+def sync_mirror(source_conn, output_path, resync_days=None):
+    """Apply new and recently changed rows to an existing mirror in one transaction"""
+    watermark = read_watermark(output_path)
+    resync_days = RESYNC_DAYS if resync_days is None else resync_days
+    max_id = int(watermark['max_id'])
+    if watermark['max_sale_date']:
+        last_sale = datetime.strptime(watermark['max_sale_date'], '%Y-%m-%d').date()
+        resync_from = (last_sale - timedelta(days=resync_days)).strftime('%Y-%m-%d')
+    else:
+        resync_from = '9999-12-31'
+    print(f"Pulling rows with id > {max_id} or sale_date >= {resync_from}")
+
+    target = sqlite3.connect(output_path, timeout=60)
+    try:
+        target.execute('BEGIN IMMEDIATE')
+        has_rollup = target.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_type_prices'"
+        ).fetchone() is not None
+        # Replace the resync window wholesale so lots withdrawn after the sale disappear too
+        target.execute('DELETE FROM auction_data_joined WHERE sale_date >= ?', [resync_from])
+        pulled = copy_rows(source_conn, target, SELECT_SQL + " WHERE id > %s OR sale_date >= %s",
+                           [max_id, resync_from])
+        if has_rollup:
+            # Re-roll every sale date the delta touched (old window dates too, in case a sale vanished)
+            touched = [d for (d,) in target.execute("""
+                SELECT sale_date FROM auction_data_joined WHERE (id > ? OR sale_date >= ?) AND sale_date IS NOT NULL
+                UNION SELECT sale_date FROM daily_type_prices WHERE sale_date >= ?
+            """, [max_id, resync_from, resync_from])]
+            rolled = update_rollup(target, touched)
+        else:
+            rolled = update_rollup(target)
+        print(f"  rolled up {rolled:,} type/sale-date rows")
+        state = record_watermark(target, pulled, full=False)
+        target.commit()
+    except Exception:
+        target.rollback()
+        raise
+    finally:
+        target.close()
+    return state
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync auction_data_joined into the local SQLite mirror')
+    parser.add_argument('--source', default='ssh', choices=['ssh', 'direct'], help='How to reach MySQL')
+    parser.add_argument('--output', default=None, help='Mirror file (default: DB_SQLITE_PATH)')
+    parser.add_argument('--full', action='store_true', help='Rebuild the mirror from scratch')
+    parser.add_argument('--resync-days', type=int, default=None,
+                        help=f'Days of recent sales to re-pull on each sync (default: {RESYNC_DAYS})')
+    args = parser.parse_args()
+
+    settings = get_db_settings()
+    settings['backend'] = args.source
+    output_path = args.output or settings['sqlite_path']
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    full = args.full or read_watermark(output_path) is None
+
+    backend = get_backend(settings)
+    backend.start()
+    conn = backend.connect()
+    try:
+        start_time = time.time()
+        mode = 'Rebuilding' if full else 'Syncing'
+        print(f"{mode} mirror {output_path} from {backend.describe()}")
+        if full:
+            state = build_mirror(conn, output_path)
+        else:
+            state = sync_mirror(conn, output_path, args.resync_days)
+        print(f"Done in {time.time() - start_time:.1f}s: pulled {state['last_sync_rows']:,} rows, "
+              f"mirror holds {state['row_count']:,} rows up to {state['max_sale_date']} (id {state['max_id']})")
+    finally:
+        conn.close()
+        backend.stop()
+
+if __name__ == '__main__':
+    main()
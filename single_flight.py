@@ -0,0 +1,95 @@
+"""
+Single-flight coalescing of identical concurrent requests, per worker.
+
+Market report pages and the iframes embedding them often ask for the same
+blend or indicator data at the same moment. Instead of each request
+running its own query fan-out, the first one to arrive for a key (the
+result cache's canonical request key) computes the result and requests
+arriving while it runs wait for it and share it - including a failure,
+so the waiters don't each retry the work that just failed. Once the call
+finishes the key is free again; the next request starts a new call.
+
+Disable with REQUEST_COALESCING=0.
+"""
+
+import os
+import threading
+
+from db_connector import ProcessLocal
+
+COALESCING_ENABLED = os.environ.get('REQUEST_COALESCING', '1') == '1'
+
+class Call:
+    """One in-flight computation and the outcome its waiters will share"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its outcome"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_failures = 0
+
+    def do(self, key, compute, timeout=None):
+        """
+        (result, leader): compute()'s result and whether this caller ran it.
+        Waiters re-raise the leader's exception, or TimeoutError if it
+        hasn't finished within timeout seconds.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Call()
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = compute()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                    if call.error is not None:
+                        self.shared_failures += call.waiters
+                call.done.set()
+            return call.result, True
+
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"Identical request still running after {timeout:g}s")
+        if call.error is not None:
+            raise call.error
+        return call.result, False
+
+    def stats(self):
+        """Coalescing counters for the admin dashboard"""
+        with self._lock:
+            return {
+                'enabled': True,
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'shared_failures': self.shared_failures,
+            }
+
+# Per-process instance (threads within a Gunicorn worker coalesce; workers don't)
+_flights = ProcessLocal(SingleFlight)
+
+def get_single_flight():
+    """This process's SingleFlight, or None when coalescing is disabled"""
+    if not COALESCING_ENABLED:
+        return None
+    return _flights.get()
@@ -73,8 +73,8 @@ function setupBlend() {
         return;
     }
     
-    if (entries.length > 5) {
-        alert('Maximum 5 entries for blending');
+    if (entries.length > 50) {
+        alert('Maximum 50 entries for blending');
         return;
     }
     
@@ -477,33 +477,36 @@ function updateChart() {
         data: interpolateDataset(dataset.data)
     }));
     
-    const blendedData = [];
     const labels = currentChartData.labels;
-    
-    for (let i = 0; i < labels.length; i++) {
-        let weightedSum = 0;
-        let totalWeight = 0;
-        
-        interpolatedDatasets.forEach((dataset, idx) => {
-            const value = dataset.data[i];
-            if (value !== null && value !== undefined) {
-                weightedSum += value * currentWeights[idx];
-                totalWeight += currentWeights[idx];
-            }
-        });
-        
-        blendedData.push(totalWeight > 0 ? weightedSum / totalWeight : null);
+    // Weighted average computed by the server with the weights the chart was requested with
+    let blendedData = currentChartData.weighted_average;
+    
+    if (!blendedData) {
+        blendedData = [];
+        for (let i = 0; i < labels.length; i++) {
+            let weightedSum = 0;
+            let totalWeight = 0;
+            
+            interpolatedDatasets.forEach((dataset, idx) => {
+                const value = dataset.data[i];
+                if (value !== null && value !== undefined) {
+                    weightedSum += value * currentWeights[idx];
+                    totalWeight += currentWeights[idx];
+                }
+            });
+            
+            blendedData.push(totalWeight > 0 ? weightedSum / totalWeight : null);
+        }
     }
     
-    const colors = ['#3D7F4B', '#1976D2', '#D32F2F', '#F57C00', '#7B1FA2'];
     const datasets = [];
     
-    // Individual entry lines (20% opacity)
+    // Individual entry lines (20% opacity, in the colour the server gave each entry)
     interpolatedDatasets.forEach((dataset, idx) => {
         datasets.push({
             label: currentEntries[idx].label + ` (weight: ${currentWeights[idx]})`,
             data: dataset.data,
-            borderColor: colors[idx % colors.length] + '33',
+            borderColor: dataset.borderColor + '33',
             backgroundColor: 'transparent',
             borderWidth: 1.5,
             tension: 0.1,
@@ -529,31 +529,39 @@ async function fetchReportData() {
         section.searchIds.forEach(id => searchIdsToFetch.add(id));
     });
     
-    // Fetch current/previous prices for each search used in sections
-    for (const searchId of searchIdsToFetch) {
-        const search = savedSearches.find(s => s.id === searchId);
-        if (!search) continue;
-        
+    // Fetch current/previous prices for every search used in sections in one request
+    const searchesToFetch = [...searchIdsToFetch]
+        .map(searchId => savedSearches.find(s => s.id === searchId))
+        .filter(search => search);
+    
+    if (searchesToFetch.length > 0) {
         try {
-            const response = await fetch('/api/market_report/search_prices', {
+            const response = await fetch('/api/market_report/search_prices_batch', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ savedSearch: search })
+                body: JSON.stringify({ savedSearches: searchesToFetch })
             });
             
             if (response.ok) {
-                const priceData = await response.json();
-                data[searchId] = priceData;
-                
-                // Track most recent date across all searches
-                if (priceData.current_date) {
-                    if (!mostRecentDate || priceData.current_date > mostRecentDate) {
-                        mostRecentDate = priceData.current_date;
+                const batchData = await response.json();
+                (batchData.prices || []).forEach((priceData, idx) => {
+                    const searchId = searchesToFetch[idx].id;
+                    if (!priceData || priceData.error) {
+                        console.error(`Error fetching price data for search ${searchId}:`, priceData && priceData.error);
+                        return;
                     }
-                }
+                    data[searchId] = priceData;
+                    
+                    // Track most recent date across all searches
+                    if (priceData.current_date) {
+                        if (!mostRecentDate || priceData.current_date > mostRecentDate) {
+                            mostRecentDate = priceData.current_date;
+                        }
+                    }
+                });
             }
         } catch (error) {
-            console.error(`Error fetching price data for search ${searchId}:`, error);
+            console.error('Error fetching price data for report searches:', error);
         }
     }
     
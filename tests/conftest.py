@@ -0,0 +1,68 @@
+import datetime
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# The app's modules live at the repository root, the sync script under scripts/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import app as app_module
+import db_connector
+import result_cache
+import wool_types
+from db_connector import ConnectionPool, SQLiteConnection, VersionedValue
+from sync_auction_mirror import build_mirror
+
+TYPES = [(1, '1BRB'), (2, '2AQC'), (3, '3AQD'), (7, '7MXF'), (12, '12CDE')]
+
+@pytest.fixture(scope='module')
+def mirror_path(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('mirror')
+    source_path = str(directory / 'source.sqlite3')
+    source = sqlite3.connect(source_path)
+    source.execute("""
+        CREATE TABLE auction_data_joined (
+            id INTEGER PRIMARY KEY, lot_number TEXT, sale_date DATE, bales REAL, kg REAL, price REAL,
+            colour REAL, micron REAL, yield REAL, vegetable_matter REAL, wool_type_id INTEGER,
+            type_combined TEXT, location TEXT, is_sold INTEGER, seller_name TEXT, farm_brand_name TEXT
+        )
+    """)
+    lots = []
+    first_sale = datetime.date(2019, 1, 3)
+    for week in range(150):
+        sale_date = (first_sale + datetime.timedelta(weeks=week)).isoformat()
+        for wool_type_id, type_combined in TYPES:
+            for lot in range(4):
+                lot_id = len(lots) + 1
+                lots.append((lot_id, f'L{lot_id}', sale_date, 2 + lot, 300.0, 400.0 + 10 * wool_type_id + lot + week % 7,
+                             2.0 + lot / 4, 28.0 + wool_type_id, 70.0, 0.2 * lot, wool_type_id, type_combined,
+                             ('CHCH', 'NAPIER')[lot % 2], 1, f'Seller {lot}', f'Brand {lot}'))
+    source.executemany(f"INSERT INTO auction_data_joined VALUES ({', '.join(['?'] * 16)})", lots)
+    source.commit()
+    source.close()
+
+    path = str(directory / 'auction_mirror.sqlite3')
+    source_conn = SQLiteConnection(source_path)
+    try:
+        build_mirror(source_conn, path)
+    finally:
+        source_conn.close()
+    return path
+
+@pytest.fixture(scope='module')
+def client(mirror_path):
+    settings = dict(db_connector.get_db_settings(), backend='sqlite', sqlite_path=mirror_path)
+    pool = ConnectionPool(settings=settings)
+    pool.backend.start()
+    pool.ready.set()
+    patch = pytest.MonkeyPatch()
+    patch.setattr(db_connector, '_pool', pool)
+    patch.setattr(db_connector, '_pool_pid', os.getpid())
+    patch.setattr(wool_types, '_dimension', VersionedValue(wool_types.WoolTypeDimension.load, wool_types.CHECK_INTERVAL))
+    patch.setattr(result_cache, 'RESULT_CACHE_ENABLED', False)
+    yield app_module.app.test_client()
+    patch.undo()
+    pool.close()
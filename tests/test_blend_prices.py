@@ -0,0 +1,229 @@
+"""
+Blend series and prices against compare_chart_blend as it was before
+blend_engine.
+
+old_type_data and old_group are the endpoint's per-type and per-group
+loops (statistics.median, interpolate_series one type at a time),
+old_weighted_average the blends page's weighted line (blends.js
+updateChart over common.js interpolateDataset) and
+old_compare_chart_blend runs the endpoint's per-type queries on the
+mirror. group_blend and weighted_blend are checked against the loops;
+the chart endpoint and saved blend prices against the whole old pipeline.
+"""
+
+import sqlite3
+import statistics
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose, assert_array_equal
+
+from app import blend_type_series
+from blend_engine import group_blend, weighted_blend
+from test_daily_prices import old_interpolate
+
+def old_type_data(rows):
+    """One type's {date: {'price', 'avg_colour', 'avg_vm', 'total_volume'}} from (sale_date, price, bales, colour, vm) rows"""
+    by_date = {}
+    for sale_date, price, bales, colour, vm in rows:
+        if sale_date and price and bales:
+            by_date.setdefault(sale_date, []).append((price, bales, colour, vm))
+    type_data = {}
+    for sale_date in sorted(by_date):
+        items = by_date[sale_date]
+        median_price = statistics.median([item[0] for item in items])
+        if len(items) > 1:
+            kept = [item for item in items if median_price * 0.8 <= item[0] <= median_price * 1.2] or items
+        else:
+            kept = items
+        total_bales = sum(item[1] for item in kept)
+        if total_bales > 0:
+            colour_bales = sum(item[1] for item in kept if item[2] is not None)
+            vm_bales = sum(item[1] for item in kept if item[3] is not None)
+            avg_colour = sum(item[2] * item[1] for item in kept if item[2] is not None) / colour_bales if colour_bales > 0 else None
+            avg_vm = sum(item[3] * item[1] for item in kept if item[3] is not None) / vm_bales if vm_bales > 0 else None
+            type_data[sale_date] = {
+                'price': sum(item[0] * item[1] for item in kept) / total_bales / 100,
+                'avg_colour': round(avg_colour, 2) if avg_colour is not None else None,
+                'avg_vm': round(avg_vm, 2) if avg_vm is not None else None,
+                'total_volume': int(total_bales)
+            }
+    return type_data
+
+def old_group(type_series, round_price=True):
+    """A group's {date: {...}}: the types' interpolated prices averaged, colour/VM/volume over the types sold that day"""
+    group_dates = sorted(set(date for series in type_series for date in series))
+    interpolated_series = [old_interpolate([series.get(date, {}).get('price') for date in group_dates])
+                           for series in type_series]
+    series_data = {}
+    for idx, date in enumerate(group_dates):
+        valid_values = [series[idx] for series in interpolated_series if series[idx] is not None]
+        if not valid_values:
+            continue
+        avg_price = sum(valid_values) / len(valid_values)
+        sold = [series[date] for series in type_series if date in series and series[date]['price']]
+        combined = {}
+        for field in ('avg_colour', 'avg_vm'):
+            weight = sum(entry[field] * entry['total_volume'] for entry in sold if entry[field] is not None)
+            volume = sum(entry['total_volume'] for entry in sold if entry[field] is not None)
+            combined[field] = round(weight / volume, 2) if volume > 0 else None
+        series_data[date] = {
+            'price': round(avg_price, 2) if round_price else avg_price,
+            'avg_colour': combined['avg_colour'],
+            'avg_vm': combined['avg_vm'],
+            'total_volume': sum(entry['total_volume'] for entry in sold)
+        }
+    return series_data
+
+def old_weighted_average(table_data, weights):
+    """(labels, weighted line) as blends.js drew it from the endpoint's table data and the entries' weights"""
+    labels = sorted(set(date for series in table_data.values() for date in series))
+    datasets = [old_interpolate([series.get(date, {}).get('price') for date in labels]) for series in table_data.values()]
+    blended = []
+    for i in range(len(labels)):
+        weighted_sum, total_weight = 0, 0
+        for dataset, weight in zip(datasets, weights):
+            if dataset[i] is not None:
+                weighted_sum += dataset[i] * weight
+                total_weight += weight
+        blended.append(weighted_sum / total_weight if total_weight > 0 else None)
+    return labels, blended
+
+OLD_OPERATORS = {'eq': '=', 'ne': '!=', 'gt': '>', 'lt': '<', 'gte': '>=', 'lte': '<='}
+
+def old_conditions(filters, operators):
+    """The endpoint's WHERE fragments for a filter list (incomplete and unknown filters skipped)"""
+    sql, params = '', []
+    for item in filters:
+        column, operator, value, value2 = item['column'], item.get('operator'), item.get('value'), item.get('value2')
+        if not value:
+            continue
+        if operator in operators:
+            sql += f" AND {column} {OLD_OPERATORS[operator]} ?"
+            params.append(value)
+        elif operator == 'between' and value2:
+            sql += f" AND {column} BETWEEN ? AND ?"
+            params.extend([value, value2])
+    return sql, params
+
+def old_compare_chart_blend(mirror_path, entries, date_filter):
+    """The endpoint's table_data: one query per type with the CAST predicate, then the per-type and group loops"""
+    conn = sqlite3.connect(mirror_path)
+    try:
+        table_data = {}
+        for entry in entries:
+            type_series = []
+            for wool_type in entry['types']:
+                date_sql, date_params = old_conditions([dict(date_filter, column='sale_date')] if date_filter else [],
+                                                       ('eq', 'gt', 'lt', 'gte', 'lte'))
+                filter_sql, filter_params = old_conditions(entry['filters'], OLD_OPERATORS)
+                rows = conn.execute(
+                    "SELECT sale_date, price, bales, colour, vegetable_matter FROM auction_data_joined "
+                    "WHERE price > 10 AND bales > 0 AND (CAST(wool_type_id AS CHAR) = ? OR type_combined = ?)"
+                    f"{date_sql}{filter_sql} ORDER BY sale_date ASC",
+                    [wool_type, wool_type] + date_params + filter_params).fetchall()
+                type_series.append(old_type_data(rows))
+            table_data[entry['label']] = old_group(type_series)
+        return table_data
+    finally:
+        conn.close()
+
+def random_type_lots(rng, dates, offered):
+    """Date-sorted valid lots of one type on the offered dates, with colour/VM gaps and outliers"""
+    cols = {'sale_date': [], 'price': [], 'bales': [], 'colour': [], 'vegetable_matter': []}
+    for sale_date in dates[offered]:
+        count = int(rng.integers(1, 9))
+        prices = np.round(rng.normal(1100, 200, count), 0).clip(20, None)
+        colours = np.round(rng.uniform(0, 5, count), 1)
+        vms = np.round(rng.uniform(0, 3, count), 1)
+        colours[rng.random(count) < 0.15] = np.nan
+        vms[rng.random(count) < 0.15] = np.nan
+        cols['sale_date'].append(np.full(count, sale_date))
+        cols['price'].append(prices)
+        cols['bales'].append(rng.integers(1, 15, count).astype(np.float64))
+        cols['colour'].append(colours)
+        cols['vegetable_matter'].append(vms)
+    return {name: np.concatenate(values) if values else np.zeros(0, dtype=dates.dtype if name == 'sale_date' else np.float64)
+            for name, values in cols.items()}
+
+def old_type_dict(series):
+    """A blend_engine type series as the per-group loop took it, {date: {...}} with None for nan"""
+    fields = [series[field].tolist() for field in ('price', 'avg_colour', 'avg_vm', 'total_volume')]
+    return {date: {'price': price, 'avg_colour': None if colour != colour else colour,
+                   'avg_vm': None if vm != vm else vm, 'total_volume': int(volume)}
+            for date, price, colour, vm, volume in zip(series['dates'].tolist(), *fields)}
+
+def test_group_blend_matches_per_group_loop():
+    rng = np.random.default_rng(21)
+    dates = np.datetime64('2018-01-04') + 7 * np.arange(120)
+    for trial in range(20):
+        # Types with leading and trailing gaps, random holes, a single date and no lots at all
+        offered = [rng.random(len(dates)) < rng.uniform(0.2, 0.95) for _ in range(int(rng.integers(1, 5)))]
+        offered[0][:int(rng.integers(0, 30))] = False
+        if trial % 5 == 0:
+            offered.append(np.arange(len(dates)) == int(rng.integers(0, len(dates))))
+        if trial % 7 == 0:
+            offered.append(np.zeros(len(dates), dtype=bool))
+        type_lots = [random_type_lots(rng, dates, dates_offered) for dates_offered in offered]
+
+        # Both sides start from the same type series (reduce_dates against the per-date loop is test_daily_prices)
+        type_series = [blend_type_series(cols) for cols in type_lots]
+        group = group_blend(type_series)
+        old = old_group([old_type_dict(series) for series in type_series], round_price=False)
+        assert group['dates'].tolist() == list(old)
+        assert_allclose(group['price'], [day['price'] for day in old.values()], rtol=1e-12, atol=0)
+        for field in ('avg_colour', 'avg_vm'):
+            rounded = [None if np.isnan(value) else round(value, 2) for value in group[field].tolist()]
+            assert rounded == [day[field] for day in old.values()], (trial, field)
+        assert_array_equal(group['total_volume'], [day['total_volume'] for day in old.values()])
+
+def test_weighted_blend_matches_blends_page():
+    rng = np.random.default_rng(25)
+    for trial in range(50):
+        matrix = np.round(rng.uniform(5, 20, (60, int(rng.integers(1, 6)))), 2)
+        matrix[rng.random(matrix.shape) < rng.uniform(0, 0.8)] = np.nan
+        if trial % 10 == 0:
+            matrix[:, 0] = np.nan
+        weights = rng.choice([1.0, 0.5, 2.0, 3.0, 0.25], matrix.shape[1])
+        table_data = {f'E{column}': {f'{row:03d}': {'price': float(matrix[row, column])}
+                                     for row in range(len(matrix)) if not np.isnan(matrix[row, column])}
+                      for column in range(matrix.shape[1])}
+        kept = ~np.isnan(matrix).all(axis=1)
+        labels, old = old_weighted_average(table_data, weights)
+        assert len(labels) == kept.sum()
+        new = weighted_blend(matrix[kept], weights)
+        assert_allclose(new, [np.nan if value is None else value for value in old], rtol=1e-12, atol=0, equal_nan=True)
+
+ENTRIES = [
+    # Rollup-backed types, a lot filter that leaves dates without sales, and one type with no lots
+    ([{'types': ['1BRB', '2AQC', '12CDE'], 'label': 'Fine', 'filters': []},
+      {'types': ['7'], 'label': 'Coarse', 'filters': [{'column': 'price', 'operator': 'lt', 'value': '473'}]}], [3, 1]),
+    ([{'types': ['3AQD', '1brb', 'NOPE'], 'label': 'Mixed', 'filters': [{'column': 'colour', 'operator': 'lte', 'value': '2.25'}]},
+      {'types': ['2AQC'], 'label': 'Fine', 'filters': [{'column': 'price', 'operator': 'between', 'value': '420', 'value2': '424'}]},
+      {'types': ['12CDE'], 'label': 'Bulky', 'filters': [{'column': 'price', 'operator': 'gt', 'value': '523'}]}], [1, 0.5, 2]),
+]
+DATE_FILTERS = [None, {'operator': 'gte', 'value': '2020-02-01'}, {'operator': 'between', 'value': '2019-03-01', 'value2': '2020-06-30'}]
+
+@pytest.mark.parametrize('entries, weights', ENTRIES)
+@pytest.mark.parametrize('date_filter', DATE_FILTERS)
+def test_blend_chart_and_prices_match_old_compare_chart_blend(client, mirror_path, entries, weights, date_filter):
+    old_table = old_compare_chart_blend(mirror_path, entries, date_filter)
+    old_labels, old_average = old_weighted_average(old_table, weights)
+    # Some entry lines have gaps for the blend to interpolate
+    assert any(len(series) < len(old_labels) for series in old_table.values())
+
+    chart = client.post('/api/compare_chart_blend', json={
+        'entries': [dict(entry, weight=weight) for entry, weight in zip(entries, weights)], 'date_filter': date_filter
+    }).get_json()
+    assert chart['table_data'] == old_table
+    assert chart['labels'] == old_labels
+    assert_allclose(np.array(chart['weighted_average'], dtype=np.float64),
+                    np.array(old_average, dtype=np.float64), rtol=1e-12, atol=0, equal_nan=True)
+
+    saved_blend = {'type': 'blend', 'entries': entries, 'weights': weights,
+                   'entryFilters': [entry['filters'] for entry in entries], 'dateFilter': date_filter}
+    prices = client.post('/api/market_report/search_prices_batch', json={'savedSearches': [saved_blend]}).get_json()['prices'][0]
+    priced = [(date, price) for date, price in zip(old_labels, old_average) if price is not None]
+    assert (prices['current_date'], prices['previous_date']) == (priced[-1][0], priced[-2][0])
+    assert prices['current_price'] == round(priced[-1][1] * 100, 2)
+    assert prices['previous_price'] == round(priced[-2][1] * 100, 2)
@@ -0,0 +1,20 @@
+"""Blend date filter compilation in column_filters"""
+
+import numpy as np
+
+from column_filters import ColumnFilters
+
+def test_date_filter_without_value_matches_nothing():
+    columns = {'sale_date': np.array(['2024-01-02', '2024-02-01', 'NaT'], dtype='datetime64[D]')}
+    for date_filter in ({'operator': 'gte', 'value': ''}, {'operator': 'eq', 'value': None},
+                        {'operator': 'between', 'value': '', 'value2': '2024-12-31'}):
+        filters = ColumnFilters.date_filter(date_filter)
+        assert filters.sql() == (' AND 1 = 0', []), date_filter
+        assert not filters.mask(columns, 3).any(), date_filter
+        assert filters.key() != ColumnFilters().key()
+
+def test_date_filter_with_value_compiles_to_sale_date():
+    filters = ColumnFilters.date_filter({'operator': 'between', 'value': '2024-01-01', 'value2': '2024-01-31'})
+    assert filters.sql() == (' AND sale_date BETWEEN %s AND %s', ['2024-01-01', '2024-01-31'])
+    assert not ColumnFilters.date_filter(None)
+    assert not ColumnFilters.date_filter({'operator': 'ne', 'value': ''})
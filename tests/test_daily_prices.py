@@ -0,0 +1,202 @@
+"""
+daily_prices against the per-date loops it replaced.
+
+old_reduce_date and old_interpolate are the price chart's per-date loop
+and the blend pages' interpolate_series as they were before daily_prices
+(sums by np.dot / ndarray.mean, one date and one series at a time).
+"""
+
+from fractions import Fraction
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from daily_prices import fill_gaps, reduce_dates, reduce_segments, segment_starts
+
+def old_reduce_date(prices, bales, colours, vms):
+    """One sale date's lots as the old loop reduced them, or None for a date it skipped (no kept bales)"""
+    median_price = np.median(prices)
+    keep = (prices >= median_price * 0.8) & (prices <= median_price * 1.2)
+    if not keep.any():
+        keep[:] = True
+    kept_bales = bales[keep]
+    total_bales = kept_bales.sum()
+    if not total_bales > 0:
+        return None
+
+    def weighted(values):
+        present = ~np.isnan(values)
+        weight = kept_bales[present].sum()
+        return float(np.dot(values[present], kept_bales[present]) / weight) if weight > 0 else None
+
+    def mean(values):
+        values = values[~np.isnan(values)]
+        return float(values.mean()) if len(values) else None
+
+    return {
+        'median_price': float(median_price),
+        'keep': keep,
+        'kept_lots': int(keep.sum()),
+        'total_bales': float(total_bales),
+        'weighted_price': float(np.dot(prices[keep], kept_bales) / total_bales),
+        'weighted_colour': weighted(colours[keep]),
+        'weighted_vm': weighted(vms[keep]),
+        'mean_colour': mean(colours[keep]),
+        'mean_vm': mean(vms[keep]),
+    }
+
+def old_interpolate(values):
+    """interpolate_series: fill None gaps linearly, flat before the first and after the last value"""
+    interpolated = values[:]
+    for i in range(len(interpolated)):
+        if interpolated[i] is None:
+            prev_idx = i - 1
+            while prev_idx >= 0 and interpolated[prev_idx] is None:
+                prev_idx -= 1
+            next_idx = i + 1
+            while next_idx < len(interpolated) and interpolated[next_idx] is None:
+                next_idx += 1
+            if prev_idx >= 0 and next_idx < len(interpolated):
+                prev_value, next_value = interpolated[prev_idx], interpolated[next_idx]
+                interpolated[i] = prev_value + (next_value - prev_value) * ((i - prev_idx) / (next_idx - prev_idx))
+            elif prev_idx >= 0:
+                interpolated[i] = interpolated[prev_idx]
+            elif next_idx < len(interpolated):
+                interpolated[i] = interpolated[next_idx]
+    return interpolated
+
+def lot_fixture(seed=20):
+    """
+    Date-sorted lot columns: random dates plus a single-lot date, an
+    all-zero-bales date, zero-bale lots among others, a date with no
+    colour/VM, an even count with outliers both sides and a date whose
+    lots are all outliers of their median
+    """
+    rng = np.random.default_rng(seed)
+    days = [
+        ([512.0], [3.0], [2.5], [0.4]),
+        ([480.0, 495.0, 505.0], [0.0, 0.0, 0.0], [2.0, 3.0, 2.0], [0.1, 0.2, 0.3]),
+        ([600.0, 610.0, 590.0, 620.0], [0.0, 4.0, 0.0, 2.0], [3.1, np.nan, 2.9, 3.3], [0.5, 0.5, np.nan, 0.7]),
+        ([700.0, 705.0], [2.0, 5.0], [np.nan, np.nan], [np.nan, np.nan]),
+        ([300.0, 550.0, 560.0, 900.0, 540.0, 1200.0], [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+         [2.0, 2.2, 2.4, 2.6, 2.8, 3.0], [0.1, 0.2, 0.3, 0.4, 0.5, 0.6]),
+        ([100.0, 400.0], [2.0, 2.0], [1.0, 2.0], [0.2, 0.4]),
+    ]
+    for _ in range(300):
+        count = int(rng.integers(1, 25))
+        prices = np.round(rng.normal(900, 150, count), 0)
+        colours = np.round(rng.uniform(0, 5, count), 1)
+        vms = np.round(rng.uniform(0, 3, count), 1)
+        colours[rng.random(count) < 0.1] = np.nan
+        vms[rng.random(count) < 0.1] = np.nan
+        days.append((prices, rng.integers(0, 12, count).astype(np.float64), colours, vms))
+
+    first = np.datetime64('2015-01-06')
+    cols = {'sale_date': [], 'price': [], 'bales': [], 'colour': [], 'vegetable_matter': []}
+    for day, (prices, bales, colours, vms) in enumerate(days):
+        cols['sale_date'].append(np.full(len(prices), first + 7 * day))
+        for name, values in (('price', prices), ('bales', bales), ('colour', colours), ('vegetable_matter', vms)):
+            cols[name].append(np.asarray(values, dtype=np.float64))
+    return {name: np.concatenate(values) for name, values in cols.items()}
+
+def old_days(cols):
+    starts = segment_starts(cols['sale_date'])
+    ends = np.append(starts[1:], len(cols['price']))
+    return [old_reduce_date(*(cols[name][start:end] for name in ('price', 'bales', 'colour', 'vegetable_matter')))
+            for start, end in zip(starts, ends)]
+
+def test_reduce_dates_matches_per_date_loop():
+    cols = lot_fixture()
+    days = reduce_dates(cols, with_quality=True)
+    old = old_days(cols)
+    assert len(old) == len(days['sale_date'])
+
+    # Dates the old loop skipped (no kept bales) are the ones with no weighted price now
+    charted = np.array([day is not None for day in old])
+    assert_array_equal(days['total_bales'] > 0, charted)
+    assert not charted[1] and charted[2]
+    assert np.isnan(days['weighted_price'][~charted]).all()
+
+    old_charted = [day for day in old if day is not None]
+    assert_array_equal(days['kept_lots'][charted], [day['kept_lots'] for day in old_charted])
+    assert_array_equal(days['keep'][np.repeat(charted, days['lot_count'])],
+                       np.concatenate([day['keep'] for day in old_charted]))
+    for field in ('median_price', 'total_bales', 'weighted_price', 'weighted_colour', 'weighted_vm', 'mean_colour', 'mean_vm'):
+        expected = np.array([np.nan if day[field] is None else day[field] for day in old_charted])
+        assert_allclose(days[field][charted], expected, rtol=1e-12, atol=0, equal_nan=True, err_msg=field)
+
+def test_reduce_segments_with_no_lots():
+    reduced = reduce_segments(np.zeros(0, dtype=np.intp), np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0))
+    for field in ('lot_count', 'kept_lots', 'total_bales', 'weighted_price', 'mean_colour', 'mean_vm', 'keep'):
+        assert len(reduced[field]) == 0, field
+
+def test_price_chart_table_rounding_drift_is_limited_to_half_cent_ties():
+    """
+    avg_colour / avg_vm in the price chart table are round(mean, 2). The
+    old loop summed with ndarray.mean (pairwise blocks of 8), daily_prices
+    sums each date sequentially, so a mean whose exact value is a .xx5 tie
+    can land on either side of it and round 0.01 apart. That drift is
+    accepted: both are the same tie, and no other value may move.
+    """
+    cols = lot_fixture()
+    days = reduce_dates(cols, with_quality=True)
+    old = old_days(cols)
+    starts = np.append(days['starts'], len(cols['price']))
+    drifted = 0
+    for i, day in enumerate(old):
+        if day is None:
+            continue
+        for field, column in (('mean_colour', 'colour'), ('mean_vm', 'vegetable_matter')):
+            if day[field] is None:
+                assert np.isnan(days[field][i])
+                continue
+            old_value, new_value = round(day[field], 2), round(float(days[field][i]), 2)
+            if old_value == new_value:
+                continue
+            drifted += 1
+            assert abs(old_value - new_value) <= 0.01 + 1e-12, (field, i)
+            values = cols[column][starts[i]:starts[i + 1]][day['keep']]
+            values = values[~np.isnan(values)]
+            exact_cents = sum(Fraction(float(value)) for value in values) / len(values) * 100
+            assert abs(exact_cents - (int(exact_cents) + Fraction(1, 2))) < Fraction(1, 10 ** 9), (field, i)
+    assert drifted > 0  # the fixture does hit ties
+
+    # A known tie: (2.6 + 1.2 + 1.8 + 3.0 + 2.1 + 0.6 + 1.8 + 2.7) / 8 = 1.975
+    vms = np.array([2.6, 1.2, 1.8, 3.0, 2.1, 0.6, 1.8, 2.7])
+    reduced = reduce_segments(np.array([0]), np.full(8, 500.0), np.ones(8), vms, vms)
+    assert round(float(vms.mean()), 2) == 1.98
+    assert round(float(reduced['mean_vm'][0]), 2) == 1.97
+    assert_allclose(reduced['mean_vm'][0], vms.mean(), rtol=1e-15)
+
+def test_fill_gaps_matches_interpolate_series():
+    cols = lot_fixture(seed=21)
+    all_dates = np.unique(cols['sale_date'])
+    rng = np.random.default_rng(21)
+    # Per type: which dates it was offered on. An empty group, gaps at the
+    # start and the end, a single date, and random holes
+    offered = [
+        np.zeros(len(all_dates), dtype=bool),
+        np.arange(len(all_dates)) >= 40,
+        np.arange(len(all_dates)) < len(all_dates) - 25,
+        np.arange(len(all_dates)) == 100,
+        rng.random(len(all_dates)) < 0.3,
+        rng.random(len(all_dates)) < 0.9,
+    ]
+    matrix = np.full((len(all_dates), len(offered)), np.nan)
+    expected = []
+    for column, dates in enumerate(offered):
+        lots = np.isin(cols['sale_date'], all_dates[dates])
+        type_cols = {name: values[lots] for name, values in cols.items()}
+        days = reduce_dates(type_cols)
+        matrix[np.searchsorted(all_dates, days['sale_date']), column] = days['weighted_price']
+
+        # Old path: a price per charted date, None for every other date, then interpolate
+        old_prices = dict(zip(np.unique(type_cols['sale_date']).tolist(),
+                              [day['weighted_price'] if day else None for day in old_days(type_cols)]))
+        series = old_interpolate([old_prices.get(date) for date in all_dates.tolist()])
+        expected.append([np.nan if value is None else value for value in series])
+
+    filled = fill_gaps(matrix)
+    assert np.isnan(filled[:, 0]).all()
+    assert not np.isnan(filled[:, 1:]).any()
+    assert_allclose(filled, np.array(expected).T, rtol=1e-12, atol=0, equal_nan=True)
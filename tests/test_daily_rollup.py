@@ -0,0 +1,32 @@
+"""Type grouping in the daily_type_prices rollup"""
+
+import sqlite3
+
+from daily_rollup import update_rollup
+
+def test_rollup_groups_types_like_the_type_search():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("""
+        CREATE TABLE auction_data_joined (id INTEGER PRIMARY KEY, sale_date DATE, price REAL, bales REAL,
+                                          colour REAL, vegetable_matter REAL, type_combined TEXT COLLATE NOCASE)
+    """)
+    lots = [
+        (1, '2024-01-02', 500.0, 2, 3.0, 0.5, '1BRB'),
+        (2, '2024-01-02', 520.0, 1, None, None, '1brb '),
+        (3, '2024-01-09', 510.0, 4, 2.0, 0.1, '2AQC'),
+        (4, '2024-01-02', 610.0, 3, 2.5, 0.2, 'Mérino'),
+        (5, '2024-01-02', 630.0, 1, 2.5, 0.2, 'MÉRINO  '),
+        (6, '2024-01-09', 505.0, 2, 3.0, 0.4, '1BRB'),
+    ]
+    conn.executemany('INSERT INTO auction_data_joined VALUES (?, ?, ?, ?, ?, ?, ?)', lots)
+    assert update_rollup(conn) == 4
+    rows = conn.execute("""
+        SELECT type_combined, sale_date, lot_count, all_bales FROM daily_type_prices ORDER BY sale_date, lot_count DESC, type_combined
+    """).fetchall()
+    # Case and trailing-space variants share one row, stored under the first spelling by id
+    assert rows == [
+        ('1BRB', '2024-01-02', 2, 3.0),
+        ('Mérino', '2024-01-02', 2, 4.0),
+        ('1BRB', '2024-01-09', 1, 2.0),
+        ('2AQC', '2024-01-09', 1, 4.0),
+    ]
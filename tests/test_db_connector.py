@@ -0,0 +1,106 @@
+"""Typed column decoding, prepared statement reuse and per-process values in db_connector"""
+
+import datetime
+from decimal import Decimal
+
+import numpy as np
+from mysql.connector.connection import MySQLConnection
+from mysql.connector.cursor import MySQLCursorPrepared
+
+import db_connector
+from db_connector import PreparedStatementCache, ReusedPreparedCursor, VersionedValue, _column_array
+
+def test_native_values_decode_like_text_protocol():
+    # (kind, text-protocol bytes, binary-protocol / SQLite native values)
+    cases = [
+        ('float', [b'1.10', None, b'325.5'], [Decimal('1.10'), None, Decimal('325.5')]),
+        ('float', [b'4', b'0'], [4, 0]),
+        ('int', [b'3', None], [Decimal('3'), None]),
+        ('date', [b'2024-01-02', None], [datetime.date(2024, 1, 2), None]),
+        ('date', [b'2024-01-02 00:00:00'], [datetime.datetime(2024, 1, 2)]),
+        ('str', [b'1BRB', None, b'42'], ['1BRB', None, 42]),
+    ]
+    for kind, raw, native in cases:
+        text_column = _column_array(raw, kind)
+        native_column = _column_array(native, kind)
+        assert text_column.dtype == native_column.dtype, kind
+        assert text_column.astype(str).tolist() == native_column.astype(str).tolist(), kind
+
+class FakeConnection(MySQLConnection):
+    """Pure-driver connection that records the protocol commands instead of sending them"""
+
+    def __init__(self):
+        super().__init__()
+        self._socket = object()
+        self.commands = []
+
+    def is_connected(self):
+        return True
+
+    def cmd_stmt_prepare(self, statement, **kwargs):
+        self.commands.append('prepare')
+        return {'statement_id': 1, 'parameters': [None], 'columns': []}
+
+    def cmd_stmt_reset(self, statement_id, **kwargs):
+        self.commands.append('reset')
+
+    def cmd_stmt_execute(self, statement_id, data=(), parameters=(), **kwargs):
+        self.commands.append('execute')
+        return {'status_flag': 0, 'warning_count': 0, 'affected_rows': 0, 'insert_id': 0}
+
+    def cmd_stmt_close(self, statement_id, **kwargs):
+        self.commands.append('close')
+
+def test_prepared_statement_reexecutes_without_reset():
+    conn = FakeConnection()
+    cache = PreparedStatementCache(conn)
+    hits = db_connector.prepared_stats()['hits']
+    for value in (1, 2, 3):
+        cursor, operation = cache.cursor_for("SELECT price FROM auction_data_joined WHERE id = %s")
+        cursor.execute(operation, [value])
+    assert isinstance(cursor, ReusedPreparedCursor)
+    # Only the first execution prepares (and resets); repeats are one round trip each
+    assert conn.commands == ['prepare', 'reset', 'execute', 'execute', 'execute']
+    assert db_connector.prepared_stats()['hits'] == hits + 2
+
+def test_other_driver_versions_use_the_stock_prepared_cursor(monkeypatch):
+    monkeypatch.setattr(db_connector, 'REUSE_PREPARED_CURSORS', False)
+    conn = FakeConnection()
+    cache = PreparedStatementCache(conn)
+    for value in (1, 2):
+        cursor, operation = cache.cursor_for("SELECT price FROM auction_data_joined WHERE id = %s")
+        cursor.execute(operation, [value])
+    assert type(cursor) is MySQLCursorPrepared
+    assert conn.commands == ['prepare', 'reset', 'execute', 'reset', 'execute']
+
+def test_pool_falls_back_to_ssh_without_mirror(tmp_path, capsys):
+    settings = dict(db_connector.get_db_settings(), backend='sqlite', sqlite_path=str(tmp_path / 'missing.sqlite3'))
+    pool = db_connector.ConnectionPool(settings=settings)
+    assert pool.backend.name == 'ssh'
+    assert 'falling back to the ssh backend' in capsys.readouterr().out
+
+def test_versioned_value_reloads_when_the_version_moves(monkeypatch):
+    versions = [('2024-01-04', 10)]
+    loads = []
+    checks = []
+    monkeypatch.setattr(db_connector, 'data_version', lambda conn: versions[-1])
+
+    def get_conn():
+        checks.append(1)
+        return object()
+
+    value = VersionedValue(lambda conn, version: loads.append(version) or len(loads), check_interval=3600)
+    assert value.get(get_conn) == 1
+    versions.append(('2024-01-11', 25))
+    # Within the interval the version isn't probed
+    assert value.get(get_conn) == 1 and len(checks) == 1
+
+    value.last_check = 0
+    assert value.get(get_conn) == 2
+    value.last_check = 0
+    assert value.get(get_conn) == 2 and len(checks) == 3
+    assert loads == [('2024-01-04', 10), ('2024-01-11', 25)]
+
+    # A forked worker loads its own copy whatever the interval
+    value.pid = -1
+    assert value.get(get_conn) == 3
@@ -0,0 +1,93 @@
+"""Requests that overrun their query budget, or find the database down"""
+
+import sqlite3
+import time
+
+import flask
+import pytest
+
+import app as app_module
+import db_connector
+import wool_types
+from db_connector import DatabaseUnavailable, QueryWatchdog, SQLiteCursor, VersionedValue
+
+# Counts forever: only an interrupt() ends it
+ENDLESS_QUERY = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT COUNT(*) FROM n"
+
+@pytest.fixture
+def budget(monkeypatch):
+    """Give the request's database work 0.3s instead of the endpoint's own budget"""
+    def short_watchdog(backend, conn, deadline):
+        flask.g.query_deadline = min(deadline, time.monotonic() + 0.3)
+        return QueryWatchdog(backend, conn, flask.g.query_deadline)
+
+    monkeypatch.setattr(app_module, 'QueryWatchdog', short_watchdog)
+
+@pytest.fixture
+def endless_lot_queries(monkeypatch):
+    """Run every auction_data_joined query as one that never finishes; returns the errors they ended with"""
+    errors = []
+    execute = SQLiteCursor.execute
+
+    def endless_execute(self, query, params=None):
+        if 'FROM auction_data_joined' not in query:
+            return execute(self, query, params)
+        try:
+            return execute(self, ENDLESS_QUERY)
+        except Exception as e:
+            errors.append(e)
+            raise
+
+    monkeypatch.setattr(SQLiteCursor, 'execute', endless_execute)
+    return errors
+
+@pytest.fixture
+def checkins(monkeypatch):
+    """discard flag of every connection handed back to the pool"""
+    discards = []
+    pool = db_connector._pool
+    checkin = pool.checkin
+
+    def recording_checkin(conn, discard=False):
+        discards.append(discard)
+        return checkin(conn, discard=discard)
+
+    monkeypatch.setattr(pool, 'checkin', recording_checkin)
+    return discards
+
+def test_over_budget_search_is_interrupted_and_returns_504(client, budget, endless_lot_queries, checkins):
+    started = time.monotonic()
+    response = client.post('/api/search', json={'wool_type_search': '1BRB', 'column_filters': []})
+    assert time.monotonic() - started < 5
+    assert response.status_code == 504
+    body = response.get_json()
+    assert body['timeout'] is True and body['budget_seconds'] == 20
+
+    # The statement itself was stopped, and its connection dropped rather than reused
+    assert len(endless_lot_queries) == 1
+    assert isinstance(endless_lot_queries[0], sqlite3.OperationalError)
+    assert 'interrupted' in str(endless_lot_queries[0])
+    assert checkins == [True]
+
+def test_statement_after_the_budget_is_spent_never_starts(client, monkeypatch, budget, endless_lot_queries):
+    # The wool type dimension's load is interrupted first; the lookup falls back to
+    # the CAST predicate and the chart's own lot query must not start after it
+    monkeypatch.setattr(wool_types, '_dimension', VersionedValue(wool_types.WoolTypeDimension.load, wool_types.CHECK_INTERVAL))
+    response = client.post('/api/price_chart', json={
+        'wool_type_search': '2AQC', 'column_filters': [{'column': 'colour', 'operator': 'lt', 'value': '5'}]})
+    assert response.status_code == 504
+    assert len(endless_lot_queries) == 1
+
+def test_within_budget_connection_goes_back_to_the_pool(client, budget, checkins):
+    response = client.post('/api/search', json={'wool_type_search': '1BRB', 'column_filters': [], 'page_size': 5})
+    assert response.status_code == 200
+    assert checkins == [False]
+
+def test_database_unavailable_returns_503(client, monkeypatch):
+    def unavailable():
+        raise DatabaseUnavailable('SSH tunnel is down')
+
+    monkeypatch.setattr(db_connector._pool, 'checkout', unavailable)
+    response = client.post('/api/search', json={'wool_type_search': '1BRB', 'column_filters': []})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
@@ -0,0 +1,100 @@
+"""
+The search, price chart and rollup queries use the mirror's indexes.
+
+Runs the endpoints against the conftest mirror (built with
+scripts/sync_auction_mirror.py's schema, indexes and rollup) and checks
+SQLite's EXPLAIN QUERY PLAN for the statements they actually issued.
+"""
+
+import pytest
+
+from db_connector import SQLiteConnection, SQLiteCursor
+
+@pytest.fixture
+def issued(monkeypatch):
+    """Every (query, params) the app runs on the mirror during a test"""
+    statements = []
+    execute = SQLiteCursor.execute
+
+    def recording_execute(self, query, params=None):
+        statements.append((query, list(params or [])))
+        return execute(self, query, params)
+
+    monkeypatch.setattr(SQLiteCursor, 'execute', recording_execute)
+    return statements
+
+def query_plans(client, mirror_path, issued, url, body, table, term):
+    """
+    EXPLAIN QUERY PLAN details for every statement a request ran on table
+    with the wool type term among its parameters
+    """
+    issued.clear()
+    response = client.post(url, json=body)
+    assert response.status_code == 200, response.get_json()
+    statements = [(query, params) for query, params in issued
+                  if f'FROM {table}' in query and term.casefold() in [str(p).casefold() for p in params]]
+    assert statements, f"{url} ran no {table} query for {term}"
+    conn = SQLiteConnection(mirror_path)
+    try:
+        plans = []
+        for query, params in statements:
+            cursor = conn._conn.cursor()
+            cursor.execute(f"EXPLAIN QUERY PLAN {query.replace('%s', '?')}", params)
+            plans.append([row[3] for row in cursor.fetchall()])
+            cursor.close()
+        return plans
+    finally:
+        conn.close()
+
+def assert_uses_index(plans, table, indexes):
+    for details in plans:
+        assert not any(detail.startswith(f'SCAN {table}') for detail in details), details
+        assert any(f'SEARCH {table} USING' in detail and any(index in detail for index in indexes)
+                   for detail in details), details
+
+LOT_INDEXES = ('idx_type_date', 'idx_wool_type_id')
+ROLLUP_INDEXES = ('sqlite_autoindex_daily_type_prices_1',)
+
+@pytest.mark.parametrize('term', ['1BRB', '2aqc', '7'])
+def test_search_uses_type_index(client, mirror_path, issued, term):
+    plans = query_plans(client, mirror_path, issued, '/api/search',
+                        {'wool_type_search': term, 'column_filters': []}, 'auction_data_joined', term)
+    assert_uses_index(plans, 'auction_data_joined', LOT_INDEXES)
+
+def test_search_page_uses_type_index(client, mirror_path, issued):
+    first = client.post('/api/search', json={'wool_type_search': '3AQD', 'page_size': 50}).get_json()
+    plans = query_plans(client, mirror_path, issued, '/api/search',
+                        {'wool_type_search': '3AQD', 'page_size': 50, 'page_token': first['next_page_token']},
+                        'auction_data_joined', '3AQD')
+    assert_uses_index(plans, 'auction_data_joined', LOT_INDEXES)
+
+def test_price_chart_lot_query_uses_type_index(client, mirror_path, issued):
+    # A lot filter keeps the chart off the rollup
+    plans = query_plans(client, mirror_path, issued, '/api/price_chart',
+                        {'wool_type_search': '1BRB', 'column_filters': [{'column': 'colour', 'operator': 'lt', 'value': '5'}]},
+                        'auction_data_joined', '1BRB')
+    assert_uses_index(plans, 'auction_data_joined', LOT_INDEXES)
+
+def test_compare_chart_lot_query_uses_type_index(client, mirror_path, issued):
+    plans = query_plans(client, mirror_path, issued, '/api/compare_chart',
+                        {'wool_types': ['1BRB', '12CDE'], 'column_filters': [{'column': 'micron', 'operator': 'gte', 'value': '20'}]},
+                        'auction_data_joined', '1BRB')
+    assert_uses_index(plans, 'auction_data_joined', LOT_INDEXES)
+
+def test_price_chart_rollup_uses_key_index(client, mirror_path, issued):
+    plans = query_plans(client, mirror_path, issued, '/api/price_chart',
+                        {'wool_type_search': '2AQC', 'column_filters': []}, 'daily_type_prices', '2AQC')
+    assert_uses_index(plans, 'daily_type_prices', ROLLUP_INDEXES)
+
+def test_search_prices_rollup_uses_key_index(client, mirror_path, issued):
+    plans = query_plans(client, mirror_path, issued, '/api/market_report/search_prices',
+                        {'savedSearch': {'filters': {'wool_type_search': '3AQD', 'column_filters': []}}},
+                        'daily_type_prices', '3AQD')
+    assert_uses_index(plans, 'daily_type_prices', ROLLUP_INDEXES)
+
+def test_calendar_rollup_uses_key_index(client, mirror_path, issued):
+    entries = [{'types': ['1BRB', '2AQC'], 'label': 'E1', 'filters': []}]
+    plans = query_plans(client, mirror_path, issued, '/api/market_report/indicator_data',
+                        {'blendData': {'entries': entries, 'weights': [1], 'entryFilters': [[]]}, 'year': 2020},
+                        'daily_type_prices', '1BRB')
+    assert_uses_index(plans, 'daily_type_prices', ROLLUP_INDEXES)
@@ -0,0 +1,88 @@
+"""Data-version invalidation of the result cache tiers, and cached_values"""
+
+import pickle
+
+import pytest
+
+import result_cache
+from result_cache import CachedResult, DiskCache, ResultCache, cached_values
+
+@pytest.fixture
+def versions(monkeypatch):
+    """The data version the database reports: append to move it"""
+    versions = [('2024-01-04', 100)]
+    monkeypatch.setattr(result_cache, 'data_version', lambda conn: versions[-1])
+    return versions
+
+def get_conn():
+    return None
+
+def worker_cache(path):
+    """One worker's cache over the shared disk file, probing the version on every check"""
+    return ResultCache(check_interval=0, disk=DiskCache(path=str(path)))
+
+def test_version_bump_invalidates_memory_and_disk(tmp_path, versions):
+    path = tmp_path / 'result_cache.sqlite3'
+    first, second = worker_cache(path), worker_cache(path)
+    first.check_version(get_conn)
+    first.put('chart', CachedResult(b'{"prices": [1]}', [('/api/price_chart', 'Simple Search')]))
+    assert first.get('chart').body == b'{"prices": [1]}'
+
+    # Another worker is served from disk, activity log entries included
+    second.check_version(get_conn)
+    entry = second.get('chart')
+    assert entry.body == b'{"prices": [1]}' and entry.activity == [('/api/price_chart', 'Simple Search')]
+    assert second.disk.hits == 1
+
+    versions.append(('2024-01-11', 250))
+    first.check_version(get_conn)
+    assert first.get('chart') is None
+    assert first.invalidations == 1
+    assert first.disk.stats()['entries'] == 0
+    second.check_version(get_conn)
+    assert second.get('chart') is None and second.invalidations == 1
+
+    # Nor does a worker started after the bump see the old entry
+    third = worker_cache(path)
+    third.check_version(get_conn)
+    assert third.version == ('2024-01-11', 250)
+    assert third.get('chart') is None
+
+def test_unchanged_version_keeps_entries(tmp_path, versions):
+    cache = worker_cache(tmp_path / 'result_cache.sqlite3')
+    cache.check_version(get_conn)
+    cache.put('chart', CachedResult(b'{}', []))
+    cache.check_version(get_conn)
+    assert cache.get('chart') is not None
+    assert cache.invalidations == 0
+
+def test_cached_values_computes_only_the_misses(tmp_path, monkeypatch, versions):
+    path = tmp_path / 'result_cache.sqlite3'
+    cache = worker_cache(path)
+    monkeypatch.setattr(result_cache, 'get_result_cache', lambda: cache)
+    computed = []
+
+    def compute(missing):
+        computed.append(sorted(missing))
+        # 'skip' has no value: it is neither returned nor cached
+        return {item: f'{item}@{versions[-1][1]}' for item in missing if item != 'skip'}
+
+    payloads = {item: {'type': item} for item in ('a', 'b', 'skip')}
+    assert cached_values('series', payloads, compute, get_conn) == {'a': 'a@100', 'b': 'b@100'}
+    assert computed == [['a', 'b', 'skip']]
+
+    payloads['c'] = {'type': 'c'}
+    assert cached_values('series', payloads, compute, get_conn) == {'a': 'a@100', 'b': 'b@100', 'c': 'c@100'}
+    assert computed[1:] == [['c', 'skip']]
+
+    # Values are keyed by name and payload, and another worker reads them from disk
+    monkeypatch.setattr(result_cache, 'get_result_cache', lambda: worker_cache(path))
+    assert cached_values('series', {'x': {'type': 'a'}}, compute, get_conn) == {'x': 'a@100'}
+    assert cached_values('other', {'a': {'type': 'a'}}, compute, get_conn) == {'a': 'a@100'}
+    assert computed[2:] == [['a']]
+
+    monkeypatch.setattr(result_cache, 'get_result_cache', lambda: cache)
+    versions.append(('2024-01-11', 250))
+    assert cached_values('series', payloads, compute, get_conn) == {'a': 'a@250', 'b': 'b@250', 'c': 'c@250'}
+    assert computed[3:] == [['a', 'b', 'c', 'skip']]
+    assert pickle.loads(cache.get(result_cache.request_key('value:series', {'type': 'a'})).body) == 'a@250'
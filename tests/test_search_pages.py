@@ -0,0 +1,127 @@
+"""Keyset pages of /api/search: complete, in order, and only for their own search"""
+
+import random
+import sqlite3
+
+import pytest
+
+import app as app_module
+from column_snapshot import ColumnSnapshot
+from db_connector import SQLiteConnection, data_version
+from sync_auction_mirror import build_mirror
+
+SALE_DATES = ['2024-01-04', '2024-01-11', '2024-01-18', '2024-02-01']
+
+@pytest.fixture(scope='module')
+def mirror_path(tmp_path_factory):
+    """
+    1BRB and 2AQC lots on a few sale dates (many per date, ids shuffled
+    across dates) plus undated lots of both types
+    """
+    directory = tmp_path_factory.mktemp('pages')
+    source_path = str(directory / 'source.sqlite3')
+    source = sqlite3.connect(source_path)
+    source.execute("""
+        CREATE TABLE auction_data_joined (
+            id INTEGER PRIMARY KEY, lot_number TEXT, sale_date DATE, bales REAL, kg REAL, price REAL,
+            colour REAL, micron REAL, yield REAL, vegetable_matter REAL, wool_type_id INTEGER,
+            type_combined TEXT, location TEXT, is_sold INTEGER, seller_name TEXT, farm_brand_name TEXT
+        )
+    """)
+    sale_dates = [sale_date for sale_date in SALE_DATES for _ in range(9)] + [None] * 11
+    ids = list(range(1, 2 * len(sale_dates) + 1))
+    random.Random(15).shuffle(ids)
+    lots = []
+    for wool_type_id, type_combined in ((1, '1BRB'), (2, '2AQC')):
+        for sale_date in sale_dates:
+            lot_id = ids.pop()
+            lots.append((lot_id, f'L{lot_id}', sale_date, 3, 300.0, 500.0 + lot_id % 17, 2.0 + lot_id % 3, 30.0, 70.0,
+                         0.2, wool_type_id, type_combined, 'CHCH', 1, 'Seller', 'Brand'))
+    source.executemany(f"INSERT INTO auction_data_joined VALUES ({', '.join(['?'] * 16)})", lots)
+    source.commit()
+    source.close()
+
+    path = str(directory / 'auction_mirror.sqlite3')
+    source_conn = SQLiteConnection(source_path)
+    try:
+        build_mirror(source_conn, path)
+    finally:
+        source_conn.close()
+    return path
+
+@pytest.fixture(params=['sql', 'snapshot'])
+def lots_from(request, client, mirror_path, monkeypatch):
+    """Run the search by SQL or from the in-memory column snapshot"""
+    if request.param == 'snapshot':
+        conn = SQLiteConnection(mirror_path)
+        try:
+            snapshot = ColumnSnapshot.load(conn, data_version(conn))
+        finally:
+            conn.close()
+        monkeypatch.setattr(app_module, 'get_snapshot', lambda: snapshot)
+    return request.param
+
+def expected_lots(mirror_path, type_combined, colour_below=None):
+    """Lot ids of a type newest first, (sale_date, id) descending, undated lots last"""
+    conn = sqlite3.connect(mirror_path)
+    try:
+        rows = conn.execute(
+            "SELECT id, sale_date FROM auction_data_joined WHERE type_combined = ? AND (? IS NULL OR colour < ?)",
+            (type_combined, colour_below, colour_below)).fetchall()
+    finally:
+        conn.close()
+    dated = sorted((row for row in rows if row[1] is not None), key=lambda row: (row[1], row[0]), reverse=True)
+    undated = sorted((row for row in rows if row[1] is None), reverse=True)
+    return [lot_id for lot_id, _ in dated + undated]
+
+def all_pages(client, body, page_size):
+    ids, token, pages = [], None, 0
+    while True:
+        response = client.post('/api/search', json=dict(body, page_size=page_size, page_token=token))
+        assert response.status_code == 200, response.get_json()
+        page = response.get_json()
+        assert page['count'] == len(page['results']) <= page_size
+        ids.extend(lot['id'] for lot in page['results'])
+        pages += 1
+        token = page['next_page_token']
+        if token is None:
+            return ids, pages
+
+# 8 splits sale dates, 9 ends a page on the last dated lot, 50 holds every lot in one page
+@pytest.mark.parametrize('page_size', [1, 4, 8, 9, 50])
+def test_pages_cover_every_lot_once_in_order(client, mirror_path, lots_from, page_size):
+    expected = expected_lots(mirror_path, '1BRB')
+    assert len(expected) == 47
+    ids, pages = all_pages(client, {'wool_type_search': '1BRB'}, page_size)
+    assert ids == expected
+    assert pages == -(-len(expected) // page_size)
+
+def test_pages_of_a_filtered_search(client, mirror_path, lots_from):
+    column_filters = [{'column': 'colour', 'operator': 'lt', 'value': '4'}]
+    ids, _ = all_pages(client, {'wool_type_search': '2aqc', 'column_filters': column_filters}, 5)
+    assert ids == expected_lots(mirror_path, '2AQC', colour_below=4)
+
+def test_tampered_or_foreign_page_tokens_are_rejected(client):
+    first = client.post('/api/search', json={'wool_type_search': '1BRB', 'page_size': 5}).get_json()
+    token = first['next_page_token']
+    key = app_module.search_key('1BRB', app_module.ColumnFilters.compile([]))
+    assert app_module.decode_page_token(token, key) == (first['results'][-1]['sale_date'], first['results'][-1]['id'])
+
+    bad_tokens = [
+        token[:-3],
+        'not a token!',
+        app_module.encode_page_token(key, '2024-13-45', 10),
+        app_module.encode_page_token(key, SALE_DATES[0], 'ten'),
+        app_module.encode_page_token('0' * 16, SALE_DATES[0], 10),
+    ]
+    for bad_token in bad_tokens:
+        response = client.post('/api/search', json={'wool_type_search': '1BRB', 'page_size': 5, 'page_token': bad_token})
+        assert response.status_code == 400, bad_token
+        assert response.get_json()['error']
+
+    # A token only continues the search (type and filters) it came from
+    for other in ({'wool_type_search': '2AQC'},
+                  {'wool_type_search': '1BRB', 'column_filters': [{'column': 'colour', 'operator': 'lt', 'value': '4'}]}):
+        response = client.post('/api/search', json=dict(other, page_size=5, page_token=token))
+        assert response.status_code == 400, other
+        assert response.get_json() == {'error': 'Page token belongs to a different search'}
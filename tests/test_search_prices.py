@@ -0,0 +1,62 @@
+"""Saved search prices: one search failing alone, and blends priced as the blends chart shows them"""
+
+import sqlite3
+
+import pytest
+
+from db_connector import SQLiteCursor
+
+def failing_type(monkeypatch, wool_type):
+    """Make every mirror query with wool_type among its parameters fail"""
+    execute = SQLiteCursor.execute
+
+    def failing_execute(self, query, params=None):
+        if wool_type in list(params or []):
+            raise sqlite3.OperationalError('no such column: bad_filter')
+        return execute(self, query, params)
+
+    monkeypatch.setattr(SQLiteCursor, 'execute', failing_execute)
+
+def test_one_failing_search_leaves_the_others_priced(client, monkeypatch):
+    failing_type(monkeypatch, '3AQD')
+    lot_filter = [{'column': 'colour', 'operator': 'lt', 'value': '5'}]
+    searches = [
+        {'wool_types': ['1BRB']},
+        {'wool_types': ['3AQD']},
+        {'filters': {'wool_type_search': '2AQC', 'column_filters': lot_filter}},
+        {'filters': {'wool_type_search': '7MXF', 'column_filters': []}},
+    ]
+    response = client.post('/api/market_report/search_prices_batch', json={'savedSearches': searches})
+    assert response.status_code == 200, response.get_json()
+    prices = response.get_json()['prices']
+    assert prices[1] == {'error': 'no such column: bad_filter'}
+    for price in prices[:1] + prices[2:]:
+        assert price['current_price'] and price['previous_price'], price
+
+    # The same search on its own still fails the request
+    response = client.post('/api/market_report/search_prices', json={'savedSearch': searches[1]})
+    assert response.status_code == 500
+
+@pytest.mark.parametrize('date_filter', [
+    {'operator': 'gte', 'value': '2020-06-01'},
+    {'operator': 'lte', 'value': '2020-03-01'},
+    {'operator': 'between', 'value': '2019-05-01', 'value2': '2019-09-30'},
+])
+def test_saved_blend_prices_match_the_blends_chart(client, date_filter):
+    entries = [{'types': ['1BRB', '2AQC'], 'label': 'Fine', 'filters': []},
+               {'types': ['7MXF'], 'label': 'Coarse', 'filters': [{'column': 'colour', 'operator': 'lt', 'value': '2.6'}]}]
+    weights = [3, 1]
+    chart = client.post('/api/compare_chart_blend', json={
+        'entries': [dict(entry, weight=weight) for entry, weight in zip(entries, weights)], 'date_filter': date_filter
+    }).get_json()
+    priced = [(date, price) for date, price in zip(chart['labels'], chart['weighted_average']) if price is not None]
+
+    saved_blend = {'page': 'blends', 'blend_data': {
+        'entries': entries, 'weights': weights, 'entryFilters': [entry['filters'] for entry in entries],
+        'dateFilter': date_filter}}
+    response = client.post('/api/market_report/search_prices', json={'savedSearch': saved_blend})
+    assert response.status_code == 200, response.get_json()
+    prices = response.get_json()
+    assert (prices['current_date'], prices['previous_date']) == (priced[-1][0], priced[-2][0])
+    assert prices['current_price'] == round(priced[-1][1] * 100, 2)
+    assert prices['previous_price'] == round(priced[-2][1] * 100, 2)
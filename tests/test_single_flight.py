@@ -0,0 +1,94 @@
+"""Concurrent callers of SingleFlight.do share one computation"""
+
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+WAITERS = 6
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.001)
+
+def run_concurrently(flights, compute, release):
+    """
+    Start a leader and WAITERS callers on one key, release the leader once
+    every waiter has joined, and return each caller's (result, leader) or
+    exception
+    """
+    outcomes = [None] * (WAITERS + 1)
+
+    def caller(index):
+        try:
+            outcomes[index] = flights.do('blend', compute, timeout=5)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=caller, args=(0,))]
+    threads[0].start()
+    wait_for(lambda: flights.stats()['in_flight'] == 1)
+    threads += [threading.Thread(target=caller, args=(index,)) for index in range(1, WAITERS + 1)]
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: flights.stats()['coalesced'] == WAITERS)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+def test_waiters_share_the_leaders_result():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {'price': 1234}
+
+    outcomes = run_concurrently(flights, compute, release)
+    assert len(calls) == 1
+    assert outcomes[0] == ({'price': 1234}, True)
+    assert outcomes[1:] == [({'price': 1234}, False)] * WAITERS
+    assert all(outcome[0] is outcomes[0][0] for outcome in outcomes)
+    assert flights.stats() == {'enabled': True, 'in_flight': 0, 'leaders': 1, 'coalesced': WAITERS, 'shared_failures': 0}
+
+    # The key is free once the call finishes: the next caller computes again
+    assert flights.do('blend', compute) == ({'price': 1234}, True)
+    assert len(calls) == 2
+
+def test_waiters_share_the_leaders_exception():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError('query failed')
+
+    outcomes = run_concurrently(flights, compute, release)
+    assert len(calls) == 1
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert all(outcome is outcomes[0] for outcome in outcomes)
+    assert flights.stats()['shared_failures'] == WAITERS
+    assert flights.stats()['in_flight'] == 0
+
+def test_waiter_times_out_while_the_leader_runs():
+    flights = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flights.do, args=('blend', lambda: release.wait(5)))
+    leader.start()
+    wait_for(lambda: flights.stats()['in_flight'] == 1)
+    with pytest.raises(TimeoutError):
+        flights.do('blend', lambda: None, timeout=0.05)
+    # Other keys don't wait
+    assert flights.do('chart', lambda: 'chart') == ('chart', True)
+    release.set()
+    leader.join(5)
+    assert flights.stats()['in_flight'] == 0
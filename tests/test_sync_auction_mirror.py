@@ -0,0 +1,62 @@
+"""Full mirror rebuilds alongside open app connections"""
+
+import os
+import sqlite3
+
+from db_connector import SQLiteConnection
+from sync_auction_mirror import build_mirror
+
+def make_source(path, lots):
+    source = sqlite3.connect(path)
+    source.execute("""
+        CREATE TABLE IF NOT EXISTS auction_data_joined (
+            id INTEGER PRIMARY KEY, lot_number TEXT, sale_date DATE, bales REAL, kg REAL, price REAL,
+            colour REAL, micron REAL, yield REAL, vegetable_matter REAL, wool_type_id INTEGER,
+            type_combined TEXT, location TEXT, is_sold INTEGER, seller_name TEXT, farm_brand_name TEXT
+        )
+    """)
+    source.execute('DELETE FROM auction_data_joined')
+    source.executemany(f"INSERT INTO auction_data_joined VALUES ({', '.join(['?'] * 16)})", [
+        (lot_id, f'L{lot_id}', '2024-01-04', 4, 300.0, 500.0 + lot_id, 2.5, 30.0, 70.0, 0.2, 1, '1BRB',
+         'CHCH', 1, 'Seller', 'Brand')
+        for lot_id in range(1, lots + 1)
+    ])
+    source.commit()
+    source.close()
+
+def rebuild(source_path, mirror_path):
+    source_conn = SQLiteConnection(source_path)
+    try:
+        return build_mirror(source_conn, mirror_path)
+    finally:
+        source_conn.close()
+
+def test_full_rebuild_keeps_the_file_open_readers_use(tmp_path):
+    source_path, mirror_path = str(tmp_path / 'source.sqlite3'), str(tmp_path / 'mirror.sqlite3')
+    make_source(source_path, 10)
+    rebuild(source_path, mirror_path)
+    inode = os.stat(mirror_path).st_ino
+
+    reader = SQLiteConnection(mirror_path)
+    cursor = reader.cursor()
+    cursor.execute('SELECT COUNT(*) FROM auction_data_joined')
+    assert cursor.fetchone() == (10,)
+
+    # Hold a read transaction open across the rebuild: it keeps its snapshot
+    reader._conn.execute('BEGIN')
+    cursor.execute('SELECT COUNT(*) FROM auction_data_joined')
+    assert cursor.fetchone() == (10,)
+    make_source(source_path, 25)
+    state = rebuild(source_path, mirror_path)
+    assert state['row_count'] == 25
+    cursor.execute('SELECT COUNT(*) FROM auction_data_joined')
+    assert cursor.fetchone() == (10,)
+    reader._conn.execute('COMMIT')
+
+    # Same file, so the open connection sees the rebuilt table and rollup once its snapshot ends
+    assert os.stat(mirror_path).st_ino == inode
+    cursor.execute('SELECT COUNT(*) FROM auction_data_joined')
+    assert cursor.fetchone() == (25,)
+    cursor.execute('SELECT lot_count FROM daily_type_prices')
+    assert cursor.fetchone() == (25,)
+    reader.close()
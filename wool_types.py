@@ -0,0 +1,178 @@
+"""
+Wool type dimension: the distinct (wool_type_id, type_combined) pairs in
+auction_data_joined, cached per worker process.
+
+A wool type search term matches lots by either column:
+    CAST(wool_type_id AS CHAR) = term OR type_combined = term
+Casting the column stops MySQL using an index, so every per-type query
+scans the table. Knowing which pairs exist, the same set of lots can
+almost always be selected with one typed predicate on a single indexed
+column (type_combined = 'x', wool_type_id = 7, or an IN list). When no
+single-column form is exact the original predicate is used instead.
+Several terms can be fetched in one query (types_predicate) and the rows
+split back out by term in memory (type_masks).
+
+The pairs are reloaded when the data version (MAX(sale_date), MAX(id))
+changes, checked at most every WOOL_TYPE_CHECK_INTERVAL seconds.
+"""
+
+import os
+import time
+import numpy as np
+
+from db_connector import VersionedValue
+from column_filters import fold
+
+CHECK_INTERVAL = float(os.environ.get('WOOL_TYPE_CHECK_INTERVAL', '60'))
+
+FALLBACK_PREDICATE = "(CAST(wool_type_id AS CHAR) = %s OR type_combined = %s)"
+
+def _in_list(column, values):
+    if len(values) == 1:
+        return f"{column} = %s", list(values)
+    return f"{column} IN ({', '.join(['%s'] * len(values))})", list(values)
+
+class WoolTypeDimension:
+    """Distinct (wool_type_id, type_combined) pairs; either side may be None"""
+
+    def __init__(self, pairs, version):
+        self.pairs = set(pairs)
+        self.version = version
+        self.loaded_at = time.time()
+
+    @classmethod
+    def load(cls, conn, version):
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT wool_type_id, type_combined FROM auction_data_joined")
+        pairs = [(int(wool_id) if wool_id is not None else None, type_name) for wool_id, type_name in cursor.fetchall()]
+        cursor.close()
+        return cls(pairs, version)
+
+    def _matches(self, pair, wool_id, folded):
+        pair_id, type_name = pair
+        return (wool_id is not None and pair_id == wool_id) or (type_name is not None and fold(type_name) == folded)
+
+    def resolve(self, term):
+        """
+        (column, values) selecting exactly the lots the term matches on a
+        single column, or None when no single-column form is exact.
+        Prefers wool_type_id for numeric terms and type_combined otherwise.
+        """
+        term = term.strip()
+        wool_id = int(term) if term.isdigit() and str(int(term)) == term else None
+        folded = fold(term)
+        matched = {pair for pair in self.pairs if self._matches(pair, wool_id, folded)}
+        if not matched:
+            # Unknown to this snapshot of the pairs (or data newer than it) - stay exact
+            return None
+        others = self.pairs - matched
+
+        def by_type():
+            names = {type_name for _, type_name in matched}
+            if None in names:
+                return None
+            folded_names = {fold(name) for name in names}
+            if any(type_name is not None and fold(type_name) in folded_names for _, type_name in others):
+                return None
+            return 'type_combined', sorted(names)
+
+        def by_id():
+            ids = {pair_id for pair_id, _ in matched}
+            if None in ids or any(pair_id in ids for pair_id, _ in others):
+                return None
+            return 'wool_type_id', sorted(ids)
+
+        for candidate in ((by_id, by_type) if wool_id is not None else (by_type, by_id)):
+            resolved = candidate()
+            if resolved is not None:
+                return resolved
+        return None
+
+    def predicate(self, term):
+        """(sql, params) selecting exactly the lots the term matches, on a single column where possible"""
+        resolved = self.resolve(term)
+        if resolved is None:
+            term = term.strip()
+            return FALLBACK_PREDICATE, [term, term]
+        return _in_list(*resolved)
+
+    def stats(self):
+        return {
+            'pairs': len(self.pairs),
+            'wool_type_ids': len({pair_id for pair_id, _ in self.pairs if pair_id is not None}),
+            'type_combined': len({fold(name) for _, name in self.pairs if name is not None}),
+        }
+
+_dimension = VersionedValue(WoolTypeDimension.load, CHECK_INTERVAL)
+
+def get_dimension(get_conn):
+    """
+    This process's dimension, reloaded when the data version has moved.
+    get_conn is only called when the version needs checking.
+    """
+    return _dimension.get(get_conn)
+
+def type_predicate(term, get_conn):
+    """SQL condition and params for a wool type search term (see WoolTypeDimension.predicate)"""
+    try:
+        return get_dimension(get_conn).predicate(term)
+    except Exception as e:
+        print(f"Wool type dimension unavailable, using CAST predicate: {e}")
+        term = term.strip()
+        return FALLBACK_PREDICATE, [term, term]
+
+def types_predicate(terms, get_conn):
+    """
+    One (sql, params) condition matching the lots of any of the terms, for
+    fetching several types in a single query. Terms that resolve to a single
+    column are merged into one IN list per column.
+    """
+    try:
+        dimension = get_dimension(get_conn)
+    except Exception as e:
+        print(f"Wool type dimension unavailable, using CAST predicate: {e}")
+        dimension = None
+    by_column = {'wool_type_id': [], 'type_combined': []}
+    fallback = []
+    for term in terms:
+        term = term.strip()
+        resolved = dimension.resolve(term) if dimension is not None else None
+        if resolved is None:
+            fallback.append(term)
+            continue
+        column, values = resolved
+        by_column[column].extend(value for value in values if value not in by_column[column])
+
+    parts = []
+    params = []
+    for column, values in by_column.items():
+        if values:
+            condition, condition_params = _in_list(column, values)
+            parts.append(condition)
+            params.extend(condition_params)
+    for term in fallback:
+        parts.append(FALLBACK_PREDICATE)
+        params.extend([term, term])
+    if len(parts) == 1:
+        return parts[0], params
+    return '(' + ' OR '.join(parts) + ')', params
+
+def type_masks(terms, type_combined, wool_type_ids):
+    """
+    {term: row mask} of the lots each search term matches
+    (CAST(wool_type_id AS CHAR) = term OR type_combined = term), for
+    splitting a multi-type fetch by type. type_combined is an object array,
+    wool_type_ids float64 with nan for NULL.
+    """
+    distinct = {}
+    codes = np.array([distinct.setdefault(name, len(distinct)) for name in type_combined], dtype=np.int64)
+    folded = [fold(name) if name is not None else None for name in distinct]
+    masks = {}
+    for term in terms:
+        stripped = term.strip()
+        selected = np.array([name == fold(stripped) for name in folded], dtype=bool)
+        mask = selected[codes] if len(codes) else np.zeros(0, dtype=bool)
+        if stripped.isdigit() and str(int(stripped)) == stripped:
+            mask |= wool_type_ids == int(stripped)
+        masks[term] = mask
+    return masks